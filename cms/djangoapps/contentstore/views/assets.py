@@ -244,7 +244,8 @@ def _update_asset(request, location, asset_id):
         loc = get_asset_location(asset_id)
         # Make sure the item to delete actually exists.
         try:
-            content = contentstore().find(loc)
+            # as a stream, since the trashcan shares the stored data
+            content = contentstore().find(loc, as_stream=True)
         except NotFoundError:
             return JsonResponse(status=404)
 
@@ -254,7 +255,7 @@ def _update_asset(request, location, asset_id):
         # see if there is a thumbnail as well, if so move that as well
         if content.thumbnail_location is not None:
             try:
-                thumbnail_content = contentstore().find(content.thumbnail_location)
+                thumbnail_content = contentstore().find(content.thumbnail_location, as_stream=True)
                 contentstore('trashcan').save(thumbnail_content)
                 # hard delete thumbnail from origin
                 contentstore().delete(thumbnail_content.get_id())
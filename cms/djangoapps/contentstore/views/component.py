@@ -230,12 +230,9 @@ def unit_handler(request, tag=None, package_id=None, branch=None, version_guid=N
             )
 
         xblocks = item.get_children()
-        locators = [
-            loc_mapper().translate_location(
-                course.location.course_id, xblock.location, False, True
-            )
-            for xblock in xblocks
-        ]
+        locators = loc_mapper().translate_locations(
+            course.location.course_id, [xblock.location for xblock in xblocks], False, True
+        )
 
         # TODO (cpennington): If we share units between courses,
         # this will need to change to check permissions correctly so as
@@ -48,6 +48,10 @@ def get_parent_xblock(xblock):
     Returns the xblock that is the parent of the specified xblock, or None if it has no parent.
     """
     locator = xblock.location
+    parent_location = modulestore().get_cached_parent_location(locator, None)
+    if parent_location is not None:
+        return modulestore().get_item(parent_location)
+
     parent_locations = modulestore().get_parent_locations(locator, None)
 
     if len(parent_locations) == 0:
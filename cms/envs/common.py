@@ -168,6 +168,13 @@ AUTHENTICATION_BACKENDS = (
 
 LMS_BASE = None
 
+############################### XModule Store ##################################
+# How many bytes of structures and definitions each process keeps for the split
+# modulestore (its document_cache_size option), so that courses aren't read from
+# Mongo again until they are edited.  0 disables the cache.  Deployments whose
+# MODULESTORE comes from auth.json set the option there.
+SPLIT_DOCUMENT_CACHE_SIZE = 64 * 1024 * 1024
+
 #################### CAPA External Code Evaluation #############################
 XQUEUE_INTERFACE = {
     'url': 'http://localhost:8888',
@@ -39,7 +39,7 @@ MODULESTORE = {
     'split': {
         'ENGINE': 'xmodule.modulestore.split_mongo.SplitMongoModuleStore',
         'DOC_STORE_CONFIG': DOC_STORE_CONFIG,
-        'OPTIONS': modulestore_options
+        'OPTIONS': dict(modulestore_options, document_cache_size=SPLIT_DOCUMENT_CACHE_SIZE)
     }
 }
 
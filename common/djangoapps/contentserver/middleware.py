@@ -1,5 +1,9 @@
+import calendar
+import re
+
 from django.http import (HttpResponse, HttpResponseNotModified,
     HttpResponseForbidden)
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
 from student.models import CourseEnrollment
 
 from xmodule.contentstore.django import contentstore
@@ -8,6 +12,39 @@ from xmodule.modulestore import InvalidLocationError
 from cache_toolbox.core import get_cached_content, set_cached_content
 from xmodule.exceptions import NotFoundError
 
+# A single byte range, e.g. bytes=0-499, bytes=500- or bytes=-500
+SINGLE_RANGE_RE = re.compile(r'^\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*$')
+
+
+def parse_range_header(header_value, content_length):
+    """
+    Return the (first_byte, last_byte) of a Range header asking for a single
+    range of content_length bytes, or None if the header should be ignored
+    (e.g. because it's malformed, or asks for several ranges).
+
+    Raises ValueError if the range can't be satisfied.
+    """
+    match = SINGLE_RANGE_RE.match(header_value)
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if content_length == 0:
+        raise ValueError('No range of empty content')
+    if not first:
+        # The last `last` bytes
+        if int(last) == 0:
+            raise ValueError('Empty suffix range')
+        return max(content_length - int(last), 0), content_length - 1
+    first = int(first)
+    last = int(last) if last else content_length - 1
+    if first > last:
+        return None
+    if first >= content_length:
+        raise ValueError('Range starts after the end of the content')
+    return first, min(last, content_length - 1)
+
 
 class StaticContentServer(object):
     def process_request(self, request):
@@ -52,18 +89,82 @@ class StaticContentServer(object):
                         request.user, course_partial_id):
                     return HttpResponseForbidden('Unauthorized')
 
-            # convert over the DB persistent last modified timestamp to a HTTP compatible
-            # timestamp, so we can simply compare the strings
-            last_modified_at_str = content.last_modified_at.strftime("%a, %d-%b-%Y %H:%M:%S GMT")
-
-            # see if the client has cached this content, if so then compare the
-            # timestamps, if they are the same then just return a 304 (Not Modified)
-            if 'HTTP_IF_MODIFIED_SINCE' in request.META:
-                if_modified_since = request.META['HTTP_IF_MODIFIED_SINCE']
-                if if_modified_since == last_modified_at_str:
-                    return HttpResponseNotModified()
+            # convert over the DB persistent last modified timestamp (in UTC) to
+            # seconds since the epoch, which is what HTTP dates can express
+            last_modified_at = calendar.timegm(content.last_modified_at.utctimetuple())
+            # getattr b/c caching may mean some pickled instances don't have attr
+            content_digest = getattr(content, 'content_digest', None)
+            etag = quote_etag(content_digest) if content_digest else None
 
-            response = HttpResponse(content.stream_data(), content_type=content.content_type)
-            response['Last-Modified'] = last_modified_at_str
+            # see if the client has cached this content, and if it hasn't changed
+            # since then just return a 304 (Not Modified)
+            if self.is_not_modified(request, last_modified_at, etag):
+                response = HttpResponseNotModified()
+            else:
+                response = self.content_response(request, content, last_modified_at, etag)
 
+            response['Last-Modified'] = http_date(last_modified_at)
+            if etag is not None:
+                response['ETag'] = etag
             return response
+
+    @staticmethod
+    def is_not_modified(request, last_modified_at, etag):
+        """
+        Does the client already have the current content, according to the
+        conditional headers of its request?
+        """
+        if 'HTTP_IF_NONE_MATCH' in request.META:
+            # Takes precedence over If-Modified-Since
+            etags = parse_etags(request.META['HTTP_IF_NONE_MATCH'])
+            return etag is not None and ('*' in etags or etag.strip('"') in etags)
+        if 'HTTP_IF_MODIFIED_SINCE' in request.META:
+            if_modified_since = parse_http_date_safe(request.META['HTTP_IF_MODIFIED_SINCE'])
+            return if_modified_since is not None and last_modified_at <= if_modified_since
+        return False
+
+    @staticmethod
+    def content_response(request, content, last_modified_at, etag):
+        """
+        Return a response with the content, or if the request asks for a byte
+        range of it, with just those bytes, read straight from its stream.
+        """
+        length = content.length
+        if length is not None and 'HTTP_RANGE' in request.META and StaticContentServer.if_range_matches(
+                request, last_modified_at, etag):
+            try:
+                byte_range = parse_range_header(request.META['HTTP_RANGE'], length)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = 'bytes */{0}'.format(length)
+                return response
+
+            if byte_range is not None:
+                first_byte, last_byte = byte_range
+                response = HttpResponse(
+                    content.stream_data_in_range(first_byte, last_byte), content_type=content.content_type, status=206
+                )
+                response['Content-Range'] = 'bytes {0}-{1}/{2}'.format(first_byte, last_byte, length)
+                response['Content-Length'] = str(last_byte - first_byte + 1)
+                response['Accept-Ranges'] = 'bytes'
+                return response
+
+        response = HttpResponse(content.stream_data(), content_type=content.content_type)
+        if length is not None:
+            response['Content-Length'] = str(length)
+            response['Accept-Ranges'] = 'bytes'
+        return response
+
+    @staticmethod
+    def if_range_matches(request, last_modified_at, etag):
+        """
+        Should the Range header of the request be honored, given its If-Range
+        header?  Ranges of content that has changed since the client fetched
+        the rest of it aren't served.
+        """
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if if_range is None:
+            return True
+        if if_range.strip().startswith('"') or if_range.strip().startswith('W/'):
+            return etag is not None and if_range.strip() == etag
+        return parse_http_date_safe(if_range) == last_modified_at
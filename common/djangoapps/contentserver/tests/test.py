@@ -3,14 +3,21 @@ Tests for StaticContentServer
 """
 import copy
 import logging
+import time
 from uuid import uuid4
 from path import path
+from gridfs.grid_file import GridOut
+from mock import patch
 from pymongo import MongoClient
 
 from django.contrib.auth.models import User
 from django.conf import settings
-from django.test.client import Client
+from django.test import TestCase
+from django.test.client import Client, RequestFactory
 from django.test.utils import override_settings
+from django.utils.http import http_date
+
+from contentserver.middleware import StaticContentServer, parse_range_header
 
 from student.models import CourseEnrollment
 
@@ -134,3 +141,120 @@ class ContentStoreToyCourseTest(ModuleStoreTestCase):
         resp = self.client.get(self.url_locked)
         self.assertEqual(resp.status_code, 200) # pylint: disable=E1103
 
+    def test_range_request(self):
+        """
+        Test that a byte range of an asset is served.
+        """
+        full = self.client.get(self.url_unlocked).content
+        resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(resp.status_code, 206)  # pylint: disable=E1103
+        self.assertEqual(resp.content, full[10:20])
+        self.assertEqual(resp['Content-Range'], 'bytes 10-19/{0}'.format(len(full)))
+        self.assertEqual(resp['Content-Length'], '10')
+
+        resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes=-5')
+        self.assertEqual(resp.status_code, 206)  # pylint: disable=E1103
+        self.assertEqual(resp.content, full[-5:])
+
+    def test_unsatisfiable_range_request(self):
+        """
+        Test that a range past the end of an asset isn't served.
+        """
+        resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes=100000-')
+        self.assertEqual(resp.status_code, 416)  # pylint: disable=E1103
+
+    def test_range_request_for_changed_content(self):
+        """
+        Test that a range is ignored if the asset has changed since the client's If-Range.
+        """
+        resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(resp.status_code, 200)  # pylint: disable=E1103
+
+        etag = self.client.get(self.url_unlocked)['ETag']
+        resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(resp.status_code, 206)  # pylint: disable=E1103
+
+    def test_etag(self):
+        """
+        Test that the ETag of an asset is its md5, and that it's checked by If-None-Match.
+        """
+        resp = self.client.get(self.url_unlocked)
+        content = self.contentstore.find(self.loc_unlocked)
+        self.assertEqual(resp['ETag'], '"{0}"'.format(content.content_digest))
+
+        resp = self.client.get(self.url_unlocked, HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(resp.status_code, 304)  # pylint: disable=E1103
+        resp = self.client.get(self.url_unlocked, HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(resp.status_code, 200)  # pylint: disable=E1103
+
+    def test_if_modified_since(self):
+        """
+        Test that If-Modified-Since is compared as a date.
+        """
+        last_modified = self.client.get(self.url_unlocked)['Last-Modified']
+        resp = self.client.get(self.url_unlocked, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(resp.status_code, 304)  # pylint: disable=E1103
+        resp = self.client.get(self.url_unlocked, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 3600))
+        self.assertEqual(resp.status_code, 304)  # pylint: disable=E1103
+        resp = self.client.get(self.url_unlocked, HTTP_IF_MODIFIED_SINCE=http_date(0))
+        self.assertEqual(resp.status_code, 200)  # pylint: disable=E1103
+        resp = self.client.get(self.url_unlocked, HTTP_IF_MODIFIED_SINCE='not a date')
+        self.assertEqual(resp.status_code, 200)  # pylint: disable=E1103
+
+    def test_large_asset_ranges(self):
+        """
+        Test that ranges of an asset too large to cache are read from its stream,
+        reading only the bytes of the range.
+        """
+        data = ''.join(chr(index % 256) for index in xrange(8 * 1024 * 1024))
+        location = Location('c4x', 'edX', 'toy', 'asset', 'large.bin')
+        self.contentstore.save(StaticContent(location, 'large.bin', 'application/octet-stream', data))
+        url = StaticContent.get_url_path_from_location(location)
+        server = StaticContentServer()
+
+        resp = server.process_request(RequestFactory().get(url, HTTP_RANGE='bytes=5000000-5000099'))
+        self.assertEqual(resp.status_code, 206)
+        self.assertEqual(resp.content, data[5000000:5000100])
+
+        def serve(headers):
+            """
+            Serve the asset with headers, returning how many bytes were read from its stream
+            """
+            bytes_read = []
+            read = GridOut.read
+
+            def counting_read(grid_out, size=-1):
+                """Read from grid_out, counting the bytes"""
+                chunk = read(grid_out, size)
+                bytes_read.append(len(chunk))
+                return chunk
+
+            with patch.object(GridOut, 'read', counting_read):
+                start = time.time()
+                server.process_request(RequestFactory().get(url, **headers)).content  # pylint: disable=W0106
+                log.info("Served an 8MB asset with %s in %.3fs", headers, time.time() - start)
+            return sum(bytes_read)
+
+        self.assertEqual(serve({}), len(data))
+        self.assertEqual(serve({'HTTP_RANGE': 'bytes=4000000-4999999'}), 1000000)
+
+
+class ParseRangeHeaderTest(TestCase):
+    """
+    Tests of parsing Range headers
+    """
+    def test_ranges(self):
+        self.assertEqual(parse_range_header('bytes=0-499', 1000), (0, 499))
+        self.assertEqual(parse_range_header('bytes=500-', 1000), (500, 999))
+        self.assertEqual(parse_range_header('bytes=-200', 1000), (800, 999))
+        self.assertEqual(parse_range_header('bytes=-2000', 1000), (0, 999))
+        self.assertEqual(parse_range_header('bytes=900-2000', 1000), (900, 999))
+
+    def test_ignored(self):
+        for header in ['bytes=0-1,5-6', 'bytes=-', 'bytes=5-1', 'items=0-1', 'junk']:
+            self.assertIsNone(parse_range_header(header, 1000))
+
+    def test_unsatisfiable(self):
+        for header, length in [('bytes=1000-', 1000), ('bytes=-0', 1000), ('bytes=0-1', 0)]:
+            with self.assertRaises(ValueError):
+                parse_range_header(header, length)
@@ -1,5 +1,7 @@
 import logging
+from uuid import uuid4
 
+from django.core.cache import get_cache, InvalidCacheBackendError
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -8,7 +10,7 @@ from django.db.models.signals import post_save
 from django.utils.translation import ugettext_noop
 from student.models import CourseEnrollment
 
-from xmodule.modulestore.django import modulestore
+from xmodule.modulestore.django import modulestore, modulestore_update_signal
 from xmodule.course_module import CourseDescriptor
 
 FORUM_ROLE_ADMINISTRATOR = ugettext_noop('Administrator')
@@ -39,6 +41,44 @@ def assign_default_role_on_enrollment(sender, instance, **kwargs):
     assign_default_role(instance.course_id, instance.user)
 
 
+DISCUSSION_MAPS_VERSION_KEY = u'discussion_maps_version.{0}'
+
+
+def _discussion_maps_cache():
+    """
+    The cache holding the discussion map versions, which must be shared by
+    Studio (which edits courses) and the LMS.
+    """
+    try:
+        return get_cache('mongo_metadata_inheritance')
+    except InvalidCacheBackendError:
+        return get_cache('default')
+
+
+def get_discussion_maps_version(course_location):
+    """
+    Return the version of the discussion maps of the course at
+    `course_location`, which changes whenever the course is edited.
+    """
+    cache = _discussion_maps_cache()
+    key = DISCUSSION_MAPS_VERSION_KEY.format(u'{0}/{1}'.format(course_location.org, course_location.course))
+    version = cache.get(key)
+    if version is None:
+        # Never edited, or evicted: start a version now
+        version = uuid4().hex
+        cache.set(key, version)
+    return version
+
+
+@receiver(modulestore_update_signal)
+def invalidate_discussion_maps(sender, course_id, **kwargs):
+    """
+    Start a new version of the discussion maps of the course (`org/course`)
+    whenever the modulestore changes one of its items.
+    """
+    _discussion_maps_cache().set(DISCUSSION_MAPS_VERSION_KEY.format(course_id), uuid4().hex)
+
+
 def assign_default_role(course_id, user):
     """
     Assign forum default role 'Student' to user
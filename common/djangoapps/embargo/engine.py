@@ -0,0 +1,172 @@
+"""
+In-process lookups for the embargo middleware.
+
+Every request for an embargoed course checks the client's IP address against
+the IPFilter and looks up its country in the GeoIP database.  The engine
+opens the database once per process, memory mapped, and compiles the
+whitelist and blacklist into sorted, merged ranges of addresses, so checking
+an address is a binary search however long the lists are.  The lists may
+hold networks (e.g. 18.0.0.0/8) as well as single addresses.
+
+The engine recompiles the lists and embargoed countries whenever the current
+IPFilter or EmbargoedState changes; those are cached by ConfigurationModel,
+so noticing a change costs a cache lookup.
+"""
+import binascii
+import bisect
+import logging
+import socket
+import threading
+from collections import defaultdict
+
+import pygeoip
+from django.conf import settings
+
+from embargo.models import EmbargoedState, IPFilter
+
+log = logging.getLogger(__name__)
+
+# The IPv4-mapped IPv6 addresses, ::ffff:0:0/96
+IPV4_MAPPED_PREFIX = 0xffff
+
+
+def parse_address(address):
+    """
+    Return the (family, value) of an IPv4 or IPv6 address, where value is the
+    address as an integer.  IPv4-mapped IPv6 addresses are returned as IPv4.
+
+    Raises ValueError if address isn't a valid address.
+    """
+    try:
+        address = str(address).strip()
+    except UnicodeError:
+        raise ValueError(u"Invalid IP address: {0}".format(address))
+    for family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            packed = socket.inet_pton(family, address)
+        except (socket.error, ValueError):
+            continue
+        value = int(binascii.hexlify(packed), 16)
+        if family == socket.AF_INET6 and value >> 32 == IPV4_MAPPED_PREFIX:
+            return socket.AF_INET, value & 0xffffffff
+        return family, value
+    raise ValueError(u"Invalid IP address: {0}".format(address))
+
+
+def parse_network(network):
+    """
+    Return the (family, first, last) addresses of a network written as an
+    address with an optional prefix length, e.g. 18.0.0.0/8 or 2001:db8::/32.
+
+    Raises ValueError if network isn't a valid network.
+    """
+    address, _, prefix = network.strip().partition('/')
+    family, value = parse_address(address)
+    bits = 32 if family == socket.AF_INET else 128
+    if not prefix:
+        return family, value, value
+    if not prefix.isdigit() or int(prefix) > bits:
+        raise ValueError(u"Invalid network prefix: {0}".format(network))
+    host_mask = (1 << (bits - int(prefix))) - 1
+    first = value & ~host_mask
+    return family, first, first | host_mask
+
+
+class IPRanges(object):
+    """
+    A set of IP addresses, given as a list of addresses and networks.
+    """
+    def __init__(self, networks):
+        spans = defaultdict(list)
+        for network in networks:
+            if not network.strip():
+                continue
+            try:
+                family, first, last = parse_network(network)
+            except ValueError:
+                log.warning("Embargo: ignoring invalid IP address or network %r", network)
+                continue
+            spans[family].append((first, last))
+
+        # family -> the first and last addresses of each range, in order
+        self._firsts = {}
+        self._lasts = {}
+        for family, family_spans in spans.iteritems():
+            firsts, lasts = [], []
+            for first, last in sorted(family_spans):
+                if lasts and first <= lasts[-1] + 1:
+                    # Overlaps or adjoins the previous range
+                    lasts[-1] = max(lasts[-1], last)
+                else:
+                    firsts.append(first)
+                    lasts.append(last)
+            self._firsts[family] = firsts
+            self._lasts[family] = lasts
+
+    def __contains__(self, address):
+        try:
+            family, value = parse_address(address)
+        except ValueError:
+            return False
+        firsts = self._firsts.get(family)
+        if not firsts:
+            return False
+        index = bisect.bisect_right(firsts, value) - 1
+        return index >= 0 and value <= self._lasts[family][index]
+
+
+class EmbargoEngine(object):
+    """
+    The GeoIP database and compiled embargo configuration of this process.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._geoip = None  # (path, GeoIP)
+        self._ip_filter = (None, None)  # (whitelist, blacklist) strings -> IPRanges
+        self._countries = (None, frozenset())  # embargoed_countries string -> country codes
+
+    def country_code_by_addr(self, ip_addr):
+        """
+        Return the code of the country that ip_addr is in, from the GeoIP database.
+        """
+        path = settings.GEOIP_PATH
+        geoip = self._geoip
+        if geoip is None or geoip[0] != path:
+            with self._lock:
+                if self._geoip is None or self._geoip[0] != path:
+                    self._geoip = (path, pygeoip.GeoIP(path, pygeoip.MMAP_CACHE))
+                geoip = self._geoip
+        return geoip[1].country_code_by_addr(ip_addr)
+
+    def ip_filter(self):
+        """
+        Return the whitelist and blacklist of the current IPFilter, as IPRanges.
+        """
+        current = IPFilter.current()
+        key = (current.whitelist, current.blacklist)
+        compiled_key, compiled = self._ip_filter
+        if compiled_key != key:
+            compiled = (IPRanges(current.whitelist_ips), IPRanges(current.blacklist_ips))
+            self._ip_filter = (key, compiled)
+        return compiled
+
+    def embargoed_countries(self):
+        """
+        Return the set of the codes of the currently embargoed countries.
+        """
+        current = EmbargoedState.current()
+        compiled_key, compiled = self._countries
+        if compiled_key != current.embargoed_countries:
+            compiled = frozenset(current.embargoed_countries_list)
+            self._countries = (current.embargoed_countries, compiled)
+        return compiled
+
+
+_ENGINE = EmbargoEngine()
+
+
+def get_engine():
+    """
+    Return this process's EmbargoEngine.
+    """
+    return _ENGINE
@@ -4,6 +4,7 @@ Defines forms for providing validation of embargo admin details.
 
 from django import forms
 
+from embargo.engine import parse_network
 from embargo.models import EmbargoedCourse, EmbargoedState, IPFilter
 from embargo.fixtures.country_codes import COUNTRY_CODES
 
@@ -94,9 +95,17 @@ class IPFilterForm(forms.ModelForm):  # pylint: disable=incomplete-protocol
             return False
         return True
 
+    def _is_valid_network(self, network):
+        """Whether or not network is a valid ipv4 or ipv6 network, like 18.0.0.0/8"""
+        try:
+            parse_network(network)
+        except ValueError:
+            return False
+        return True
+
     def _valid_ip_addresses(self, addresses):
         """
-        Checks if a csv string of IP addresses contains valid values.
+        Checks if a csv string of IP addresses and networks contains valid values.
 
         If not, raises a ValidationError.
         """
@@ -105,7 +114,7 @@ class IPFilterForm(forms.ModelForm):  # pylint: disable=incomplete-protocol
         error_addresses = []
         for addr in addresses.split(','):
             address = addr.strip()
-            if not (self._is_valid_ipv4(address) or self._is_valid_ipv6(address)):
+            if not (self._is_valid_ipv4(address) or self._is_valid_ipv6(address) or self._is_valid_network(address)):
                 error_addresses.append(address)
         if error_addresses:
             msg = 'Invalid IP Address(es): {0}'.format(error_addresses)
@@ -8,7 +8,6 @@ reverse proxy is setting any of the well known client IP address headers (ex.,
 HTTP_X_FORWARDED_FOR).
 """
 import logging
-import pygeoip
 
 from django.core.exceptions import MiddlewareNotUsed
 from django.conf import settings
@@ -16,7 +15,8 @@ from django.shortcuts import redirect
 from ipware.ip import get_ip
 from util.request import course_id_from_url
 
-from embargo.models import EmbargoedCourse, EmbargoedState, IPFilter
+from embargo.engine import get_engine
+from embargo.models import EmbargoedCourse
 
 log = logging.getLogger(__name__)
 
@@ -42,18 +42,19 @@ class EmbargoMiddleware(object):
 
         # If they're trying to access a course that cares about embargoes
         if EmbargoedCourse.is_embargoed(course_id):
-            # If we're having performance issues, add caching here
+            engine = get_engine()
             ip_addr = get_ip(request)
+            whitelist, blacklist = engine.ip_filter()
 
             # if blacklisted, immediately fail
-            if ip_addr in IPFilter.current().blacklist_ips:
+            if ip_addr in blacklist:
                 log.info("Embargo: Restricting IP address %s to course %s because IP is blacklisted.", ip_addr, course_id)
                 return redirect('embargo')
 
-            country_code_from_ip = pygeoip.GeoIP(settings.GEOIP_PATH).country_code_by_addr(ip_addr)
-            is_embargoed = country_code_from_ip in EmbargoedState.current().embargoed_countries_list
+            country_code_from_ip = engine.country_code_by_addr(ip_addr)
+            is_embargoed = country_code_from_ip in engine.embargoed_countries()
             # Fail if country is embargoed and the ip address isn't explicitly whitelisted
-            if is_embargoed and ip_addr not in IPFilter.current().whitelist_ips:
+            if is_embargoed and ip_addr not in whitelist:
                 log.info(
                     "Embargo: Restricting IP address %s to course %s because IP is from country %s.",
                     ip_addr, course_id, country_code_from_ip
@@ -10,9 +10,13 @@ file and check it in at the same time as your model changes. To do that,
 2. ./manage.py lms schemamigration embargo --auto description_of_your_change
 3. Add the migration file created in edx-platform/common/djangoapps/embargo/migrations/
 """
+import hashlib
+
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 
-from config_models.models import ConfigurationModel
+from config_models.models import ConfigurationModel, cache
 
 
 class EmbargoedCourse(models.Model):
@@ -25,6 +29,14 @@ class EmbargoedCourse(models.Model):
     # Whether or not to embargo
     embargoed = models.BooleanField(default=False)
 
+    # The number of seconds to cache whether a course is embargoed
+    cache_timeout = 600
+
+    @classmethod
+    def cache_key_name(cls, course_id):
+        """Return the name of the key to use to cache whether course_id is embargoed"""
+        return 'embargo/{}/{}'.format(cls.__name__, hashlib.md5(course_id.encode('utf-8')).hexdigest())
+
     @classmethod
     def is_embargoed(cls, course_id):
         """
@@ -32,12 +44,18 @@ class EmbargoedCourse(models.Model):
 
         If course has not been explicitly embargoed, returns False.
         """
-        try:
-            record = cls.objects.get(course_id=course_id)
-            return record.embargoed
-        except cls.DoesNotExist:
+        if course_id is None:
             return False
 
+        embargoed = cache.get(cls.cache_key_name(course_id))
+        if embargoed is None:
+            try:
+                embargoed = cls.objects.get(course_id=course_id).embargoed
+            except cls.DoesNotExist:
+                embargoed = False
+            cache.set(cls.cache_key_name(course_id), embargoed, cls.cache_timeout)
+        return embargoed
+
     def __unicode__(self):
         not_em = "Not "
         if self.embargoed:
@@ -45,6 +63,15 @@ class EmbargoedCourse(models.Model):
         return u"Course '{}' is {}Embargoed".format(self.course_id, not_em)
 
 
+@receiver(post_save, sender=EmbargoedCourse)
+@receiver(post_delete, sender=EmbargoedCourse)
+def invalidate_embargoed_course(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Forget whether the course was embargoed when its record changes.
+    """
+    cache.delete(EmbargoedCourse.cache_key_name(instance.course_id))
+
+
 class EmbargoedState(ConfigurationModel):
     """
     Register countries to be embargoed.
@@ -71,18 +98,24 @@ class IPFilter(ConfigurationModel):
     """
     whitelist = models.TextField(
         blank=True,
-        help_text="A comma-separated list of IP addresses that should not fall under embargo restrictions."
+        help_text=(
+            "A comma-separated list of IP addresses or networks (e.g. 18.0.0.0/8) "
+            "that should not fall under embargo restrictions."
+        )
     )
 
     blacklist = models.TextField(
         blank=True,
-        help_text="A comma-separated list of IP addresses that should fall under embargo restrictions."
+        help_text=(
+            "A comma-separated list of IP addresses or networks (e.g. 18.0.0.0/8) "
+            "that should fall under embargo restrictions."
+        )
     )
 
     @property
     def whitelist_ips(self):
         """
-        Return a list of valid IP addresses to whitelist
+        Return a list of valid IP addresses and networks to whitelist
         """
         if self.whitelist == '':
             return []
@@ -91,7 +124,7 @@ class IPFilter(ConfigurationModel):
     @property
     def blacklist_ips(self):
         """
-        Return a list of valid IP addresses to blacklist
+        Return a list of valid IP addresses and networks to blacklist
         """
         if self.blacklist == '':
             return []
@@ -0,0 +1,123 @@
+"""
+Tests for the in-process embargo lookups
+"""
+import bisect
+import logging
+import socket
+import time
+
+import mock
+import pygeoip
+from django.test import TestCase
+from django.test.utils import override_settings
+
+# Explicitly import the cache from ConfigurationModel so we can reset it after each test
+from config_models.models import cache
+from embargo.engine import EmbargoEngine, IPRanges, parse_network
+from embargo.models import EmbargoedState, IPFilter
+
+log = logging.getLogger(__name__)
+
+
+class IPRangesTest(TestCase):
+    """
+    Test matching addresses against lists of addresses and networks
+    """
+    def test_parse_network(self):
+        self.assertEqual(parse_network('18.0.0.1'), (socket.AF_INET, 0x12000001, 0x12000001))
+        self.assertEqual(parse_network(' 18.0.0.1/8 '), (socket.AF_INET, 0x12000000, 0x12ffffff))
+        self.assertEqual(parse_network('0.0.0.0/0'), (socket.AF_INET, 0, 0xffffffff))
+        self.assertEqual(parse_network('2001:db8::/32')[1:], (0x20010db8 << 96, (0x20010db9 << 96) - 1))
+        for invalid in ['', '18.244.*', '18.0.0.0/33', '18.0.0.0/x', '2001:db8::/129', ':dead:beef:::']:
+            with self.assertRaises(ValueError):
+                parse_network(invalid)
+
+    def test_addresses(self):
+        ranges = IPRanges(['127.0.0.1', ' 18.244.1.5 ', '2003:dead:beef:4dad:23:46:bb:101'])
+        self.assertIn('127.0.0.1', ranges)
+        self.assertIn('18.244.1.5', ranges)
+        self.assertIn('2003:dead:beef:4dad:23:46:bb:101', ranges)
+        # Compared as addresses, not strings
+        self.assertIn('2003:DEAD:beef:4dad:0023:0046:00bb:0101', ranges)
+        self.assertIn('::ffff:127.0.0.1', ranges)
+        for address in ['127.0.0.2', '18.244.1.4', '2003:dead:beef:4dad:23:46:bb:102', '', None, 'junk']:
+            self.assertNotIn(address, ranges)
+
+    def test_networks(self):
+        ranges = IPRanges(['18.0.0.0/8', '18.5.0.0/16', '19.0.0.0/8', '10.1.2.3/24', '2001:db8::/32', 'junk', ''])
+        for address in ['18.0.0.0', '18.255.255.255', '19.1.2.3', '10.1.2.0', '10.1.2.255', '2001:db8::1']:
+            self.assertIn(address, ranges)
+        for address in ['17.255.255.255', '20.0.0.0', '10.1.3.0', '2001:db9::', '::18.0.0.1']:
+            self.assertNotIn(address, ranges)
+
+    def test_empty(self):
+        self.assertNotIn('127.0.0.1', IPRanges([]))
+
+    def test_lookups_bisect(self):
+        # A blacklist of a few thousand addresses
+        addresses = ['10.{0}.{1}.1'.format(i // 256, i % 256) for i in xrange(5000)]
+        lookups = ['10.{0}.{1}.1'.format(i % 30, i % 256) for i in xrange(500)] + ['11.0.0.1'] * 500
+
+        start = time.time()
+        expected = [address in addresses for address in lookups]
+        scan_time = time.time() - start
+
+        ranges = IPRanges(addresses)
+        start = time.time()
+        with mock.patch('embargo.engine.bisect.bisect_right', side_effect=bisect.bisect_right) as bisect_right:
+            found = [address in ranges for address in lookups]
+        ranges_time = time.time() - start
+
+        log.info(
+            "%s lookups in %s addresses: scanning took %.3fs, ranges %.3fs",
+            len(lookups), len(addresses), scan_time, ranges_time
+        )
+        self.assertEqual(found, expected)
+        # Each lookup is a single binary search of the ranges, rather than a scan
+        self.assertEqual(bisect_right.call_count, len(lookups))
+        self.assertEqual(len(bisect_right.call_args[0][0]), len(addresses))
+
+
+class EmbargoEngineTest(TestCase):
+    """
+    Test the engine's caching of the GeoIP database and the configuration
+    """
+    def setUp(self):
+        self.engine = EmbargoEngine()
+
+    def tearDown(self):
+        # Explicitly clear ConfigurationModel's cache so tests have a clear cache
+        # and don't interfere with each other
+        cache.clear()
+
+    def test_ip_filter_refreshed(self):
+        IPFilter(whitelist='1.0.0.0', blacklist='5.0.0.0/8').save()
+        whitelist, blacklist = self.engine.ip_filter()
+        self.assertIn('1.0.0.0', whitelist)
+        self.assertIn('5.1.2.3', blacklist)
+        self.assertIs(self.engine.ip_filter(), (whitelist, blacklist))
+
+        IPFilter(whitelist='', blacklist='6.0.0.0/8').save()
+        whitelist, blacklist = self.engine.ip_filter()
+        self.assertNotIn('1.0.0.0', whitelist)
+        self.assertNotIn('5.1.2.3', blacklist)
+        self.assertIn('6.1.2.3', blacklist)
+
+    def test_countries_refreshed(self):
+        EmbargoedState(embargoed_countries='cu, ir').save()
+        self.assertEqual(self.engine.embargoed_countries(), frozenset(['CU', 'IR']))
+        EmbargoedState(embargoed_countries='SY').save()
+        self.assertEqual(self.engine.embargoed_countries(), frozenset(['SY']))
+
+    @mock.patch('embargo.engine.pygeoip.GeoIP')
+    def test_geoip_opened_once(self, geoip_class):
+        geoip_class.return_value.country_code_by_addr.return_value = 'US'
+        with override_settings(GEOIP_PATH='/geoip/one.dat'):
+            self.assertEqual(self.engine.country_code_by_addr('1.0.0.0'), 'US')
+            self.engine.country_code_by_addr('2.0.0.0')
+        geoip_class.assert_called_once_with('/geoip/one.dat', pygeoip.MMAP_CACHE)
+
+        # Reopened if the database moves
+        with override_settings(GEOIP_PATH='/geoip/two.dat'):
+            self.engine.country_code_by_addr('1.0.0.0')
+        self.assertEqual(geoip_class.call_count, 2)
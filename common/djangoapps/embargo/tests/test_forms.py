@@ -25,6 +25,10 @@ class EmbargoCourseFormTest(ModuleStoreTestCase):
         self.true_form_data = {'course_id': self.course.id, 'embargoed': True}
         self.false_form_data = {'course_id': self.course.id, 'embargoed': False}
 
+    def tearDown(self):
+        # Explicitly clear the cache, since EmbargoedCourse caches whether courses are embargoed
+        cache.clear()
+
     def test_embargo_course(self):
         self.assertFalse(EmbargoedCourse.is_embargoed(self.course.id))
         # Test adding embargo to this course
@@ -180,6 +184,20 @@ class IPFilterFormTest(TestCase):
         self.assertTrue(len(IPFilter.current().whitelist) == 0)
         self.assertTrue(len(IPFilter.current().blacklist) == 0)
 
+    def test_add_valid_networks(self):
+        form_data = {
+            'whitelist': '18.0.0.0/8, 2003:dead:beef::/48',
+            'blacklist': '18.244.1.0/24, 18.36.22.1'
+        }
+        form = IPFilterForm(data=form_data)
+        self.assertTrue(form.is_valid())
+        form.save()
+        self.assertEqual(IPFilter.current().whitelist_ips, ['18.0.0.0/8', '2003:dead:beef::/48'])
+        self.assertEqual(IPFilter.current().blacklist_ips, ['18.244.1.0/24', '18.36.22.1'])
+
+        form = IPFilterForm(data={'whitelist': '18.0.0.0/33', 'blacklist': '18.0.0.0/'})
+        self.assertFalse(form.is_valid())
+
     def test_add_invalid_ips(self):
         # test adding invalid ip addresses
         form_data = {
@@ -1,11 +1,17 @@
 """Test of models for embargo middleware app"""
 from django.test import TestCase
 
+# Explicitly import the cache from ConfigurationModel so we can reset it after each test
+from config_models.models import cache
 from embargo.models import EmbargoedCourse, EmbargoedState, IPFilter
 
 
 class EmbargoModelsTest(TestCase):
     """Test each of the 3 models in embargo.models"""
+    def tearDown(self):
+        # Explicitly clear the cache so tests don't interfere with each other
+        cache.clear()
+
     def test_course_embargo(self):
         course_id = 'abc/123/doremi'
         # Test that course is not authorized by default
@@ -32,6 +38,18 @@ class EmbargoModelsTest(TestCase):
             "Course 'abc/123/doremi' is Not Embargoed"
         )
 
+    def test_course_embargo_cached(self):
+        course_id = 'abc/123/doremi'
+        EmbargoedCourse(course_id=course_id, embargoed=True).save()
+        self.assertTrue(EmbargoedCourse.is_embargoed(course_id))
+        with self.assertNumQueries(0):
+            self.assertTrue(EmbargoedCourse.is_embargoed(course_id))
+            self.assertFalse(EmbargoedCourse.is_embargoed(None))
+
+        # Deleting the record is noticed too
+        EmbargoedCourse.objects.filter(course_id=course_id).delete()
+        self.assertFalse(EmbargoedCourse.is_embargoed(course_id))
+
     def test_state_embargo(self):
         # Azerbaijan and France should not be blocked
         good_states = ['AZ', 'FR']
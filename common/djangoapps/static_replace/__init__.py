@@ -1,5 +1,8 @@
+import hashlib
 import logging
 import re
+import threading
+from collections import OrderedDict
 
 from staticfiles.storage import staticfiles_storage
 from staticfiles import finders
@@ -8,9 +11,20 @@ from django.conf import settings
 from xmodule.modulestore.django import modulestore
 from xmodule.modulestore import XML_MODULESTORE_TYPE
 from xmodule.contentstore.content import StaticContent
+from request_cache.middleware import RequestCache
 
 log = logging.getLogger(__name__)
 
+# How many characters of rewritten text `replace_urls` keeps around
+REWRITTEN_CACHE_SIZE = 10 * 1024 * 1024
+# Recorded in place of a rewritten text that is the same as the original
+UNCHANGED = object()
+_rewritten = OrderedDict()
+_rewritten_size = 0
+_rewritten_lock = threading.Lock()
+# The compiled patterns of `replace_urls`, keyed by their static url prefix
+_url_patterns = {}
+
 
 def _url_replace_regex(prefix):
     """
@@ -90,19 +104,35 @@ def replace_course_urls(text, course_id):
     return re.sub(_url_replace_regex('/course/'), replace_course_url, text)
 
 
-def replace_static_urls(text, data_directory, course_id=None, static_asset_path=''):
+def _modulestore_type(course_id):
     """
-    Replace /static/$stuff urls either with their correct url as generated by collectstatic,
-    (/static/$md5_hashed_stuff) or by the course-specific content static url
-    /static/$course_data_dir/$stuff, or, if course_namespace is not None, by the
-    correct url in the contentstore (c4x://)
+    Return the type of the modulestore that course_id is in, memoized for the
+    rest of the request.
+    """
+    if RequestCache.get_current_request() is None:
+        return modulestore().get_modulestore_type(course_id)
+    store_types = RequestCache.get_request_cache().data.setdefault('static_replace.modulestore_types', {})
+    if course_id not in store_types:
+        store_types[course_id] = modulestore().get_modulestore_type(course_id)
+    return store_types[course_id]
 
-    text: The source text to do the substitution in
-    data_directory: The directory in which course data is stored
-    course_id: The course identifier used to distinguish static content for this course in studio
-    static_asset_path: Path for static assets, which overrides data_directory and course_namespace, if nonempty
+
+def _static_prefix_regex(data_directory, static_asset_path):
+    """
+    The regex matching the prefixes of the static urls that
+    replace_static_urls replaces.
     """
+    return u'(?:{static_url}|/static/)(?!{data_dir})'.format(
+        static_url=settings.STATIC_URL,
+        data_dir=static_asset_path or data_directory
+    )
+
 
+def _static_url_replacer(data_directory, course_id, static_asset_path, store_type):
+    """
+    Return the function which replaces a match of a static url.  `store_type()`
+    returns the type of the modulestore that course_id is in.
+    """
     def replace_static_url(match):
         original = match.group(0)
         prefix = match.group('prefix')
@@ -117,7 +147,7 @@ def replace_static_urls(text, data_directory, course_id=None, static_asset_path=
         if settings.DEBUG and finders.find(rest, True):
             return original
         # if we're running with a MongoBacked store course_namespace is not None, then use studio style urls
-        elif (not static_asset_path) and course_id and modulestore().get_modulestore_type(course_id) != XML_MODULESTORE_TYPE:
+        elif (not static_asset_path) and course_id and store_type() != XML_MODULESTORE_TYPE:
             # first look in the static file pipeline and see if we are trying to reference
             # a piece of static content which is in the edx-platform repo (e.g. JS associated with an xmodule)
 
@@ -151,11 +181,100 @@ def replace_static_urls(text, data_directory, course_id=None, static_asset_path=
 
         return "".join([quote, url, quote])
 
+    return replace_static_url
+
+
+def replace_static_urls(text, data_directory, course_id=None, static_asset_path=''):
+    """
+    Replace /static/$stuff urls either with their correct url as generated by collectstatic,
+    (/static/$md5_hashed_stuff) or by the course-specific content static url
+    /static/$course_data_dir/$stuff, or, if course_namespace is not None, by the
+    correct url in the contentstore (c4x://)
+
+    text: The source text to do the substitution in
+    data_directory: The directory in which course data is stored
+    course_id: The course identifier used to distinguish static content for this course in studio
+    static_asset_path: Path for static assets, which overrides data_directory and course_namespace, if nonempty
+    """
     return re.sub(
-        _url_replace_regex(u'(?:{static_url}|/static/)(?!{data_dir})'.format(
-            static_url=settings.STATIC_URL,
-            data_dir=static_asset_path or data_directory
-        )),
-        replace_static_url,
+        _url_replace_regex(_static_prefix_regex(data_directory, static_asset_path)),
+        _static_url_replacer(data_directory, course_id, static_asset_path, lambda: _modulestore_type(course_id)),
         text
     )
+
+
+def replace_urls(text, data_directory, course_id, jump_to_id_base_url, static_asset_path='', block_id=None):
+    """
+    Replace the static, /course/ and /jump_to_id/ urls in text, as
+    replace_static_urls, replace_course_urls and replace_jump_to_id_urls would
+    one after the other, but in a single pass over text.
+
+    The most recently rewritten texts are cached by block_id (e.g. the usage id
+    of the block that rendered text), a hash of text and the other arguments,
+    so rewriting the same html again is a lookup.
+
+    text: The content over which to perform the subtitutions
+    data_directory, static_asset_path: as for replace_static_urls
+    course_id: The course_id in which this rewrite happens
+    jump_to_id_base_url: as for replace_jump_to_id_urls
+    block_id: The id of the block that rendered text
+    """
+    # Whether a static file can be found changes as they're edited in debug mode
+    cacheable = not settings.DEBUG
+    store_type = _modulestore_type(course_id) if course_id and not static_asset_path else None
+    static_prefix = _static_prefix_regex(data_directory, static_asset_path)
+    if cacheable:
+        text_hash = hashlib.md5(text.encode('utf-8') if isinstance(text, unicode) else text).hexdigest()
+        key = (block_id, text_hash, course_id, store_type, static_prefix, static_asset_path, jump_to_id_base_url)
+        with _rewritten_lock:
+            rewritten = _rewritten.pop(key, None)
+            if rewritten is not None:
+                _rewritten[key] = rewritten
+                return text if rewritten is UNCHANGED else rewritten
+
+    replace_static_url = _static_url_replacer(data_directory, course_id, static_asset_path, lambda: store_type)
+    course_url = '/courses/' + course_id + '/'
+
+    def replace_url(match):
+        quote = match.group('quote')
+        rest = match.group('rest')
+        if match.group('static') is not None:
+            return replace_static_url(match)
+        elif match.group('course') is not None:
+            return "".join([quote, course_url, rest, quote])
+        else:
+            return "".join([quote, jump_to_id_base_url + rest, quote])
+
+    pattern = _url_patterns.get(static_prefix)
+    if pattern is None:
+        pattern = _url_patterns[static_prefix] = re.compile(_url_replace_regex(
+            u'(?P<static>{static})|(?P<course>/course/)|(?P<jump_to_id>/jump_to_id/)'.format(static=static_prefix)
+        ))
+    rewritten = pattern.sub(replace_url, text)
+
+    if cacheable and len(rewritten) <= REWRITTEN_CACHE_SIZE:
+        _cache_rewritten(key, UNCHANGED if rewritten == text else rewritten)
+    return rewritten
+
+
+def _cached_size(rewritten):
+    """
+    The number of characters a cached rewritten text counts for, including
+    a rough allowance for its key.
+    """
+    return 256 + (0 if rewritten is UNCHANGED else len(rewritten))
+
+
+def _cache_rewritten(key, rewritten):
+    """
+    Cache a text rewritten by replace_urls, evicting the least recently used
+    texts to stay within REWRITTEN_CACHE_SIZE.
+    """
+    global _rewritten_size  # pylint: disable=global-statement
+    with _rewritten_lock:
+        if key in _rewritten:
+            return
+        _rewritten[key] = rewritten
+        _rewritten_size += _cached_size(rewritten)
+        while _rewritten_size > REWRITTEN_CACHE_SIZE:
+            _rewritten_size -= _cached_size(_rewritten.popitem(last=False)[1])
@@ -2,6 +2,7 @@ import re
 
 from nose.tools import assert_equals, assert_true, assert_false  # pylint: disable=E0611
 from static_replace import (replace_static_urls, replace_course_urls,
+                            replace_jump_to_id_urls, replace_urls,
                             _url_replace_regex)
 from mock import patch, Mock
 from xmodule.modulestore import Location
@@ -104,6 +105,59 @@ def test_static_url_with_query(mock_modulestore, mock_storage):
     assert_equals(post_text, replace_static_urls(pre_text, DATA_DIRECTORY, COURSE_ID))
 
 
+JUMP_TO_ID_BASE_URL = '/courses/org/course/run/jump_to_id/'
+MIXED_SOURCE = (
+    '<img src="/static/file.png"/><a href="/course/info">info</a>'
+    '<a href=\'/jump_to_id/intro\'>intro</a><img src="/static/raw.png?raw"/>'
+)
+
+
+@patch('static_replace.staticfiles_storage')
+@patch('static_replace.modulestore')
+def test_replace_urls_single_pass(mock_modulestore, mock_storage):
+    """
+    Make sure replace_urls replaces urls just like the separate replacements
+    """
+    mock_storage.exists.return_value = False
+    mock_modulestore.return_value = Mock(MongoModuleStore)
+
+    separately = replace_jump_to_id_urls(
+        replace_course_urls(replace_static_urls(MIXED_SOURCE, DATA_DIRECTORY, COURSE_ID), COURSE_ID),
+        COURSE_ID,
+        JUMP_TO_ID_BASE_URL
+    )
+    together = replace_urls(MIXED_SOURCE, DATA_DIRECTORY, COURSE_ID, JUMP_TO_ID_BASE_URL, block_id='single_pass')
+    assert_equals(separately, together)
+    assert_true('"/c4x/org/course/asset/file.png"' in together)
+    assert_true('"/courses/org/course/run/info"' in together)
+    assert_true("'/courses/org/course/run/jump_to_id/intro'" in together)
+    assert_true('"/static/raw.png?raw"' in together)
+
+
+@patch('static_replace.staticfiles_storage')
+@patch('static_replace.modulestore')
+def test_replace_urls_cached(mock_modulestore, mock_storage):
+    """
+    Make sure rewriting the same text again doesn't look anything up
+    """
+    mock_storage.exists.return_value = False
+    mock_modulestore.return_value = Mock(MongoModuleStore)
+    text = MIXED_SOURCE + '<img src="/static/other.png"/>'
+
+    rewritten = replace_urls(text, DATA_DIRECTORY, COURSE_ID, JUMP_TO_ID_BASE_URL, block_id='cached')
+    assert_equals(mock_storage.exists.call_count, 2)
+    assert_equals(mock_modulestore.return_value.get_modulestore_type.call_count, 1)
+
+    assert_equals(rewritten, replace_urls(text, DATA_DIRECTORY, COURSE_ID, JUMP_TO_ID_BASE_URL, block_id='cached'))
+    assert_equals(mock_storage.exists.call_count, 2)
+
+    # Not for different content, or in another course
+    replace_urls(text + ' ', DATA_DIRECTORY, COURSE_ID, JUMP_TO_ID_BASE_URL, block_id='cached')
+    assert_equals(mock_storage.exists.call_count, 4)
+    replace_urls(text, DATA_DIRECTORY, 'org/other/run', JUMP_TO_ID_BASE_URL, block_id='cached')
+    assert_equals(mock_storage.exists.call_count, 6)
+
+
 def test_regex():
     yes = ('"/static/foo.png"',
            '"/static/foo.png"',
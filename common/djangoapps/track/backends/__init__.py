@@ -26,3 +26,16 @@ class BaseBackend(object):
     def send(self, event):
         """Send event to tracker."""
         pass
+
+    def send_many(self, events):
+        """
+        Send a batch of events to tracker.
+
+        Backends able to store several events at once should override
+        this; by default each event is sent on its own.  Unlike `send`,
+        overrides raise an error storing the batch, so that the caller
+        (e.g. the buffered backend) can count the events lost.
+
+        """
+        for event in events:
+            self.send(event)
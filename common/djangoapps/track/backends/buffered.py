@@ -0,0 +1,210 @@
+"""
+Event tracker backend that buffers events and sends them to another
+backend in batches, from a background thread.
+
+Sending an event to the database on every tracked request adds a round
+trip to the request.  This backend only puts the event on a bounded
+in-memory queue; a flusher thread sends the queued events to the wrapped
+backend with `send_many` (a single bulk insert for the MongoDB and Django
+backends) once `batch_size` events are waiting, or `flush_interval`
+seconds after the oldest of them was queued.  Whatever is still queued is
+flushed when the process exits.  A process forked after events were
+queued starts with an empty queue, so that they're only sent once.
+
+When the queue is full, new events are dropped rather than blocking the
+request, and counted in `dropped`.  Example configuration::
+
+  TRACKING_BACKENDS = {
+      'mongo': {
+          'ENGINE': 'track.backends.buffered.BufferedBackend',
+          'OPTIONS': {
+              'backend': {
+                  'ENGINE': 'track.backends.mongodb.MongoBackend',
+                  'OPTIONS': {...},
+              },
+              'max_queue_size': 10000,
+              'batch_size': 100,
+              'flush_interval': 1,
+          }
+      }
+  }
+
+"""
+
+from __future__ import absolute_import
+
+import atexit
+import logging
+import os
+import threading
+import time
+import Queue
+
+from dogapi import dog_stats_api
+
+from track.backends import BaseBackend
+
+
+log = logging.getLogger(__name__)
+
+# How often, in seconds, the idle flusher thread checks whether to stop
+POLL_INTERVAL = 0.1
+
+
+class BufferedBackend(BaseBackend):
+    """Event tracker backend that sends events to another backend in batches"""
+
+    def __init__(self, backend, max_queue_size=10000, batch_size=100, flush_interval=1, **kwargs):
+        """
+        Wrap another event tracker backend.
+
+        :Parameters:
+
+          - `backend`: the wrapped backend, as a dict with its `ENGINE`
+            and `OPTIONS`, like the entries of TRACKING_BACKENDS
+          - `max_queue_size`: the most events to hold; further events are
+            dropped until the queue drains
+          - `batch_size`: the most events to send in one batch
+          - `flush_interval`: the most seconds an event waits in the queue
+            before its batch is sent
+
+        """
+        super(BufferedBackend, self).__init__(**kwargs)
+
+        # Imported here since the tracker imports the backends
+        from track.tracker import _instantiate_backend_from_name
+
+        self.backend = _instantiate_backend_from_name(backend['ENGINE'], backend.get('OPTIONS', {}))
+        self.batch_size = max(batch_size, 1)
+        self.flush_interval = flush_interval
+        self.queue = Queue.Queue(max_queue_size)
+
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+        # The process whose events are on the queue
+        self._queue_pid = os.getpid()
+
+        atexit.register(self.close)
+
+    @property
+    def backlog(self):
+        """The number of events waiting to be sent."""
+        return self.queue.qsize()
+
+    def send(self, event):
+        """Queue the event to be sent by the flusher thread."""
+        self._forget_inherited_events()
+        self._ensure_flusher()
+        try:
+            self.queue.put_nowait(event)
+        except Queue.Full:
+            with self._lock:
+                self.dropped += 1
+            dog_stats_api.increment('track.buffered.dropped')
+
+    def send_many(self, events):
+        for event in events:
+            self.send(event)
+
+    def flush(self):
+        """Send every queued event from the calling thread."""
+        self._forget_inherited_events()
+        while True:
+            batch = self._get_batch(block=False)
+            if not batch:
+                return
+            self._send_batch(batch)
+
+    def close(self):
+        """Stop the flusher thread and send whatever is still queued."""
+        self._stopping.set()
+        thread = self._thread
+        if thread is not None and self._pid == os.getpid():
+            thread.join(POLL_INTERVAL + 1)
+        self.flush()
+
+    def _forget_inherited_events(self):
+        """
+        Empty the queue in a process forked from the one that queued its
+        events, which sends them itself.
+        """
+        if self._queue_pid == os.getpid():
+            return
+        with self._lock:
+            if self._queue_pid != os.getpid():
+                self.queue = Queue.Queue(self.queue.maxsize)
+                self._queue_pid = os.getpid()
+
+    def _ensure_flusher(self):
+        """Start the flusher thread, also in forked child processes."""
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='track-buffered-flusher')
+            self._thread.daemon = True
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _run(self):
+        """Send batches until the backend is closed."""
+        while not self._stopping.is_set():
+            batch = self._get_batch(block=True)
+            if batch:
+                self._send_batch(batch)
+
+    def _get_batch(self, block):
+        """
+        Take up to `batch_size` events off the queue.
+
+        When blocking, wait for the first event until the backend is
+        closed, then until the batch is full or the first event has
+        waited `flush_interval` seconds.
+
+        """
+        batch = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            try:
+                if not block:
+                    event = self.queue.get_nowait()
+                else:
+                    # Wake up regularly to notice the backend being closed
+                    timeout = POLL_INTERVAL
+                    if deadline is not None:
+                        timeout = min(deadline - time.time(), timeout)
+                        if timeout <= 0:
+                            break
+                    event = self.queue.get(True, timeout)
+            except Queue.Empty:
+                if not block or self._stopping.is_set():
+                    break
+                continue
+            if deadline is None:
+                deadline = time.time() + self.flush_interval
+            batch.append(event)
+        return batch
+
+    def _send_batch(self, batch):
+        """Send a batch of events to the wrapped backend."""
+        try:
+            with dog_stats_api.timer('track.buffered.send_many'):
+                self.backend.send_many(batch)
+        except Exception:  # pylint: disable=broad-except
+            log.exception('Error sending batch of %d events to event tracker backend', len(batch))
+            with self._lock:
+                self.failed += len(batch)
+            dog_stats_api.increment('track.buffered.failed', len(batch))
+        else:
+            with self._lock:
+                self.sent += len(batch)
+            dog_stats_api.increment('track.buffered.sent', len(batch))
+        dog_stats_api.gauge('track.buffered.backlog', self.backlog)
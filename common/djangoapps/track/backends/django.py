@@ -75,9 +75,20 @@ class DjangoBackend(BaseBackend):
         self.name = name
 
     def send(self, event):
-        field_values = {x: event.get(x, '') for x in LOGFIELDS}
-        tldat = TrackingLog(**field_values)
+        tldat = self._tracking_log(event)
         try:
             tldat.save(using=self.name)
         except Exception as e:  # pylint: disable=broad-except
             log.exception(e)
+
+    def send_many(self, events):
+        """Save a batch of events with a single bulk insert, raising any error."""
+        logs = [self._tracking_log(event) for event in events]
+        if not logs:
+            return
+        TrackingLog.objects.using(self.name).bulk_create(logs)
+
+    def _tracking_log(self, event):
+        """Return an unsaved TrackingLog holding the fields of `event`."""
+        field_values = {x: event.get(x, '') for x in LOGFIELDS}
+        return TrackingLog(**field_values)
@@ -95,3 +95,13 @@ class MongoBackend(BaseBackend):
             # during the next event.
             msg = 'Error inserting to MongoDB event tracker backend'
             log.exception(msg)
+
+    def send_many(self, events):
+        """
+        Insert a batch of events in to the Mongo collection at once.
+        Raises PyMongoError if any of them couldn't be inserted.
+        """
+        if not events:
+            return
+        # Keep inserting the rest of the batch if one event fails
+        self.collection.insert(list(events), manipulate=False, continue_on_error=True)
@@ -0,0 +1,136 @@
+from __future__ import absolute_import
+
+import os
+import threading
+import time
+
+from django.test import TestCase
+from mock import patch
+
+from track.backends import BaseBackend
+from track.backends.buffered import BufferedBackend
+
+
+DUMMY_ENGINE = 'track.backends.tests.test_buffered.DummyBackend'
+
+
+class DummyBackend(BaseBackend):
+    """Records the batches it is sent, taking `delay` seconds per call."""
+    def __init__(self, delay=0, **options):
+        super(DummyBackend, self).__init__(**options)
+        self.delay = delay
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def send(self, event):
+        self.send_many([event])
+
+    def send_many(self, events):
+        self.release.wait()
+        time.sleep(self.delay)
+        self.batches.append(list(events))
+
+    @property
+    def events(self):
+        return [event for batch in self.batches for event in batch]
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class TestBufferedBackend(TestCase):
+    def _backend(self, delay=0, **options):
+        backend = BufferedBackend(
+            backend={'ENGINE': DUMMY_ENGINE, 'OPTIONS': {'delay': delay}},
+            **options
+        )
+        self.addCleanup(backend.close)
+        return backend
+
+    def test_wraps_backend(self):
+        backend = self._backend()
+        self.assertIsInstance(backend.backend, DummyBackend)
+
+    def test_flush_on_size(self):
+        backend = self._backend(batch_size=5, flush_interval=60)
+        for i in xrange(10):
+            backend.send({'test': i})
+
+        self.assertTrue(_wait_for(lambda: backend.sent == 10))
+        self.assertEqual(backend.backend.events, [{'test': i} for i in xrange(10)])
+        self.assertTrue(all(len(batch) <= 5 for batch in backend.backend.batches))
+        self.assertEqual(backend.backlog, 0)
+
+    def test_flush_on_time(self):
+        backend = self._backend(batch_size=100, flush_interval=0.1)
+        backend.send({'test': 1})
+        backend.send({'test': 2})
+
+        self.assertTrue(_wait_for(lambda: backend.sent == 2))
+        self.assertEqual(backend.backend.batches, [[{'test': 1}, {'test': 2}]])
+
+    def test_flush_on_close(self):
+        backend = self._backend(batch_size=100, flush_interval=60)
+        backend.backend.release.clear()
+        backend.send({'test': 1})
+        backend.send({'test': 2})
+        backend.backend.release.set()
+
+        backend.close()
+        self.assertEqual(backend.sent, 2)
+        self.assertEqual(backend.backend.events, [{'test': 1}, {'test': 2}])
+
+    def test_drops_when_full(self):
+        backend = self._backend(max_queue_size=2, batch_size=1, flush_interval=60)
+        # Stall the flusher on the first event so the queue fills up
+        backend.backend.release.clear()
+        backend.send({'test': 0})
+        self.assertTrue(_wait_for(lambda: backend.backlog == 0))
+
+        for i in xrange(1, 5):
+            backend.send({'test': i})
+        self.assertEqual(backend.backlog, 2)
+        self.assertEqual(backend.dropped, 2)
+
+        backend.backend.release.set()
+        self.assertTrue(_wait_for(lambda: backend.sent == 3))
+        self.assertEqual(backend.backend.events, [{'test': i} for i in xrange(3)])
+
+    def test_counts_failures(self):
+        backend = self._backend(batch_size=2, flush_interval=60)
+        backend.backend.send_many = lambda events: 1 / 0
+        backend.send({'test': 1})
+        backend.send({'test': 2})
+
+        self.assertTrue(_wait_for(lambda: backend.failed == 2))
+        self.assertEqual(backend.sent, 0)
+
+    def test_forked_process_forgets_queued_events(self):
+        backend = self._backend(batch_size=100, flush_interval=60)
+        backend.queue.put({'test': 1})
+
+        with patch('track.backends.buffered.os.getpid', return_value=os.getpid() + 1):
+            backend.flush()
+            self.assertEqual(backend.backlog, 0)
+            backend.send({'test': 2})
+            backend.close()
+
+        self.assertEqual(backend.backend.events, [{'test': 2}])
+
+    def test_batches(self):
+        # Each call to the wrapped backend is a round trip to the database
+        events = [{'test': i} for i in xrange(500)]
+
+        backend = self._backend(batch_size=100, flush_interval=60)
+        for event in events:
+            backend.send(event)
+        backend.close()
+
+        self.assertEqual(backend.sent, len(events))
+        self.assertEqual(backend.backend.events, events)
+        self.assertEqual(len(backend.backend.batches), 5)
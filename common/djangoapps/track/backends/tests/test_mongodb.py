@@ -3,6 +3,7 @@ from __future__ import absolute_import
 from uuid import uuid4
 
 from mock import patch
+from pymongo.errors import PyMongoError
 
 from django.test import TestCase
 
@@ -38,3 +39,21 @@ class TestMongoBackend(TestCase):
 
         self.assertEqual(events[0], first_argument(calls[0]))
         self.assertEqual(events[1], first_argument(calls[1]))
+
+    def test_mongo_backend_send_many(self):
+        events = [{'test': 1}, {'test': 2}]
+
+        self.backend.send_many(events)
+
+        # Check the events were inserted with a single call
+        calls = self.backend.collection.insert.mock_calls
+        self.assertEqual(len(calls), 1)
+
+        _, args, _ = calls[0]
+        self.assertEqual(events, args[0])
+
+    def test_mongo_backend_send_many_raises(self):
+        self.backend.collection.insert.side_effect = PyMongoError
+
+        with self.assertRaises(PyMongoError):
+            self.backend.send_many([{'test': 1}])
@@ -128,6 +128,22 @@ def replace_static_urls(data_dir, block, view, frag, context, course_id=None, st
     ))
 
 
+def replace_urls(data_dir, course_id, jump_to_id_base_url, block, view, frag, context, static_asset_path=''):  # pylint: disable=unused-argument
+    """
+    Substitutes the /static/, /course/ and /jump_to_id/ urls in the fragment,
+    as replace_static_urls, replace_course_urls and replace_jump_to_id_urls
+    would, in a single pass over its content.
+    """
+    return wrap_fragment(frag, static_replace.replace_urls(
+        frag.content,
+        data_dir,
+        course_id,
+        jump_to_id_base_url,
+        static_asset_path=static_asset_path,
+        block_id=unicode(block.scope_ids.usage_id),
+    ))
+
+
 def grade_histogram(module_id):
     '''
     Print out a histogram of grades on a given problem in staff member debug info.
@@ -1,15 +1,18 @@
 """
 Parser and evaluator for FormulaResponse and NumericalResponse
 
-Uses pyparsing to parse. Main function as of now is evaluator().
+Uses pyparsing to parse. Main function as of now is evaluator(); use
+compile_expression() to evaluate the same expression many times.
 """
 
 import math
 import operator
 import numbers
+import threading
 import numpy
 import scipy.constants
 import functions
+from collections import OrderedDict
 
 from pyparsing import (
     Word, Literal, CaselessLiteral, ZeroOrMore, MatchFirst, Optional, Forward,
@@ -228,34 +231,251 @@ def evaluator(variables, functions, math_expr, case_sensitive=False):
     if math_expr.strip() == "":
         return float('nan')
 
-    # Parse the tree.
-    math_interpreter = ParseAugmenter(math_expr, case_sensitive)
-    math_interpreter.parse_algebra()
+    return compile_expression(math_expr, case_sensitive).evaluate(variables, functions)
 
-    # Get our variables together.
-    all_variables, all_functions = add_defaults(variables, functions, case_sensitive)
 
-    # ...and check them
-    math_interpreter.check_variables(all_variables, all_functions)
+# How many compiled expressions `compile_expression` keeps around.
+COMPILED_EXPRESSION_CACHE_SIZE = 1000
+_compiled_expressions = OrderedDict()
+_compiled_expressions_lock = threading.Lock()
 
-    # Create a recursion to evaluate the tree.
-    if case_sensitive:
-        casify = lambda x: x
-    else:
-        casify = lambda x: x.lower()  # Lowercase for case insens.
-
-    evaluate_actions = {
-        'number': eval_number,
-        'variable': lambda x: all_variables[casify(x[0])],
-        'function': lambda x: all_functions[casify(x[0])](x[1]),
-        'atom': eval_atom,
-        'power': eval_power,
-        'parallel': eval_parallel,
-        'product': eval_product,
-        'sum': eval_sum
-    }
-
-    return math_interpreter.reduce_tree(evaluate_actions)
+
+def compile_expression(math_expr, case_sensitive=False):
+    """
+    Parse an expression once into a `CompiledExpression` that can be evaluated
+    again and again, e.g. once per sample of its variables.
+
+    The most recently compiled expressions are cached, so calling this again
+    with the same `math_expr` doesn't parse it again.
+    """
+    key = (math_expr, case_sensitive)
+    with _compiled_expressions_lock:
+        compiled = _compiled_expressions.pop(key, None)
+        if compiled is not None:
+            _compiled_expressions[key] = compiled
+            return compiled
+
+    # Parse outside the lock; expressions which fail to parse aren't cached.
+    compiled = CompiledExpression(math_expr, case_sensitive)
+    with _compiled_expressions_lock:
+        _compiled_expressions[key] = compiled
+        while len(_compiled_expressions) > COMPILED_EXPRESSION_CACHE_SIZE:
+            _compiled_expressions.popitem(last=False)
+    return compiled
+
+
+class CompiledExpression(object):
+    """
+    A parsed expression, turned into a tree of closures which can be evaluated
+    without walking the parse tree again.
+
+    Each closure takes a `(variables, functions)` pair of dictionaries (with
+    the defaults added and keys casified) and returns the value of its node.
+    """
+    def __init__(self, math_expr, case_sensitive=False):
+        self.math_expr = math_expr
+        self.case_sensitive = case_sensitive
+        self.parse = ParseAugmenter(math_expr, case_sensitive)
+
+        if math_expr.strip() == "":
+            self.root = lambda context: float('nan')
+            return
+
+        self.parse.parse_algebra()
+
+        if case_sensitive:
+            casify = lambda x: x
+        else:
+            casify = lambda x: x.lower()  # Lowercase for case insens.
+
+        self.root = self.parse.reduce_tree({
+            'number': compile_number,
+            'variable': lambda x: compile_variable(casify(x[0])),
+            'function': lambda x: compile_function(casify(x[0]), x[1]),
+            'atom': compile_atom,
+            'power': compile_power,
+            'parallel': compile_parallel,
+            'product': compile_product,
+            'sum': compile_sum
+        })
+
+    def evaluate(self, variables, functions):
+        """
+        Return the value of the expression for the given variables and
+        functions, as `evaluator` would.
+        """
+        # Get our variables together...
+        all_variables, all_functions = add_defaults(variables, functions, self.case_sensitive)
+
+        # ...and check them
+        self.parse.check_variables(all_variables, all_functions)
+
+        return self.root((all_variables, all_functions))
+
+    def evaluate_samples(self, variables_list, functions):
+        """
+        Return the list of values of the expression for each dictionary of
+        variables in `variables_list`.
+
+        All the samples are evaluated in one pass, with each variable bound to
+        a NumPy array of its sampled values. If that can't give exactly what
+        evaluating them one by one would (e.g. a sample divides by zero, or a
+        function only takes scalars), fall back to doing that.
+        """
+        if not variables_list:
+            return []
+
+        vectorized = None
+        if len(variables_list) > 1:
+            try:
+                vectorized = self._evaluate_vectorized(variables_list, functions)
+            except UndefinedVariable:
+                raise
+            except Exception:  # pylint: disable=broad-except
+                vectorized = None
+
+        if vectorized is None:
+            return [self.evaluate(variables, functions) for variables in variables_list]
+        return vectorized
+
+    def _evaluate_vectorized(self, variables_list, functions):
+        """
+        Evaluate all the samples at once, returning None if the result can't
+        be split back into one value per sample.
+
+        Any floating point error raises, rather than producing the inf or nan
+        that python floats wouldn't.
+        """
+        names = set(variables_list[0])
+        if any(set(variables) != names for variables in variables_list):
+            return None
+        vectors = {
+            name: numpy.array([variables[name] for variables in variables_list])
+            for name in names
+        }
+        if any(vector.dtype.kind not in 'fc' for vector in vectors.itervalues()):
+            return None
+
+        with numpy.errstate(divide='raise', over='raise', invalid='raise', under='ignore'):
+            result = self.evaluate(vectors, functions)
+
+        if isinstance(result, numpy.ndarray):
+            if result.shape != (len(variables_list),) or result.dtype.kind not in 'fc':
+                return None
+            return list(result)
+        if isinstance(result, numbers.Number):
+            # The expression doesn't depend on the sampled variables
+            return [result] * len(variables_list)
+        return None
+
+
+# The following functions compile parse results into the closures which make
+# up a CompiledExpression. Each takes the list of compiled child nodes, along
+# with any operator strings among them, like the evaluation actions above.
+
+def compile_number(parse_result):
+    """
+    Compile a number into a constant.
+    """
+    value = eval_number(parse_result)
+    return lambda context: value
+
+
+def compile_variable(name):
+    """
+    Look up the (casified) variable name.
+    """
+    return lambda context: context[0][name]
+
+
+def compile_function(name, argument):
+    """
+    Apply the (casified) function name to the compiled argument.
+    """
+    return lambda context: context[1][name](argument(context))
+
+
+def compile_atom(parse_result):
+    """
+    Return the compiled node wrapped by the atom, ignoring any parenthesis.
+    """
+    return next(k for k in parse_result if callable(k))
+
+
+def compile_power(parse_result):
+    """
+    Exponentiate the operands, right to left, as `eval_power` does.
+    """
+    operands = [k for k in parse_result if callable(k)]  # Ignore the '^' marks.
+    if len(operands) == 1:
+        return operands[0]
+
+    def power(context):
+        """
+        Raise `b` to the power of `a`, starting from the right.
+        """
+        return reduce(lambda a, b: b ** a, [operand(context) for operand in reversed(operands)])
+    return power
+
+
+def compile_parallel(parse_result):
+    """
+    Combine the operands with the parallel resistors operator, as `eval_parallel` does.
+    """
+    operands = [k for k in parse_result if callable(k)]  # Ignore the '||' marks.
+    if len(operands) == 1:
+        return operands[0]
+    return lambda context: eval_parallel([operand(context) for operand in operands])
+
+
+def compile_sum(parse_result):
+    """
+    Add the operands, keeping in mind their sign, as `eval_sum` does.
+    """
+    terms = []
+    current_op = operator.add
+    for token in parse_result:
+        if token == '+':
+            current_op = operator.add
+        elif token == '-':
+            current_op = operator.sub
+        else:
+            terms.append((current_op, token))
+
+    def add(context):
+        """
+        Sum the terms, starting from 0.0.
+        """
+        total = 0.0
+        for term_op, term in terms:
+            total = term_op(total, term(context))
+        return total
+    return add
+
+
+def compile_product(parse_result):
+    """
+    Multiply the operands, as `eval_product` does.
+    """
+    factors = []
+    current_op = operator.mul
+    for token in parse_result:
+        if token == '*':
+            current_op = operator.mul
+        elif token == '/':
+            current_op = operator.truediv
+        else:
+            factors.append((current_op, token))
+
+    def multiply(context):
+        """
+        Multiply the factors, starting from 1.0.
+        """
+        prod = 1.0
+        for factor_op, factor in factors:
+            prod = factor_op(prod, factor(context))
+        return prod
+    return multiply
 
 
 class ParseAugmenter(object):
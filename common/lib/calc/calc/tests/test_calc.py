@@ -558,3 +558,91 @@ class EvaluatorTest(unittest.TestCase):
             calc.evaluator({'r1': 5}, {}, "r1+r2")
         with self.assertRaisesRegexp(calc.UndefinedVariable, 'r1 r3'):
             calc.evaluator(variables, {}, "r1*r3", case_sensitive=True)
+
+
+class CompiledExpressionTest(unittest.TestCase):
+    """
+    Test calc.compile_expression and evaluating the compiled expressions,
+    one sample at a time or all at once
+    """
+    samples = [{'x': x, 'y': 1.5 - x} for x in numpy.linspace(-3.7, 3.9, 50)]
+
+    def assert_samples_match_evaluator(self, math_expr, samples=None, case_sensitive=False):
+        """
+        Evaluating all the samples at once gives what `evaluator` gives for each.
+        """
+        samples = samples or self.samples
+        compiled = calc.compile_expression(math_expr, case_sensitive)
+        results = compiled.evaluate_samples(samples, {})
+        self.assertEqual(len(results), len(samples))
+        for variables, result in zip(samples, results):
+            expected = calc.evaluator(variables, {}, math_expr, case_sensitive)
+            if numpy.isnan(expected):
+                self.assertTrue(numpy.isnan(result))
+            else:
+                self.assertAlmostEqual(result, expected)
+
+    def test_compiled_expressions_are_cached(self):
+        self.assertIs(calc.compile_expression('x^2 + y'), calc.compile_expression('x^2 + y'))
+        self.assertIsNot(
+            calc.compile_expression('x^2 + y'),
+            calc.compile_expression('x^2 + y', case_sensitive=True)
+        )
+
+    def test_evaluate(self):
+        compiled = calc.compile_expression('3*x + 2^y^2')
+        self.assertEqual(compiled.evaluate({'x': 1, 'y': 2}, {}), 3 + 2 ** 4)
+        self.assertEqual(compiled.evaluate({'x': 2, 'y': 1}, {}), 8.0)
+        self.assertTrue(numpy.isnan(calc.compile_expression('  ').evaluate({}, {})))
+
+    def test_evaluate_samples(self):
+        for math_expr in ('x', '-x + 2*y', 'x^2 - y/2', '2^x^2', 'sin(x)*cos(y) + e^x',
+                          'x*y/(x^2+1)', '(1 + i*x)^2', '3k + x', 'sec(x) + arctan(y)',
+                          'X + Y', '5', '1 || 2', 'pi', '-(x - (y - 2))'):
+            self.assert_samples_match_evaluator(math_expr)
+
+    def test_evaluate_samples_fallback(self):
+        """
+        Samples which numpy can't evaluate like python does, one by one, are
+        still evaluated as `evaluator` would.
+        """
+        # Domain errors give nan, unlike python's own operators
+        self.assert_samples_match_evaluator('sqrt(x)')
+        self.assert_samples_match_evaluator('x || y')
+        self.assert_samples_match_evaluator('fact(x)', [{'x': 3.0}, {'x': 4.0}, {'x': 5.0}])
+        self.assert_samples_match_evaluator('x*y', [{'x': 1.0, 'y': 2.0}, {'x': 3.0, 'y': 1.0, 'z': 5.0}])
+
+        compiled = calc.compile_expression('1/(x - 2)')
+        with self.assertRaises(ZeroDivisionError):
+            compiled.evaluate_samples([{'x': 1.0}, {'x': 2.0}, {'x': 3.0}], {})
+        with self.assertRaises(ValueError):
+            calc.compile_expression('fact(x)').evaluate_samples([{'x': 1.5}, {'x': 2.5}], {})
+        with self.assertRaisesRegexp(calc.UndefinedVariable, 'z'):
+            calc.compile_expression('x + z').evaluate_samples(self.samples, {})
+
+    def test_samples_evaluated_together(self):
+        """
+        Compiled samples are evaluated in one pass over the expression, rather
+        than once per sample, and the expression is only compiled once.
+        """
+        calls = []
+
+        def double(value):
+            """Double value, counting the calls"""
+            calls.append(value)
+            return 2 * value
+
+        math_expr = 'double(x)^2*sin(y) + 3*x*y/(1 + y^2) - e^(x/4) + sqrt(abs(y))'
+        samples = [{'x': x, 'y': x / 3 + 1} for x in numpy.linspace(1, 5, 200)]
+        functions = {'double': double}
+
+        expected = [calc.evaluator(variables, functions, math_expr) for variables in samples]
+        self.assertEqual(len(calls), len(samples))
+
+        del calls[:]
+        compiled = calc.compile_expression(math_expr)
+        results = compiled.evaluate_samples(samples, functions)
+        self.assertEqual(len(calls), 1)
+        for result, value in zip(results, expected):
+            self.assertAlmostEqual(result, value)
+        self.assertIs(calc.compile_expression(math_expr), compiled)
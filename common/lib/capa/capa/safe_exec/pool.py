@@ -0,0 +1,453 @@
+"""
+A pool of warm sandbox workers for capa's safe_exec.
+
+Running jailed code through codejail starts a new sandboxed Python for every
+execution, which then imports numpy, scipy and the rest of the assumed
+imports all over again.  That costs far more than running most problem code.
+
+A worker is a process started ahead of time with the same command line
+codejail uses for the sandboxed Python, so it runs as the sandbox user under
+the same AppArmor profile.  It imports the assumed modules while it's idle,
+then reads a single job from its stdin as one JSON object.  The job runs in a
+child forked from the worker, with the resource limits applied to it alone and
+a temporary directory of its own as its working directory.  The worker checks
+the job's result, writes the resulting globals (or the traceback) back to its
+stdout, removes the directory and exits.
+
+Every worker only ever runs one job, so a job can't find an earlier job's code
+or data in its worker, and killing its worker only loses its own result: the
+job is then run through codejail.  Workers are also made undumpable before
+they read their job, so that a job can't trace or read the memory of another
+worker, which runs as the same user.
+
+Code which needs files from a `python_path` isn't run in the pool, nor is any
+job when all the workers are busy or a worker breaks: those go through
+codejail as before.
+
+"""
+
+import atexit
+import json
+import logging
+import os
+import select
+import subprocess
+import tempfile
+import threading
+
+from codejail.safe_exec import safe_exec as codejail_safe_exec
+from codejail.safe_exec import json_safe, SafeExecException
+
+log = logging.getLogger(__name__)
+
+# The limits codejail applies when none are configured.
+DEFAULT_LIMITS = {
+    'CPU': 1,
+    'REALTIME': 1,
+    'VMEM': 0,
+}
+
+# How long to wait for a worker to start, or to answer beyond the job's
+# REALTIME limit.
+WORKER_GRACE_SECONDS = 30
+
+# The program run by each worker.  Formatted with the modules to import up
+# front and the limits to apply to each job.
+WORKER_CODE = r"""
+import ctypes, json, os, resource, select, shutil, signal, sys, tempfile, time, traceback
+
+for modname in %(modules)r:
+    try:
+        __import__(modname)
+    except Exception:
+        pass
+
+LIMITS = %(limits)r
+OK_TYPES = (type(None), int, long, float, str, unicode, list, tuple, dict)
+BAD_KEYS = ("__builtins__",)
+
+# Keep the job stream to ourselves: jobs only ever see /dev/null.
+requests = os.fdopen(os.dup(0), "r")
+responses = os.fdopen(os.dup(1), "w")
+devnull = os.open(os.devnull, os.O_RDWR)
+for fd in (0, 1, 2):
+    os.dup2(devnull, fd)
+
+
+def jsonable(value):
+    if not isinstance(value, OK_TYPES):
+        return False
+    try:
+        json.dumps(value)
+    except Exception:
+        return False
+    return True
+
+
+def vm_size():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[0]) * resource.getpagesize()
+    except Exception:
+        return None
+
+
+def run_job(job, result_fd):
+    os.setsid()
+    resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))
+    if LIMITS.get("CPU"):
+        resource.setrlimit(resource.RLIMIT_CPU, (LIMITS["CPU"], LIMITS["CPU"]))
+    if LIMITS.get("VMEM"):
+        # The limit is on what the job allocates, on top of the warm worker.
+        base = vm_size()
+        if base is not None:
+            limit = base + LIMITS["VMEM"]
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    g_dict = job["globals"]
+    try:
+        exec compile(job["code"], "jailed_code", "exec") in g_dict
+        result = {"globals": dict(
+            (key, value) for key, value in g_dict.iteritems() if key not in BAD_KEYS and jsonable(value)
+        )}
+    except BaseException:
+        result = {"error": traceback.format_exc()}
+    with os.fdopen(result_fd, "w") as result_file:
+        result_file.write(json.dumps(result))
+
+
+def checked(output):
+    # The job could have written anything to its result pipe, so only pass on
+    # a well-formed result, re-encoded onto the single line the parent reads.
+    try:
+        result = json.loads(output)
+    except ValueError:
+        return None
+    if not isinstance(result, dict) or len(result) != 1:
+        return None
+    if isinstance(result.get("globals"), dict) or isinstance(result.get("error"), basestring):
+        return json.dumps(result)
+    return None
+
+
+def make_undumpable():
+    # Other workers run as the same user: don't let their jobs trace this
+    # process or read its memory once it holds a job.  Forked jobs inherit it.
+    PR_SET_DUMPABLE = 4
+    if ctypes.CDLL(None, use_errno=True).prctl(PR_SET_DUMPABLE, 0, 0, 0, 0) != 0:
+        raise OSError(ctypes.get_errno(), "Couldn't make the worker undumpable")
+
+
+def reap(pid, deadline):
+    while deadline is not None:
+        done, status = os.waitpid(pid, os.WNOHANG)
+        if done:
+            return status
+        if time.time() > deadline:
+            os.kill(pid, signal.SIGKILL)
+            break
+        time.sleep(0.001)
+    return os.waitpid(pid, 0)[1]
+
+
+def run(job):
+    result_r, result_w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(result_r)
+            requests.close()
+            responses.close()
+            run_job(job, result_w)
+        finally:
+            os._exit(0)
+    os.close(result_w)
+
+    deadline = time.time() + LIMITS["REALTIME"] if LIMITS.get("REALTIME") else None
+    chunks = []
+    timed_out = False
+    while True:
+        timeout = None if deadline is None else max(deadline - time.time(), 0)
+        if not select.select([result_r], [], [], timeout)[0]:
+            timed_out = True
+            os.kill(pid, signal.SIGKILL)
+            break
+        chunk = os.read(result_r, 65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    os.close(result_r)
+    status = reap(pid, deadline)
+
+    output = "".join(chunks)
+    if timed_out:
+        return json.dumps({"error": "Jailed code timed out after %%s seconds" %% LIMITS["REALTIME"]})
+    elif status != 0 or not output:
+        return json.dumps({"error": "Jailed code exited with status %%s" %% status})
+    return checked(output) or json.dumps({"error": "Jailed code sent an invalid result"})
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix="sandbox-job-")
+    try:
+        os.chdir(workdir)
+        make_undumpable()
+        responses.write("ready\n")
+        responses.flush()
+
+        line = requests.readline()
+        if not line:
+            return
+        output = run(json.loads(line))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    responses.write(output + "\n")
+    responses.flush()
+
+
+main()
+"""
+
+
+class WorkerError(Exception):
+    """
+    A worker stopped responding properly.
+    """
+    pass
+
+
+class SandboxWorker(object):
+    """
+    One warm sandboxed Python process, as seen from the application.  It runs
+    a single job.
+    """
+    def __init__(self, command, modules, limits):
+        self.limits = limits
+        self.ready = False
+        self.process = subprocess.Popen(
+            command + ['-c', WORKER_CODE % {'modules': modules, 'limits': limits}],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=open(os.devnull, 'w'),
+            cwd=tempfile.gettempdir(),
+            env={},
+            close_fds=True,
+            preexec_fn=os.setsid,
+        )
+
+    def is_alive(self):
+        """
+        Is the worker process still running?
+        """
+        return self.process.poll() is None
+
+    def wait_until_ready(self, timeout=0):
+        """
+        Wait up to `timeout` seconds for the worker to finish starting, and
+        return whether it's waiting for its job.
+        """
+        if not self.ready and select.select([self.process.stdout], [], [], timeout)[0]:
+            self.ready = self.process.stdout.readline() == 'ready\n'
+        return self.ready
+
+    def run(self, code, globals_dict):
+        """
+        Run `code` with `globals_dict` in the worker, returning its response:
+        a dict with either the resulting "globals" or the "error" traceback.
+
+        Raises WorkerError if the worker doesn't respond properly.
+        """
+        job = json.dumps({'code': code, 'globals': json_safe(globals_dict)})
+        try:
+            self.process.stdin.write(job + '\n')
+            self.process.stdin.flush()
+        except (IOError, OSError) as exc:
+            raise WorkerError(u"Couldn't send job to sandbox worker: {}".format(exc))
+
+        timeout = (self.limits.get('REALTIME') or 0) + WORKER_GRACE_SECONDS
+        if not select.select([self.process.stdout], [], [], timeout)[0]:
+            raise WorkerError(u"Sandbox worker didn't respond in {} seconds".format(timeout))
+        line = self.process.stdout.readline()
+        if not line:
+            raise WorkerError(u"Sandbox worker exited")
+        try:
+            return json.loads(line)
+        except ValueError:
+            raise WorkerError(u"Sandbox worker sent an invalid response")
+
+    def close(self):
+        """
+        Stop the worker.
+        """
+        try:
+            self.process.stdin.close()
+            self.process.kill()
+            self.process.wait()
+        except (IOError, OSError):
+            pass
+
+
+class SandboxPool(object):
+    """
+    A bounded set of SandboxWorkers, handing each job to an idle one.
+    """
+    def __init__(self, command, size=4, limits=None, modules=()):
+        """
+        `command` is the argv which starts the sandboxed Python.
+
+        `size` is the most workers to run at once.
+
+        `limits` are codejail-style limits ("CPU", "REALTIME" and "VMEM"),
+        applied to each job.
+
+        `modules` are the names of the modules the workers import up front.
+        """
+        self.command = list(command)
+        self.size = size
+        self.limits = dict(DEFAULT_LIMITS)
+        self.limits.update(limits or {})
+        self.modules = list(modules)
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        """
+        Forget all workers, e.g. the ones a forked parent process started.
+        """
+        self._pid = os.getpid()
+        self._idle = []
+        self._started = 0
+
+    def _start_worker(self):
+        """
+        Start a new worker, or return None if that fails.
+        """
+        try:
+            return SandboxWorker(self.command, self.modules, self.limits)
+        except (IOError, OSError):
+            log.exception("Couldn't start sandbox worker")
+            return None
+
+    def _fill(self):
+        """
+        Start as many workers as the pool has room for.  They warm up while
+        they're idle.
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            to_start = self.size - self._started
+            self._started = self.size
+
+        # Start the workers outside the lock
+        started = [self._start_worker() for _ in xrange(to_start)]
+        with self._lock:
+            self._started -= started.count(None)
+            self._idle.extend(worker for worker in started if worker is not None)
+
+    def _checkout(self):
+        """
+        Return an idle worker which is ready for a job, waiting for one to
+        finish starting if need be.  Returns None if they're all busy.
+        """
+        self._fill()
+        with self._lock:
+            for worker in list(self._idle):
+                if not worker.is_alive():
+                    self._idle.remove(worker)
+                    self._started -= 1
+            if not self._idle:
+                return None
+            # The first worker started is the likeliest to be ready
+            ready = [worker for worker in self._idle if worker.wait_until_ready()]
+            worker = ready[0] if ready else self._idle[0]
+            self._idle.remove(worker)
+
+        if worker.wait_until_ready(WORKER_GRACE_SECONDS):
+            return worker
+        log.error("Sandbox worker didn't start in %s seconds", WORKER_GRACE_SECONDS)
+        self._retire(worker)
+        return None
+
+    def _retire(self, worker):
+        """
+        Stop a worker which has had its job, and start a fresh one in its place.
+        """
+        worker.close()
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            self._started -= 1
+        self._fill()
+
+    def safe_exec(self, code, globals_dict, python_path=None, slug=None):
+        """
+        Execute `code` in a sandbox worker, like codejail.safe_exec.safe_exec.
+
+        Any changes the code makes to the globals are visible in `globals_dict`
+        afterwards.  Raises SafeExecException if the code raised an exception
+        or exceeded its limits.
+        """
+        worker = None if python_path else self._checkout()
+        if worker is None:
+            return codejail_safe_exec(code, globals_dict, python_path=python_path, slug=slug)
+
+        try:
+            response = worker.run(code, globals_dict)
+        except WorkerError:
+            log.exception("Sandbox worker failed running %s", slug)
+            self._retire(worker)
+            return codejail_safe_exec(code, globals_dict, python_path=python_path, slug=slug)
+        self._retire(worker)
+
+        if 'error' in response:
+            raise SafeExecException("Couldn't execute jailed code: %s" % response['error'])
+        globals_dict.update(response['globals'])
+
+    def close(self):
+        """
+        Stop all the idle workers.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._started -= len(idle)
+        for worker in idle:
+            worker.close()
+
+
+_POOL = None
+
+
+def configure_pool(python_bin, user=None, size=4, limits=None, modules=()):
+    """
+    Run safe_exec's sandboxed code in a pool of warm workers.
+
+    `python_bin` and `user` are the sandboxed Python and the user to run it
+    as, as configured for codejail.  See SandboxPool for the other arguments.
+    No workers are started until the pool is first used.
+    """
+    global _POOL  # pylint: disable=global-statement
+    command = []
+    if user:
+        command.extend(['sudo', '-u', user])
+    command.extend([python_bin, '-E', '-B'])
+    if _POOL is not None:
+        _POOL.close()
+    _POOL = SandboxPool(command, size=size, limits=limits, modules=modules)
+    return _POOL
+
+
+def get_pool():
+    """
+    Return the configured SandboxPool, or None.
+    """
+    return _POOL
+
+
+@atexit.register
+def _close_pool():
+    """
+    Don't leave workers behind.
+    """
+    if _POOL is not None and _POOL._pid == os.getpid():  # pylint: disable=protected-access
+        _POOL.close()
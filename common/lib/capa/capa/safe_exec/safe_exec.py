@@ -4,6 +4,7 @@ from codejail.safe_exec import safe_exec as codejail_safe_exec
 from codejail.safe_exec import not_safe_exec as codejail_not_safe_exec
 from codejail.safe_exec import json_safe, SafeExecException
 from . import lazymod
+from . import pool
 from dogapi import dog_stats_api
 
 import hashlib
@@ -47,6 +48,17 @@ for name, modname in ASSUMED_IMPORTS:
 LAZY_IMPORTS = "".join(LAZY_IMPORTS)
 
 
+def configure_pool(python_bin, user=None, size=4, limits=None):
+    """
+    Run sandboxed code in a pool of warm workers which have already imported
+    the assumed imports.  See `capa.safe_exec.pool`.
+    """
+    return pool.configure_pool(
+        python_bin, user, size=size, limits=limits,
+        modules=[modname for _, modname in ASSUMED_IMPORTS],
+    )
+
+
 def update_hash(hasher, obj):
     """
     Update a `hashlib` hasher with a nested object.
@@ -116,6 +128,8 @@ def safe_exec(code, globals_dict, random_seed=None, python_path=None, cache=None
     # Decide which code executor to use.
     if unsafely:
         exec_fn = codejail_not_safe_exec
+    elif pool.get_pool() is not None:
+        exec_fn = pool.get_pool().safe_exec
     else:
         exec_fn = codejail_safe_exec
 
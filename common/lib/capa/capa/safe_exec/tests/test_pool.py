@@ -0,0 +1,172 @@
+"""Test pool.py"""
+
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+from mock import patch
+
+from capa.safe_exec import pool, safe_exec, configure_pool
+from codejail.safe_exec import SafeExecException
+
+
+class TestSandboxPool(unittest.TestCase):
+    """
+    Run the workers unsandboxed, with this Python.
+    """
+    def make_pool(self, **kwargs):
+        """Make a pool of plain Python workers which is closed after the test."""
+        kwargs.setdefault('limits', {'CPU': 0, 'REALTIME': 5})
+        sandbox_pool = pool.SandboxPool([sys.executable, '-E', '-B'], **kwargs)
+        self.addCleanup(sandbox_pool.close)
+        return sandbox_pool
+
+    def test_set_values(self):
+        g = {'b': 2}
+        self.make_pool().safe_exec("a = b + 15", g)
+        self.assertEqual(g['a'], 17)
+
+    def test_raising_exceptions(self):
+        with self.assertRaises(SafeExecException) as cm:
+            self.make_pool().safe_exec("1/0", {})
+        self.assertIn("ZeroDivisionError", cm.exception.message)
+
+    def test_jobs_dont_share_state(self):
+        sandbox_pool = self.make_pool(size=1)
+        sandbox_pool.safe_exec("import sys; sys.leaked = True", {})
+        g = {}
+        sandbox_pool.safe_exec("import sys; leaked = hasattr(sys, 'leaked')", g)
+        self.assertFalse(g['leaked'])
+
+    def test_each_job_gets_a_fresh_worker(self):
+        sandbox_pool = self.make_pool(size=1)
+        worker_pids = []
+        for _ in xrange(3):
+            g = {}
+            sandbox_pool.safe_exec("import os; worker_pid = os.getppid()", g)
+            worker_pids.append(g['worker_pid'])
+        self.assertEqual(len(set(worker_pids)), 3)
+        self.assertNotIn(os.getpid(), worker_pids)
+
+    def test_jobs_cant_see_earlier_jobs(self):
+        sandbox_pool = self.make_pool(size=1)
+        sandbox_pool.safe_exec("answer = secret", {'secret': 'hunter2'})
+        g = {}
+        sandbox_pool.safe_exec("import __main__, gc; seen = repr(vars(__main__)) + repr(gc.get_objects())", g)
+        self.assertNotIn('hunter2', g['seen'])
+
+    def test_jobs_have_own_working_directory(self):
+        sandbox_pool = self.make_pool(size=2)
+        cwds = []
+        for _ in xrange(2):
+            g = {}
+            sandbox_pool.safe_exec("import os; cwd = os.getcwd()", g)
+            cwds.append(g['cwd'])
+        self.assertNotEqual(cwds[0], cwds[1])
+        for cwd in cwds:
+            self.assertNotEqual(cwd, os.path.realpath(tempfile.gettempdir()))
+            self.assertFalse(os.path.exists(cwd))
+
+    def test_workers_are_undumpable(self):
+        g = {}
+        self.make_pool().safe_exec(
+            "import ctypes; dumpable = ctypes.CDLL(None).prctl(3, 0, 0, 0, 0)", g   # PR_GET_DUMPABLE
+        )
+        self.assertEqual(g['dumpable'], 0)
+
+    @patch('capa.safe_exec.pool.codejail_safe_exec')
+    def test_killed_worker_uses_codejail(self, codejail_safe_exec):
+        sandbox_pool = self.make_pool(size=1)
+        sandbox_pool.safe_exec("import os, signal; os.kill(os.getppid(), signal.SIGKILL)", {})
+        self.assertTrue(codejail_safe_exec.called)
+
+        g = {}
+        sandbox_pool.safe_exec("a = 1", g)
+        self.assertEqual(g, {'a': 1})
+
+    def test_realtime_limit(self):
+        sandbox_pool = self.make_pool(size=1, limits={'CPU': 0, 'REALTIME': 1})
+        with self.assertRaises(SafeExecException) as cm:
+            sandbox_pool.safe_exec("while True: pass", {})
+        self.assertIn("timed out", cm.exception.message)
+
+        # The pool carries on after a job is killed
+        g = {}
+        sandbox_pool.safe_exec("a = 1", g)
+        self.assertEqual(g['a'], 1)
+
+    def test_cpu_limit(self):
+        sandbox_pool = self.make_pool(size=1, limits={'CPU': 1, 'REALTIME': 10})
+        with self.assertRaises(SafeExecException) as cm:
+            sandbox_pool.safe_exec("while True: pass", {})
+        self.assertIn("exited with status", cm.exception.message)
+
+    def test_vmem_limit(self):
+        sandbox_pool = self.make_pool(size=1, limits={'CPU': 0, 'REALTIME': 5, 'VMEM': 50 * 1024 * 1024})
+        with self.assertRaises(SafeExecException) as cm:
+            sandbox_pool.safe_exec("a = 'x' * (200 * 1024 * 1024)", {})
+        self.assertIn("MemoryError", cm.exception.message)
+
+    def test_cant_write_files(self):
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        with self.assertRaises(SafeExecException):
+            self.make_pool().safe_exec("with open(path, 'w') as f: f.write('hello')", {'path': path})
+        self.assertEqual(os.path.getsize(path), 0)
+
+    def test_forged_results_dont_reach_next_job(self):
+        sandbox_pool = self.make_pool(size=1)
+        forge = (
+            "import os\n"
+            "for fd in range(3, 256):\n"
+            "    try:\n"
+            "        os.write(fd, '\\n{\"globals\": {\"forged\": 1}}')\n"
+            "    except OSError:\n"
+            "        pass\n"
+        )
+        with self.assertRaises(SafeExecException):
+            sandbox_pool.safe_exec(forge, {})
+        # Even if the job exits before writing its own result
+        sandbox_pool.safe_exec(forge + "os._exit(0)\n", {})
+
+        g = {}
+        sandbox_pool.safe_exec("a = 1", g)
+        self.assertEqual(g, {'a': 1})
+
+    @patch('capa.safe_exec.pool.codejail_safe_exec')
+    def test_python_path_uses_codejail(self, codejail_safe_exec):
+        self.make_pool().safe_exec("a = 1", {}, python_path=['/tmp'])
+        self.assertTrue(codejail_safe_exec.called)
+
+    @patch('capa.safe_exec.pool.codejail_safe_exec')
+    def test_busy_pool_uses_codejail(self, codejail_safe_exec):
+        self.make_pool(size=0).safe_exec("a = 1", {})
+        self.assertTrue(codejail_safe_exec.called)
+
+
+class TestSafeExecWithPool(unittest.TestCase):
+    """
+    safe_exec behaves the same when it runs code in the pool.
+    """
+    def setUp(self):
+        sandbox_pool = configure_pool(sys.executable, limits={'CPU': 0, 'REALTIME': 5})
+        self.addCleanup(sandbox_pool.close)
+
+    def tearDown(self):
+        pool._POOL = None  # pylint: disable=protected-access
+
+    def test_random_seeding(self):
+        r = random.Random(17)
+        rnums = [r.randint(0, 999) for _ in xrange(100)]
+
+        g = {}
+        safe_exec("rnums = [random.randint(0, 999) for _ in xrange(100)]", g, random_seed=17)
+        self.assertEqual(g['rnums'], rnums)
+
+    def test_assumed_imports(self):
+        g = {}
+        safe_exec("a = int(math.pi)", g)
+        self.assertEqual(g['a'], 3)
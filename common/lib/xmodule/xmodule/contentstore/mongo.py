@@ -1,6 +1,12 @@
+import datetime
+import hashlib
+import tempfile
+import time
+
 import pymongo
 import gridfs
-from gridfs.errors import NoFile
+from bson.objectid import ObjectId
+from gridfs.errors import FileExists, NoFile
 
 from xmodule.modulestore import Location
 from xmodule.modulestore.mongo.base import location_to_query
@@ -14,14 +20,54 @@ from fs.osfs import OSFS
 import os
 import json
 
+# How much of an asset's data `save` holds in memory while hashing it,
+# before spilling it to a temporary file
+BLOB_SPOOL_SIZE = 4 * 1024 * 1024
+# How many bytes `save` reads from an asset's data at a time
+BLOB_READ_SIZE = 256 * 1024
+# How long `save` waits before checking again on a blob that's being stored or deleted
+BLOB_RETRY_SECONDS = 0.05
+# After how long a blob's deletion is taken to have been abandoned, and is finished by `save`
+BLOB_DELETE_TIMEOUT = datetime.timedelta(minutes=5)
+
+
+def _is_abandoned(deleting):
+    """
+    Was the blob deletion marked with the id `deleting` started so long ago
+    that it must have been abandoned?
+    """
+    started = deleting.generation_time.replace(tzinfo=None)
+    return started < datetime.datetime.utcnow() - BLOB_DELETE_TIMEOUT
+
 
 class MongoContentStore(ContentStore):
+    """
+    Stores assets in GridFS, deduplicated by their content.
+
+    The data of each distinct asset is stored once, as a blob in the
+    `blob_bucket` GridFS bucket whose _id is the md5 of the data.  Each asset
+    of a course is a record in the `bucket` files collection, shaped like a
+    GridFS file document, with a `blob` field naming its blob.  Blobs count
+    the records referencing them, and are deleted when none do.  So cloning
+    a course, moving an asset to the trashcan (a store with another bucket in
+    the same database) or importing an unchanged asset again only writes
+    records.
+
+    A blob being deleted is first marked as `deleting`, so that it isn't
+    referenced or stored again until its chunks are gone.
+
+    Assets saved before deduplication are GridFS files in `bucket` without a
+    `blob` field, and are still read (and replaced or deleted) as such.
+    """
     # pylint: disable=W0613
-    def __init__(self, host, db, port=27017, user=None, password=None, bucket='fs', collection=None, **kwargs):
+    def __init__(self, host, db, port=27017, user=None, password=None, bucket='fs', collection=None,
+                 blob_bucket='fs_blobs', **kwargs):
         """
         Establish the connection with the mongo backend and connect to the collections
 
         :param collection: ignores but provided for consistency w/ other doc_store_config patterns
+        :param blob_bucket: the GridFS bucket holding the data of the assets, which may be
+            shared by the stores of several buckets in the same database
         """
         logging.debug('Using MongoDB for static content serving at host={0} db={1}'.format(host, db))
         _db = pymongo.database.Database(
@@ -39,59 +85,192 @@ class MongoContentStore(ContentStore):
         self.fs = gridfs.GridFS(_db, bucket)
 
         self.fs_files = _db[bucket + ".files"]  # the underlying collection GridFS uses
+        self.fs_chunks = _db[bucket + ".chunks"]
+
+        self.blobs = gridfs.GridFS(_db, blob_bucket)
+        self.blob_files = _db[blob_bucket + ".files"]
+        self.blob_chunks = _db[blob_bucket + ".chunks"]
 
     def save(self, content):
-        content_id = content.get_id()
+        """
+        Save the asset, storing its data only if no other asset has the same data.
 
-        # Seems like with the GridFS we can't update existing ID's we have to do a delete/add pair
-        self.delete(content_id)
-
-        with self.fs.new_file(_id=content_id, filename=content.get_url_path(), content_type=content.content_type,
-                              displayname=content.name, thumbnail_location=content.thumbnail_location,
-                              import_path=content.import_path,
-                              # getattr b/c caching may mean some pickled instances don't have attr
-                              locked=getattr(content, 'locked', False)) as fp:
-            if hasattr(content.data, '__iter__'):
-                for chunk in content.data:
-                    fp.write(chunk)
+        If content.content_digest is set (e.g. because content was found in
+        this store), it must be the md5 of the data.
+        """
+        content_id = content.get_id()
+        blob_id = self._reference_blob(content)
+        blob = self.blob_files.find_one({'_id': blob_id})
+
+        # Swap the record in atomically, so that only the blob it replaced is uncounted
+        previous = self.fs_files.find_and_modify({'_id': content_id}, {
+            '_id': content_id,
+            'filename': content.get_url_path(),
+            'contentType': content.content_type,
+            'displayname': content.name,
+            'thumbnail_location': content.thumbnail_location,
+            'import_path': content.import_path,
+            # getattr b/c caching may mean some pickled instances don't have attr
+            'locked': getattr(content, 'locked', False),
+            'length': blob['length'],
+            'chunkSize': blob['chunkSize'],
+            'md5': blob['md5'],
+            'uploadDate': datetime.datetime.utcnow(),
+            'blob': blob_id,
+        }, upsert=True, fields={'blob': 1})
+
+        if previous is not None:
+            if 'blob' in previous:
+                self._dereference_blob(previous['blob'])
             else:
-                fp.write(content.data)
+                # stored before assets were deduplicated
+                self.fs_chunks.remove({'files_id': content_id})
 
         return content
 
     def delete(self, content_id):
-        if self.fs.exists({"_id": content_id}):
-            self.fs.delete(content_id)
+        # Remove the record atomically, so that only the blob it referenced is uncounted
+        record = self.fs_files.find_and_modify({'_id': content_id}, remove=True, fields={'blob': 1})
+        if record is None:
+            return
+        if 'blob' in record:
+            self._dereference_blob(record['blob'])
+        else:
+            # stored before assets were deduplicated
+            self.fs_chunks.remove({'files_id': content_id})
+
+    def _reference_blob(self, content):
+        """
+        Count a reference to the blob holding content's data, storing the blob
+        if there isn't one yet, and return its id.
+        """
+        # getattr b/c caching may mean some pickled instances don't have attr
+        digest = getattr(content, 'content_digest', None)
+        if digest is not None and self._increment_blob(digest):
+            return digest
+
+        with tempfile.SpooledTemporaryFile(max_size=BLOB_SPOOL_SIZE) as spool:
+            md5 = hashlib.md5()
+            for chunk in self._data_chunks(content):
+                if isinstance(chunk, unicode):
+                    chunk = chunk.encode('utf-8')
+                md5.update(chunk)
+                spool.write(chunk)
+            digest = md5.hexdigest()
+
+            # The blob may be deleted in between checking for it and
+            # referencing it, in which case it's stored again once the
+            # deletion has finished
+            while not self._increment_blob(digest):
+                blob = self.blob_files.find_one({'_id': digest}, fields=['deleting'])
+                if blob is not None:
+                    deleting = blob.get('deleting')
+                    if deleting is not None and _is_abandoned(deleting):
+                        self._finish_blob_delete(digest, deleting)
+                    else:
+                        time.sleep(BLOB_RETRY_SECONDS)
+                    continue
+                spool.seek(0)
+                try:
+                    self.blobs.put(spool, _id=digest, refcount=0)
+                except FileExists:
+                    # being stored by someone else in the meantime
+                    time.sleep(BLOB_RETRY_SECONDS)
+        return digest
+
+    def _increment_blob(self, blob_id):
+        """
+        Count a reference to the blob, returning False if there's no such blob
+        or it's being deleted.
+        """
+        result = self.blob_files.update(
+            {'_id': blob_id, 'deleting': {'$exists': False}},
+            {'$inc': {'refcount': 1}}
+        )
+        return result['n'] > 0
+
+    def _dereference_blob(self, blob_id):
+        """
+        Uncount a reference to the blob, deleting it if nothing references it any more.
+        """
+        blob = self.blob_files.find_and_modify({'_id': blob_id}, {'$inc': {'refcount': -1}}, new=True)
+        if blob is not None and blob.get('refcount', 0) <= 0:
+            # Unless it has been referenced again in the meantime
+            deleting = ObjectId()
+            result = self.blob_files.update(
+                {'_id': blob_id, 'refcount': {'$lte': 0}, 'deleting': {'$exists': False}},
+                {'$set': {'deleting': deleting}}
+            )
+            if result['n'] > 0:
+                self._finish_blob_delete(blob_id, deleting)
+
+    def _finish_blob_delete(self, blob_id, deleting):
+        """
+        Delete the blob marked as being deleted with the id `deleting`: its
+        chunks first, so that none of a blob stored again under the same id
+        are removed.
+        """
+        self.blob_chunks.remove({'files_id': blob_id})
+        self.blob_files.remove({'_id': blob_id, 'deleting': deleting})
+
+    @staticmethod
+    def _data_chunks(content):
+        """
+        Return an iterable of the chunks of content's data.
+        """
+        if isinstance(content, StaticContentStream):
+            return content.stream_data()
+        data = content.data
+        if hasattr(data, 'read'):
+            return iter(lambda: data.read(BLOB_READ_SIZE), '')
+        if hasattr(data, '__iter__'):
+            return data
+        return [data]
+
+    def _open(self, content_id):
+        """
+        Return the record of the asset and a GridOut reading its data.
+
+        Raises NoFile if there's no such asset.
+        """
+        record = self.fs_files.find_one({'_id': content_id})
+        if record is None:
+            raise NoFile()
+        if 'blob' in record:
+            return record, self.blobs.get(record['blob'])
+        return record, self.fs.get(content_id)
 
     def find(self, location, throw_on_not_found=True, as_stream=False):
         content_id = StaticContent.get_id_from_location(location)
         try:
-            if as_stream:
-                fp = self.fs.get(content_id)
-                return StaticContentStream(
-                    location, fp.displayname, fp.content_type, fp, last_modified_at=fp.uploadDate,
-                    thumbnail_location=getattr(fp, 'thumbnail_location', None),
-                    import_path=getattr(fp, 'import_path', None),
-                    length=fp.length, locked=getattr(fp, 'locked', False)
-                )
-            else:
-                with self.fs.get(content_id) as fp:
-                    return StaticContent(
-                        location, fp.displayname, fp.content_type, fp.read(), last_modified_at=fp.uploadDate,
-                        thumbnail_location=getattr(fp, 'thumbnail_location', None),
-                        import_path=getattr(fp, 'import_path', None),
-                        length=fp.length, locked=getattr(fp, 'locked', False)
-                    )
+            record, fp = self._open(content_id)
         except NoFile:
             if throw_on_not_found:
                 raise NotFoundError()
             else:
                 return None
 
+        kwargs = dict(
+            last_modified_at=record['uploadDate'],
+            thumbnail_location=record.get('thumbnail_location'),
+            import_path=record.get('import_path'),
+            length=record['length'], locked=record.get('locked', False),
+            content_digest=record.get('md5')
+        )
+        if as_stream:
+            return StaticContentStream(
+                location, record.get('displayname'), record.get('contentType'), fp, **kwargs
+            )
+        else:
+            with fp:
+                return StaticContent(
+                    location, record.get('displayname'), record.get('contentType'), fp.read(), **kwargs
+                )
+
     def get_stream(self, location):
         content_id = StaticContent.get_id_from_location(location)
         try:
-            handle = self.fs.get(content_id)
+            __, handle = self._open(content_id)
         except NoFile:
             raise NotFoundError()
 
@@ -134,7 +313,7 @@ class MongoContentStore(ContentStore):
             asset_location = Location(asset['_id'])
             self.export(asset_location, output_directory)
             for attr, value in asset.iteritems():
-                if attr not in ['_id', 'md5', 'uploadDate', 'length', 'chunkSize']:
+                if attr not in ['_id', 'md5', 'uploadDate', 'length', 'chunkSize', 'blob']:
                     policy.setdefault(asset_location.name, {})[attr] = value
 
         with open(assets_policy_file, 'w') as f:
@@ -219,7 +398,7 @@ class MongoContentStore(ContentStore):
         # raises exception if location is not fully specified
         Location.ensure_fully_specified(location)
         for attr in attr_dict.iterkeys():
-            if attr in ['_id', 'md5', 'uploadDate', 'length']:
+            if attr in ['_id', 'md5', 'uploadDate', 'length', 'blob']:
                 raise AttributeError("{} is a protected attribute.".format(attr))
         item = self.fs_files.find_one(location_to_query(location))
         if item is None:
@@ -35,7 +35,7 @@ def restore_asset_from_trashcan(location):
     store = contentstore()
 
     loc = StaticContent.get_location_from_path(location)
-    content = trash.find(loc)
+    content = trash.find(loc, as_stream=True)
 
     # ok, save the content into the courseware
     store.save(content)
@@ -43,7 +43,7 @@ def restore_asset_from_trashcan(location):
     # see if there is a thumbnail as well, if so move that as well
     if content.thumbnail_location is not None:
         try:
-            thumbnail_content = trash.find(content.thumbnail_location)
+            thumbnail_content = trash.find(content.thumbnail_location, as_stream=True)
             store.save(thumbnail_content)
         except Exception:
             pass  # OK if this is left dangling
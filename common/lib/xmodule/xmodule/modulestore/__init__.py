@@ -535,6 +535,17 @@ class ModuleStoreReadBase(ModuleStoreRead):
                 return c
         return None
 
+    def get_cached_parent_location(self, location, course_id):
+        """
+        Look up a parent of location in a child->parent index kept in memory (or in a
+        cache) by the modulestore, without querying the underlying store.
+
+        Returns None if the store keeps no such index or location isn't in it, in which
+        case callers should fall back to get_parent_locations. The index may lag writes
+        made by other processes, so only use it to navigate, never to edit.
+        """
+        return None
+
     def update_item(self, xblock, user_id=None, allow_not_found=False, force=False):
         """
         Update the given xblock's persisted repr. Pass the user's unique id which the persistent store
@@ -28,6 +28,10 @@ _MODULESTORES = {}
 
 FUNCTION_KEYS = ['render_template']
 
+# Sent by every modulestore created here when it changes an item, so that
+# receivers can invalidate whatever they derived from the course.
+modulestore_update_signal = Signal(providing_args=['modulestore', 'course_id', 'location'])
+
 
 def load_function(path):
     """
@@ -66,7 +70,7 @@ def create_modulestore_instance(engine, doc_store_config, options, i18n_service=
     return class_(
         metadata_inheritance_cache_subsystem=metadata_inheritance_cache,
         request_cache=request_cache,
-        modulestore_update_signal=Signal(providing_args=['modulestore', 'course_id', 'location']),
+        modulestore_update_signal=modulestore_update_signal,
         xblock_mixins=getattr(settings, 'XBLOCK_MIXINS', ()),
         xblock_select=getattr(settings, 'XBLOCK_SELECT_FUNCTION', None),
         doc_store_config=doc_store_config,
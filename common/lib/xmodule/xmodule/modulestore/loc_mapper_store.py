@@ -1,8 +1,12 @@
 '''
 Method for converting among our differing Location/Locator whatever reprs
 '''
+from collections import OrderedDict
+import copy
 from random import randint
 import re
+import threading
+import time
 import pymongo
 import bson.son
 
@@ -25,7 +29,13 @@ class LocMapperStore(object):
 
     The expectation is that the configuration will have this use the same store as whatever is the default
     or dominant store, but that's not a requirement. This store creates its own connection.
+
+    Besides caching each translation in the given cache, the store keeps the map entries of the
+    MAP_ENTRY_CACHE_SIZE most recently used courses in process for up to MAP_ENTRY_CACHE_TTL seconds, so that
+    translating the rest of a course's locations doesn't refetch its map.
     '''
+    MAP_ENTRY_CACHE_SIZE = 64
+    MAP_ENTRY_CACHE_TTL = 60
 
     def __init__(
         self, cache, host, db, collection, port=27017, user=None, password=None,
@@ -49,6 +59,9 @@ class LocMapperStore(object):
         self.location_map = self.db[collection + '.location_map']
         self.location_map.write_concern = {'w': 1}
         self.cache = cache
+        # frozen location_id query -> (time fetched, map entry)
+        self._map_entries = OrderedDict()
+        self._map_entries_lock = threading.Lock()
 
     # location_map functions
     def create_map_entry(self, course_location, package_id=None, draft_branch='draft', prod_branch='published',
@@ -117,6 +130,8 @@ class LocMapperStore(object):
             location_update = {'lower_id': location_id_lower, 'lower_course_id': package_id.lower()}
             self.location_map.update({'_id': location_id}, {'$set': location_update})
 
+        # the new entry may be the one some queries should now pick
+        self._clear_map_entries()
         return package_id
 
     def translate_location(self, old_style_course_id, location, published=True,
@@ -152,6 +167,90 @@ class LocMapperStore(object):
         if cached_value:
             return cached_value
 
+        published_usage, draft_usage = self._translate_from_map_entry(
+            location, location_id, add_entry_if_missing, passed_block_id
+        )
+        self._cache_location_map_entry(old_style_course_id, location, published_usage, draft_usage)
+        if published:
+            return published_usage
+        else:
+            return draft_usage
+
+    def translate_locations(self, old_style_course_id, locations, published=True, add_entry_if_missing=True):
+        """
+        Translate each of the given module locations to a Locator as translate_location does, but looking
+        up all their cached translations at once and fetching each course's map at most once. Returns the
+        Locators in the order of locations.
+
+        Will raise ItemNotFoundError if any location has no mapping and add_entry_if_missing is False.
+
+        :param old_style_course_id: the course_id used in old mongo not the new one (optional, will use
+        each location)
+        :param locations: a list of Locations pointing to modules
+        :param published: a boolean to indicate whether the caller wants the draft or published branch.
+        :param add_entry_if_missing: a boolean as to whether to raise ItemNotFoundError or to create an entry if
+        the course or a block is not found in the map.
+        """
+        location_ids = []
+        cache_keys = []
+        for location in locations:
+            location_id = self._interpret_location_course_id(old_style_course_id, location)
+            course_id = old_style_course_id or self._generate_location_course_id(location_id)
+            location_ids.append((location_id, course_id))
+            cache_keys.append(self._locator_cache_key(course_id, location))
+        cached_values = self.cache.get_many(cache_keys)
+
+        result = []
+        for location, (location_id, course_id), cache_key in zip(locations, location_ids, cache_keys):
+            usages = cached_values.get(cache_key)
+            if usages is None:
+                usages = self._translate_from_map_entry(location, location_id, add_entry_if_missing)
+                self._cache_location_map_entry(course_id, location, *usages)
+                cached_values[cache_key] = usages
+            result.append(usages[0] if published else usages[1])
+        return result
+
+    def _translate_from_map_entry(self, location, location_id, add_entry_if_missing, passed_block_id=None):
+        """
+        Return the published and draft BlockUsageLocators of location, looking it up in the map entry
+        which location_id queries for, and adding it to the map if it's missing and add_entry_if_missing.
+        """
+        entry, from_cache = self._get_map_entry(location, location_id, add_entry_if_missing)
+        block_id = self._block_id_in_map_entry(location, entry)
+        if block_id is None and from_cache:
+            # another process may have mapped it since
+            entry, __ = self._get_map_entry(location, location_id, add_entry_if_missing, refresh=True)
+            block_id = self._block_id_in_map_entry(location, entry)
+        if block_id is None:
+            if add_entry_if_missing:
+                # the entry may be shared with other threads; so, change a copy
+                block_id = self._add_to_block_map(
+                    location, location_id, copy.deepcopy(entry['block_map']), passed_block_id
+                )
+            else:
+                raise ItemNotFoundError(location)
+
+        published_usage = BlockUsageLocator(
+            package_id=entry['course_id'], branch=entry['prod_branch'], block_id=block_id)
+        draft_usage = BlockUsageLocator(
+            package_id=entry['course_id'], branch=entry['draft_branch'], block_id=block_id)
+        return published_usage, draft_usage
+
+    def _get_map_entry(self, location, location_id, add_entry_if_missing, refresh=False):
+        """
+        Return the map entry which location_id queries for and whether it came from the process's
+        cache of entries. Unless refresh, an entry fetched in the last MAP_ENTRY_CACHE_TTL seconds is
+        reused. The entry must not be changed other than by _add_to_block_map.
+        """
+        key = self._freeze_location_id(location_id)
+        if not refresh:
+            with self._map_entries_lock:
+                cached = self._map_entries.pop(key, None)
+                if cached is not None and cached[0] > time.time() - self.MAP_ENTRY_CACHE_TTL:
+                    # mark as most recently used
+                    self._map_entries[key] = cached
+                    return cached[1], True
+
         maps = self.location_map.find(location_id)
         maps = list(maps)
         if len(maps) == 0:
@@ -172,42 +271,49 @@ class LocMapperStore(object):
                     entry = item
                     break
 
+        with self._map_entries_lock:
+            self._map_entries.pop(key, None)
+            self._map_entries[key] = (time.time(), entry)
+            while len(self._map_entries) > self.MAP_ENTRY_CACHE_SIZE:
+                self._map_entries.popitem(last=False)
+        return entry, False
+
+    def _block_id_in_map_entry(self, location, entry):
+        """
+        Return the block_id location maps to in the entry, or None if it's not mapped.
+        """
         block_id = entry['block_map'].get(self.encode_key_for_mongo(location.name))
         if block_id is None:
-            if add_entry_if_missing:
-                block_id = self._add_to_block_map(
-                    location, location_id, entry['block_map'], passed_block_id
-                )
-            else:
-                raise ItemNotFoundError(location)
+            return None
         elif isinstance(block_id, dict):
             # jump_to_id uses a None category.
             if location.category is None:
                 if len(block_id) == 1:
                     # unique match (most common case)
-                    block_id = block_id.values()[0]
+                    return block_id.values()[0]
                 else:
                     raise InvalidLocationError()
-            elif location.category in block_id:
-                block_id = block_id[location.category]
-            elif add_entry_if_missing:
-                block_id = self._add_to_block_map(location, location_id, entry['block_map'])
-            else:
-                raise ItemNotFoundError(location)
+            return block_id.get(location.category)
         else:
             raise InvalidLocationError()
 
-        published_usage = BlockUsageLocator(
-            package_id=entry['course_id'], branch=entry['prod_branch'], block_id=block_id)
-        draft_usage = BlockUsageLocator(
-            package_id=entry['course_id'], branch=entry['draft_branch'], block_id=block_id)
-        if published:
-            result = published_usage
-        else:
-            result = draft_usage
+    def _freeze_location_id(self, location_id):
+        """
+        A hashable equivalent of the location_id query
+        """
+        if isinstance(location_id, dict):
+            return tuple((key, self._freeze_location_id(value)) for key, value in location_id.iteritems())
+        return location_id
 
-        self._cache_location_map_entry(old_style_course_id, location, published_usage, draft_usage)
-        return result
+    def _clear_map_entries(self, location_id=None):
+        """
+        Forget the process's cached map entry for location_id, or all of them if it's None
+        """
+        with self._map_entries_lock:
+            if location_id is None:
+                self._map_entries.clear()
+            else:
+                self._map_entries.pop(self._freeze_location_id(location_id), None)
 
     def translate_locator_to_location(self, locator, get_course=False, lower_only=False):
         """
@@ -336,6 +442,7 @@ class LocMapperStore(object):
         encoded_location_name = self.encode_key_for_mongo(location.name)
         block_map.setdefault(encoded_location_name, {})[location.category] = block_id
         self.location_map.update(location_id, {'$set': {'block_map': block_map}})
+        self._clear_map_entries(location_id)
         return block_id
 
     def _interpret_location_course_id(self, course_id, location, lower_only=False):
@@ -438,7 +545,7 @@ class LocMapperStore(object):
         """
         See if the location x published pair is in the cache. If so, return the mapped locator.
         """
-        entry = self.cache.get(u'{}+{}'.format(old_course_id, location.url()))
+        entry = self.cache.get(self._locator_cache_key(old_course_id, location))
         if entry is not None:
             if published:
                 return entry[0]
@@ -446,6 +553,12 @@ class LocMapperStore(object):
                 return entry[1]
         return None
 
+    def _locator_cache_key(self, old_course_id, location):
+        """
+        The cache key of the locators which location maps to
+        """
+        return u'{}+{}'.format(old_course_id, location.url())
+
     def _get_course_locator_from_cache(self, old_course_id, published):
         """
         Get the course Locator for this old course id
@@ -497,7 +610,7 @@ class LocMapperStore(object):
             setmany[u'courseIdLower+{}'.format(published_usage.package_id.lower())] = location
         setmany[unicode(published_usage)] = location
         setmany[unicode(draft_usage)] = location
-        setmany[u'{}+{}'.format(old_course_id, location.url())] = (published_usage, draft_usage)
+        setmany[self._locator_cache_key(old_course_id, location)] = (published_usage, draft_usage)
         setmany[old_course_id] = (published_usage, draft_usage)
         self.cache.set_many(setmany)
 
@@ -513,6 +626,7 @@ class LocMapperStore(object):
         )
 
         self.location_map.remove({'course_id': course_locator.package_id})
+        self._clear_map_entries()
         self._delete_cache_location_map_entry(
             course_location.course_id, course_location, course_locator, course_locator_draft
         )
@@ -528,6 +642,6 @@ class LocMapperStore(object):
 
         delete_keys.append(unicode(published_usage))
         delete_keys.append(unicode(draft_usage))
-        delete_keys.append(u'{}+{}'.format(old_course_id, location.url()))
+        delete_keys.append(self._locator_cache_key(old_course_id, location))
         delete_keys.append(old_course_id)
         self.cache.delete_many(delete_keys)
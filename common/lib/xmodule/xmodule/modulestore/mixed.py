@@ -174,6 +174,14 @@ class MixedModuleStore(ModuleStoreWriteBase):
         store = self._get_modulestore_for_courseid(course_id)
         return store.get_parent_locations(location, course_id)
 
+    def get_cached_parent_location(self, location, course_id):
+        """
+        returns a parent location for a given location and course_id from the
+        store's parent index, or None if it has none
+        """
+        store = self._get_modulestore_for_courseid(course_id)
+        return store.get_cached_parent_location(location, course_id)
+
     def get_modulestore_type(self, course_id):
         """
         Returns a type which identifies which modulestore is servicing the given course_id.
@@ -13,9 +13,9 @@ structure:
 """
 
 import pymongo
+import random
 import sys
 import logging
-import copy
 
 from bson.son import SON
 from fs.osfs import OSFS
@@ -34,6 +34,7 @@ from xmodule.modulestore import ModuleStoreWriteBase, Location, MONGO_MODULESTOR
 from xmodule.modulestore.exceptions import ItemNotFoundError
 from xmodule.modulestore.inheritance import own_metadata, InheritanceMixin, inherit_metadata, InheritanceKeyValueStore
 from xmodule.modulestore.xml import LocationReader
+from xmodule.modulestore.mongo.structure_cache import get_structure_cache, CachedModuleData, ITEM_NOT_FOUND
 from xmodule.tabs import StaticTab, CourseTabList
 from xblock.core import XBlock
 
@@ -244,6 +245,75 @@ def metadata_cache_key(location):
     return u"{0.org}/{0.course}".format(location)
 
 
+def metadata_generation_cache_key(key):
+    """The cache key of the edit generation of the course whose tree is cached under `key`."""
+    return key + u"/generation"
+
+
+def metadata_structure_cache_key(key):
+    """The cache key of the container structure of the course whose tree is cached under `key`."""
+    return key + u"/structure"
+
+
+class MetadataInheritanceTree(dict):
+    """
+    Maps the url of each block in a course to the inheritable metadata it gets
+    from its ancestors (merged with its own, for containers).
+
+    Also records the container structure it was computed from so that it can be
+    refreshed for just the subtree that was edited. Blocks which set no inheritable
+    metadata share their parent's dict, so entries must never be mutated in place.
+
+    The structure isn't pickled with the tree, which keeps the tree well within
+    what memcached stores; it's cached under its own key, and is None in a tree
+    read from the cache until it's looked up.
+    """
+    def __init__(self, *args, **kwargs):
+        super(MetadataInheritanceTree, self).__init__(*args, **kwargs)
+        # the url and own inheritable metadata of the course block
+        self.root = None
+        self.root_metadata = {}
+        # the edit generation of the course the tree was computed at, when
+        # shared through a caching subsystem
+        self.generation = None
+        # container url -> list of child urls, and child url -> container url
+        self.children = {}
+        self.parents = {}
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['children']
+        del state['parents']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__dict__.setdefault('generation', None)
+        self.children = None
+        self.parents = None
+
+    def copy(self):
+        """
+        Return a shallow copy of the tree which can be updated without affecting this one
+        """
+        tree = MetadataInheritanceTree(self)
+        tree.root = self.root
+        tree.root_metadata = self.root_metadata
+        tree.generation = self.generation
+        tree.children = dict(self.children)
+        tree.parents = dict(self.parents)
+        return tree
+
+    def prune(self, url):
+        """
+        Remove all the descendants of the block at url from the tree
+        """
+        for child in self.children.pop(url, []):
+            self.parents.pop(child, None)
+            self.pop(child, None)
+            self.prune(child)
+
+
 class MongoModuleStore(ModuleStoreWriteBase):
     """
     A Mongodb backed ModuleStore
@@ -257,9 +327,12 @@ class MongoModuleStore(ModuleStoreWriteBase):
                  default_class=None,
                  error_tracker=null_error_tracker,
                  i18n_service=None,
+                 structure_cache_size=0,
                  **kwargs):
         """
         :param doc_store_config: must have a host, db, and collection entries. Other common entries: port, tz_aware.
+        :param structure_cache_size: how many course structures loaded by get_item(..., depth=None) to keep
+            in the process-wide structure cache. 0 disables the cache.
         """
 
         super(MongoModuleStore, self).__init__(**kwargs)
@@ -280,6 +353,7 @@ class MongoModuleStore(ModuleStoreWriteBase):
                 db
             )
             self.collection = self.database[collection]
+            self.structure_cache_key = (host, port, db, collection)
 
             if user is not None and password is not None:
                 self.database.authenticate(user, password)
@@ -295,6 +369,8 @@ class MongoModuleStore(ModuleStoreWriteBase):
         self.collection.ensure_index(
             zip(('_id.' + field for field in Location._fields), repeat(1)),
         )
+        # and over the children lists, which get_parent_locations queries
+        self.collection.ensure_index('definition.children', background=True)
         # pylint: enable=no-member, protected_access
 
         if default_class is not None:
@@ -310,33 +386,38 @@ class MongoModuleStore(ModuleStoreWriteBase):
 
         self.ignore_write_events_on_courses = []
 
-    def compute_metadata_inheritance_tree(self, location):
-        '''
-        TODO (cdodge) This method can be deleted when the 'split module store' work has been completed
-        '''
-        # get all collections in the course, this query should not return any leaf nodes
-        # note this is a bit ugly as when we add new categories of containers, we have to add it here
+        if structure_cache_size:
+            self.structure_cache = get_structure_cache(
+                self.structure_cache_key, structure_cache_size, self.metadata_inheritance_cache_subsystem
+            )
+        else:
+            self.structure_cache = None
 
-        block_types_with_children = set(name for name, class_ in XBlock.load_classes() if getattr(class_, 'has_children', False))
-        query = {'_id.org': location.org,
-                 '_id.course': location.course,
-                 '_id.category': {'$in': list(block_types_with_children)}
-                 }
-        # we just want the Location, children, and inheritable metadata
+    def _block_types_with_children(self):
+        """
+        Return the set of block types which can have children
+        """
+        return set(name for name, class_ in XBlock.load_classes() if getattr(class_, 'has_children', False))
+
+    def _inheritance_record_filter(self):
+        """
+        Return the projection which fetches just the Location, children, and
+        inheritable metadata of a block
+        """
         record_filter = {'_id': 1, 'definition.children': 1}
 
         # just get the inheritable metadata since that is all we need for the computation
         # this minimizes both data pushed over the wire
         for field_name in InheritanceMixin.fields:
             record_filter['metadata.{0}'.format(field_name)] = 1
+        return record_filter
 
-        # call out to the DB
-        resultset = self.collection.find(query, record_filter)
-
-        results_by_url = {}
+    def _collate_inheritance_results(self, resultset, results_by_url):
+        """
+        Order the records in resultset by location url into results_by_url and
+        return the url of the course block, if one was found
+        """
         root = None
-
-        # now go through the results and order them by the location url
         for result in resultset:
             location = Location(result['_id'])
             # We need to collate between draft and non-draft
@@ -351,37 +432,194 @@ class MongoModuleStore(ModuleStoreWriteBase):
             results_by_url[location.url()] = result
             if location.category == 'course':
                 root = location.url()
+        return root
 
-        # now traverse the tree and compute down the inherited metadata
-        metadata_to_inherit = {}
+    def _inherit_metadata_down(self, results_by_url, url, metadata, tree):
+        """
+        Record in tree the metadata inherited by each descendant of the block at url,
+        whose own metadata merged with what it inherits is `metadata`.
 
-        def _compute_inherited_metadata(url):
-            """
-            Helper method for computing inherited metadata for a specific location url
-            """
-            my_metadata = results_by_url[url].get('metadata', {})
-
-            # go through all the children and recurse, but only if we have
-            # in the result set. Remember results will not contain leaf nodes
-            for child in results_by_url[url].get('definition', {}).get('children', []):
-                if child in results_by_url:
-                    new_child_metadata = copy.deepcopy(my_metadata)
-                    new_child_metadata.update(results_by_url[child].get('metadata', {}))
-                    results_by_url[child]['metadata'] = new_child_metadata
-                    metadata_to_inherit[child] = new_child_metadata
-                    _compute_inherited_metadata(child)
-                else:
-                    # this is likely a leaf node, so let's record what metadata we need to inherit
-                    metadata_to_inherit[child] = my_metadata
+        Blocks which set no inheritable metadata of their own share their parent's dict.
+        """
+        children = results_by_url[url].get('definition', {}).get('children', [])
+        tree.children[url] = children
+        # go through all the children and recurse, but only if we have
+        # in the result set. Remember results will not contain leaf nodes
+        for child in children:
+            tree.parents[child] = url
+            if child in results_by_url:
+                child_metadata = metadata
+                own_metadata = results_by_url[child].get('metadata', {})
+                if own_metadata:
+                    child_metadata = dict(metadata)
+                    child_metadata.update(own_metadata)
+                tree[child] = child_metadata
+                self._inherit_metadata_down(results_by_url, child, child_metadata, tree)
+            else:
+                # this is likely a leaf node, so let's record what metadata we need to inherit
+                tree[child] = metadata
+
+    def compute_metadata_inheritance_tree(self, location):
+        '''
+        TODO (cdodge) This method can be deleted when the 'split module store' work has been completed
+        '''
+        # get all collections in the course, this query should not return any leaf nodes
+        # note this is a bit ugly as when we add new categories of containers, we have to add it here
+        query = {'_id.org': location.org,
+                 '_id.course': location.course,
+                 '_id.category': {'$in': list(self._block_types_with_children())}
+                 }
 
+        # call out to the DB
+        resultset = self.collection.find(query, self._inheritance_record_filter())
+
+        # now go through the results and order them by the location url
+        results_by_url = {}
+        root = self._collate_inheritance_results(resultset, results_by_url)
+
+        # now traverse the tree and compute down the inherited metadata
+        tree = MetadataInheritanceTree()
         if root is not None:
-            _compute_inherited_metadata(root)
+            tree.root = root
+            tree.root_metadata = results_by_url[root].get('metadata', {})
+            self._inherit_metadata_down(results_by_url, root, tree.root_metadata, tree)
+
+        return tree
+
+    def _query_inheritance_subtree(self, location):
+        """
+        Return the inheritance records of the container at location and of all
+        the containers below it, by location url. Makes one query per level.
+        """
+        block_types_with_children = self._block_types_with_children()
+        record_filter = self._inheritance_record_filter()
+        results_by_url = {}
+        to_fetch = set([location.replace(revision=None).url()])
+        while to_fetch:
+            query = {'_id.org': location.org,
+                     '_id.course': location.course,
+                     '_id.category': {'$in': list(block_types_with_children)},
+                     '_id.name': {'$in': list(set(Location(url).name for url in to_fetch))},
+                     }
+            level = {}
+            self._collate_inheritance_results(
+                (
+                    result for result in self.collection.find(query, record_filter)
+                    if Location(result['_id']).replace(revision=None).url() in to_fetch
+                ),
+                level
+            )
+            results_by_url.update(level)
+            to_fetch = set(
+                child
+                for result in level.itervalues()
+                for child in result.get('definition', {}).get('children', [])
+                if child not in results_by_url and Location(child).category in block_types_with_children
+            )
+        return results_by_url
 
-        return metadata_to_inherit
+    def update_metadata_inheritance_tree(self, tree, location):
+        '''
+        Return a copy of the MetadataInheritanceTree `tree` updated for edits to the block
+        at location, querying only the subtree rooted at that block. Edits anywhere else
+        in the course must already be reflected in `tree`.
+        '''
+        url = location.replace(revision=None).url()
+        if tree.root is None or url == tree.root:
+            return self.compute_metadata_inheritance_tree(location)
+
+        # leaves contribute nothing to the tree, and blocks that aren't attached to
+        # the course yet only enter it when their new parent is saved
+        if url not in tree.parents or location.category not in self._block_types_with_children():
+            return tree
+
+        tree = tree.copy()
+        parent = tree.parents[url]
+        inherited = tree.root_metadata if parent == tree.root else tree[parent]
+
+        # drop the subtree as it was, as its children may have changed
+        tree.prune(url)
+
+        results_by_url = self._query_inheritance_subtree(location)
+        if url not in results_by_url:
+            # deleted: a missing child is treated like a leaf, as in the full computation
+            tree[url] = inherited
+            return tree
+
+        metadata = inherited
+        own_metadata = results_by_url[url].get('metadata', {})
+        if own_metadata:
+            metadata = dict(inherited)
+            metadata.update(own_metadata)
+        tree[url] = metadata
+        self._inherit_metadata_down(results_by_url, url, metadata, tree)
+        return tree
+
+    def _get_metadata_generation(self, key):
+        """
+        Return the current edit generation of the course whose tree is cached
+        under `key`, starting one if there's none (e.g. it was evicted).
+        """
+        generation_key = metadata_generation_cache_key(key)
+        generation = self.metadata_inheritance_cache_subsystem.get(generation_key)
+        if generation is None:
+            # a random start, so trees cached before an eviction don't match
+            self.metadata_inheritance_cache_subsystem.add(generation_key, random.getrandbits(48))
+            generation = self.metadata_inheritance_cache_subsystem.get(generation_key)
+        return generation
+
+    def _start_metadata_generation(self, key):
+        """
+        Atomically start a new edit generation of the course whose tree is
+        cached under `key` and return it, or None if the course had none.
+        """
+        try:
+            return self.metadata_inheritance_cache_subsystem.incr(metadata_generation_cache_key(key))
+        except ValueError:
+            return None
+
+    def _load_metadata_inheritance_structure(self, key, tree):
+        """
+        Attach the container structure cached for `tree` to it, returning False
+        if it isn't cached (or is from another generation).
+        """
+        if tree.parents is not None:
+            return True
+        structure = self.metadata_inheritance_cache_subsystem.get(metadata_structure_cache_key(key))
+        if structure is None or structure[0] != tree.generation:
+            return False
+        tree.children, tree.parents = structure[1], structure[2]
+        return True
+
+    def _get_previous_metadata_inheritance_tree(self, key, generation):
+        """
+        Return the last computed inheritance tree for the course key, if one is cached.
+        The shared caching subsystem is preferred as it reflects other processes' writes,
+        but its tree is only returned if it was computed at the generation just before
+        the refresh's own `generation`, and its structure is cached too.
+        """
+        if self.metadata_inheritance_cache_subsystem is not None:
+            if generation is None:
+                return None
+            tree = self.metadata_inheritance_cache_subsystem.get(key)
+            if not isinstance(tree, MetadataInheritanceTree) or tree.generation != generation - 1:
+                return None
+            if not self._load_metadata_inheritance_structure(key, tree):
+                return None
+            return tree
+        if self.request_cache is not None:
+            return self.request_cache.data.get('metadata_inheritance', {}).get(key)
+        return None
 
     def get_cached_metadata_inheritance_tree(self, location, force_refresh=False):
         '''
         TODO (cdodge) This method can be deleted when the 'split module store' work has been completed
+
+        Trees in the caching subsystem are tagged with the course's edit generation,
+        which each refresh atomically increments. A cached tree is only used while
+        its generation is current, and a refresh only updates the tree of the
+        generation before its own incrementally, so concurrent refreshes can't lose
+        each other's edits: on any conflict the tree is fully recomputed.
         '''
         key = metadata_cache_key(location)
         tree = {}
@@ -393,17 +631,39 @@ class MongoModuleStore(ModuleStoreWriteBase):
 
             # then look in any caching subsystem (e.g. memcached)
             if self.metadata_inheritance_cache_subsystem is not None:
-                tree = self.metadata_inheritance_cache_subsystem.get(key, {})
+                cached = self.metadata_inheritance_cache_subsystem.get_many([key, metadata_generation_cache_key(key)])
+                tree = cached.get(key, {})
+                generation = cached.get(metadata_generation_cache_key(key))
+                if getattr(tree, 'generation', None) is None or tree.generation != generation:
+                    # computed before the course's latest edit
+                    tree = {}
             else:
                 logging.warning('Running MongoModuleStore without a metadata_inheritance_cache_subsystem. This is OK in localdev and testing environment. Not OK in production.')
 
         if not tree:
-            # if not in subsystem, or we are on force refresh, then we have to compute
-            tree = self.compute_metadata_inheritance_tree(location)
+            # if not in subsystem, or we are on force refresh, then we have to compute. On a
+            # refresh after an edit, only the edited subtree of the previous tree needs recomputing
+            generation = previous = None
+            if force_refresh:
+                if self.metadata_inheritance_cache_subsystem is not None:
+                    generation = self._start_metadata_generation(key)
+                previous = self._get_previous_metadata_inheritance_tree(key, generation)
+            if self.metadata_inheritance_cache_subsystem is not None and generation is None:
+                # read before computing, so that the tree reflects every edit of its generation
+                generation = self._get_metadata_generation(key)
+
+            if isinstance(previous, MetadataInheritanceTree):
+                tree = self.update_metadata_inheritance_tree(previous, Location(location))
+            else:
+                tree = self.compute_metadata_inheritance_tree(location)
 
             # now write out computed tree to caching subsystem (e.g. memcached), if available
             if self.metadata_inheritance_cache_subsystem is not None:
-                self.metadata_inheritance_cache_subsystem.set(key, tree)
+                tree.generation = generation
+                self.metadata_inheritance_cache_subsystem.set_many({
+                    key: tree,
+                    metadata_structure_cache_key(key): (generation, tree.children, tree.parents),
+                })
 
         # now populate a request_cache, if available. NOTE, we are outside of the
         # scope of the above if: statement so that after a memcache hit, it'll get
@@ -592,10 +852,40 @@ class MongoModuleStore(ModuleStoreWriteBase):
             calls to get_children() to cache. None indicates to cache all descendents.
         """
         location = Location.ensure_fully_specified(location)
+        if depth is None and self.structure_cache is not None:
+            return self._get_item_from_structure_cache(location)
         item = self._find_one(location)
         module = self._load_items([item], depth)[0]
         return module
 
+    def _get_item_from_structure_cache(self, location):
+        """
+        Load the item at location with all of its descendants, reading the json
+        from the structure cache if this course hasn't changed since it was cached.
+        """
+        namespace = self.__class__.__name__
+        course_key = metadata_cache_key(location)
+        # read the generation before querying so that a write racing with this
+        # load leaves the result filed under an already stale generation
+        generation = self.structure_cache.generation(course_key)
+        cached = self.structure_cache.get_root(namespace, course_key, generation, location)
+        if cached is None:
+            try:
+                item = self._find_one(location)
+            except ItemNotFoundError:
+                self.structure_cache.set_root(namespace, course_key, generation, location, ITEM_NOT_FOUND)
+                raise
+            data_cache = self._cache_children([item], depth=None)
+            root = Location(item['location'])
+            self.structure_cache.set_root(namespace, course_key, generation, location, root, data_cache)
+        else:
+            root, modules = cached
+            if root is ITEM_NOT_FOUND:
+                raise ItemNotFoundError(location)
+            item, data_cache = modules[root], modules
+        # the json is now shared with other readers: descriptors must load from copies
+        return self._load_item(item, CachedModuleData(data_cache))
+
     def get_instance(self, course_id, location, depth=0):
         """
         TODO (vshnayder): implement policy tracking in mongo.
@@ -721,8 +1011,11 @@ class MongoModuleStore(ModuleStoreWriteBase):
 
     def fire_updated_modulestore_signal(self, course_id, location):
         """
-        Send a signal using `self.modulestore_update_signal`, if that has been set
+        Send a signal using `self.modulestore_update_signal`, if that has been set,
+        and invalidate any structures cached for the course
         """
+        if self.structure_cache is not None:
+            self.structure_cache.bump(course_id)
         if self.modulestore_update_signal is not None:
             self.modulestore_update_signal.send(self, modulestore=self, course_id=course_id,
                                                 location=location)
@@ -846,6 +1139,25 @@ class MongoModuleStore(ModuleStoreWriteBase):
                                      {'_id': True})
         return [Location(i['_id']) for i in items]
 
+    def get_cached_parent_location(self, location, course_id):
+        '''
+        Look up the parent of location in the child->parent map recorded in the
+        course's cached metadata inheritance tree, which every write refreshes.
+        The parent's revision is always None.
+        '''
+        if self.metadata_inheritance_cache_subsystem is None and self.request_cache is None:
+            # the tree would be recomputed on every call
+            return None
+        tree = self.get_cached_metadata_inheritance_tree(Location(location))
+        if not isinstance(tree, MetadataInheritanceTree):
+            return None
+        if self.metadata_inheritance_cache_subsystem is not None:
+            # a tree read from the cache is looked up without its structure
+            if not self._load_metadata_inheritance_structure(metadata_cache_key(Location(location)), tree):
+                return None
+        parent = tree.parents.get(Location(location).replace(revision=None).url())
+        return Location(parent) if parent is not None else None
+
     def get_modulestore_type(self, course_id):
         """
         Returns an enumeration-like type reflecting the type of this modulestore
@@ -0,0 +1,168 @@
+"""
+A process-wide cache of the module json that MongoModuleStore loads when it
+fetches a block together with all of its descendants.
+
+Every read of a course tree (e.g. `get_item(location, depth=None)`) otherwise
+re-queries Mongo level by level. The cache keeps the cleaned json of those
+subtrees per course, versioned by an edit generation. Any write to the course
+bumps the generation, so stale structures are simply never looked up again and
+age out of the bounded LRU.
+
+When a django-style cache (e.g. memcached) is supplied, the generation lives
+there so that a write made by one process (e.g. Studio) invalidates the
+structures held by every other process sharing that cache (e.g. the LMS).
+"""
+
+import copy
+import threading
+from collections import OrderedDict
+from uuid import uuid4
+
+
+# Recorded in place of a root location that wasn't found in the collection
+ITEM_NOT_FOUND = object()
+
+# The shared caches, one per (host, port, db, collection)
+_STRUCTURE_CACHES = {}
+_STRUCTURE_CACHES_LOCK = threading.Lock()
+
+
+def get_structure_cache(key, size, generation_cache=None):
+    """
+    Return the CourseStructureCache shared by every modulestore reading from
+    the collection identified by `key`, creating it if needed.
+
+    Draft and direct stores over the same collection must share a cache so
+    that a write through either one invalidates the other's structures.
+    """
+    with _STRUCTURE_CACHES_LOCK:
+        if key not in _STRUCTURE_CACHES:
+            _STRUCTURE_CACHES[key] = CourseStructureCache(size, generation_cache)
+        return _STRUCTURE_CACHES[key]
+
+
+class CourseStructureCache(object):
+    """
+    A bounded LRU of course structures, each tagged with the edit generation
+    of its course at the time it was read.
+
+    A structure is a pair of dicts: `modules` mapping Location -> cleaned item
+    json for every block loaded so far, and `roots` mapping the locations
+    requested with all their descendants -> the Location of the item found
+    (or ITEM_NOT_FOUND).
+    """
+    GENERATION_KEY = u'course_structure_generation/{0}'
+
+    def __init__(self, size, generation_cache=None):
+        """
+        size: the maximum number of (course, store class) structures to keep
+
+        generation_cache: an optional django-style cache in which to share
+            edit generations with other processes. Without it, generations
+            are only tracked within this process.
+        """
+        self.size = size
+        self.generation_cache = generation_cache
+        self._structures = OrderedDict()
+        self._generations = {}
+        self._lock = threading.RLock()
+
+    def generation(self, course_key):
+        """
+        Return the current edit generation for the course
+        """
+        if self.generation_cache is not None:
+            cache_key = self.GENERATION_KEY.format(course_key)
+            generation = self.generation_cache.get(cache_key)
+            if generation is None:
+                # never written, or evicted: anything we hold may be stale
+                generation = uuid4().hex
+                self.generation_cache.set(cache_key, generation)
+            return generation
+
+        with self._lock:
+            return self._generations.setdefault(course_key, 0)
+
+    def bump(self, course_key):
+        """
+        Start a new edit generation for the course, invalidating its cached structures
+        """
+        if self.generation_cache is not None:
+            self.generation_cache.set(self.GENERATION_KEY.format(course_key), uuid4().hex)
+
+        with self._lock:
+            self._generations[course_key] = self._generations.get(course_key, 0) + 1
+            for structure_key in [key for key in self._structures if key[1] == course_key]:
+                del self._structures[structure_key]
+
+    def get_root(self, namespace, course_key, generation, location):
+        """
+        Return (root, modules) for `location` read at `generation`, or None if
+        that subtree hasn't been cached. `root` is ITEM_NOT_FOUND if the
+        location didn't exist, else the Location of the root in `modules`.
+
+        namespace: distinguishes stores which assemble structures differently
+            (e.g. draft vs direct)
+        """
+        with self._lock:
+            structure_key = (namespace, course_key)
+            structure = self._structures.get(structure_key)
+            if structure is None or structure['generation'] != generation:
+                return None
+            if location not in structure['roots']:
+                return None
+            # mark as most recently used
+            del self._structures[structure_key]
+            self._structures[structure_key] = structure
+            return structure['roots'][location], structure['modules']
+
+    def set_root(self, namespace, course_key, generation, location, root, modules=None):
+        """
+        Record the subtree loaded for `location` at `generation`.
+
+        root: the Location of the item found for `location`, or ITEM_NOT_FOUND
+        modules: dict mapping Location -> cleaned item json for the subtree
+        """
+        if self.size <= 0:
+            return
+        with self._lock:
+            structure_key = (namespace, course_key)
+            structure = self._structures.pop(structure_key, None)
+            if structure is None or structure['generation'] != generation:
+                structure = {'generation': generation, 'modules': {}, 'roots': {}}
+            if modules:
+                # copy on write so readers holding the old dict never see it change
+                merged = dict(structure['modules'])
+                merged.update(modules)
+                structure['modules'] = merged
+            structure['roots'][location] = root
+            self._structures[structure_key] = structure
+            while len(self._structures) > self.size:
+                self._structures.popitem(last=False)
+
+    def clear(self):
+        """
+        Drop every cached structure
+        """
+        with self._lock:
+            self._structures.clear()
+
+
+class CachedModuleData(dict):
+    """
+    The module_data for a CachingDescriptorSystem built from a cached structure.
+
+    Items are deep-copied out of the shared structure the first time they are
+    read, so that descriptors can't mutate the cached json.
+    """
+    def __init__(self, shared):
+        super(CachedModuleData, self).__init__()
+        self._shared = shared
+
+    def __contains__(self, location):
+        return dict.__contains__(self, location) or location in self._shared
+
+    def get(self, location, default=None):
+        if not dict.__contains__(self, location) and location in self._shared:
+            self[location] = copy.deepcopy(self._shared[location])
+        return dict.get(self, location, default)
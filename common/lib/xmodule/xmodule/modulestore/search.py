@@ -81,10 +81,27 @@ def path_to_location(modulestore, course_id, location):
         # If we're here, there is no path
         return None
 
+    def find_cached_path_to_course():
+        '''Find a path up to the course using only the modulestore's parent
+        index, in the same form as find_path_to_course.
+
+        Return None if the index doesn't lead to the course.
+        '''
+        path = []
+        loc = Location(location)
+        while loc is not None and loc not in path:
+            path.append(loc)
+            if loc.category == "course":
+                if course_id == CourseDescriptor.location_to_id(loc):
+                    return path[::-1]
+                return None
+            loc = modulestore.get_cached_parent_location(loc, course_id)
+        return None
+
     if not modulestore.has_item(course_id, location):
         raise ItemNotFoundError
 
-    path = find_path_to_course()
+    path = find_cached_path_to_course() or find_path_to_course()
     if path is None:
         raise NoPathToItem(location)
 
@@ -7,6 +7,7 @@ from xmodule.errortracker import exc_info_to_str
 from xblock.runtime import KvsFieldData, IdReader
 from ..exceptions import ItemNotFoundError
 from .split_mongo_kvs import SplitMongoKVS
+from .definition_lazy_loader import DefinitionBatch
 from xblock.fields import ScopeIds
 from xmodule.modulestore.loc_mapper_store import LocMapperStore
 
@@ -61,6 +62,8 @@ class CachingDescriptorSystem(MakoDescriptorSystem):
         self.course_entry = course_entry
         self.lazy = lazy
         self.module_data = module_data
+        # the definitions the lazy loaders of module_data are waiting on
+        self.definition_batch = DefinitionBatch(modulestore)
         # Compute inheritance
         modulestore.inherit_settings(
             course_entry['structure'].get('blocks', {}),
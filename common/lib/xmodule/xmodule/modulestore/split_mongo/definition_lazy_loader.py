@@ -1,3 +1,6 @@
+import copy
+from collections import OrderedDict
+
 from xmodule.modulestore.locator import DefinitionLocator
 
 
@@ -8,18 +11,72 @@ class DefinitionLazyLoader(object):
     object doesn't force access during init but waits until client wants the
     definition. Only works if the modulestore is a split mongo store.
     """
-    def __init__(self, modulestore, definition_id):
+    def __init__(self, modulestore, definition_id, batch=None):
         """
         Simple placeholder for yet-to-be-fetched data
         :param modulestore: the pymongo db connection with the definitions
         :param definition_locator: the id of the record in the above to fetch
+        :param batch: an optional DefinitionBatch with which to fetch this definition
+            along with the others pending in it
         """
         self.modulestore = modulestore
         self.definition_locator = DefinitionLocator(definition_id)
+        self.batch = batch
+        if batch is not None:
+            batch.add(definition_id)
 
     def fetch(self):
         """
         Fetch the definition. Note, the caller should replace this lazy
         loader pointer with the result so as not to fetch more than once
         """
+        if self.batch is not None:
+            return self.batch.fetch(self.definition_locator.definition_id)
         return self.modulestore.db_connection.get_definition(self.definition_locator.definition_id)
+
+
+class DefinitionBatch(object):
+    """
+    The definitions which a CachingDescriptorSystem's lazy loaders haven't fetched yet.
+    Fetching any one of them fetches the others too (up to BATCH_SIZE at a time) in one
+    query, as the blocks prefetched together tend to be rendered together. A fetched
+    definition is only held until it's handed to the last loader waiting for it.
+    """
+    # The most definitions to fetch in one query
+    BATCH_SIZE = 200
+
+    def __init__(self, modulestore):
+        self.modulestore = modulestore
+        self.pending = OrderedDict()  # used as an ordered set
+        self.fetched = {}
+        # definition id -> how many loaders are yet to fetch it
+        self.waiting = {}
+
+    def add(self, definition_id):
+        """
+        Add the id to those to fetch with the next batch
+        """
+        self.waiting[definition_id] = self.waiting.get(definition_id, 0) + 1
+        if definition_id not in self.fetched:
+            self.pending[definition_id] = True
+
+    def fetch(self, definition_id):
+        """
+        Return the definition, fetching it and the pending definitions if it hasn't
+        been fetched yet. Returns None if there's no such definition.
+        """
+        if definition_id not in self.fetched:
+            self.pending.pop(definition_id, None)
+            batch = [definition_id]
+            while self.pending and len(batch) < self.BATCH_SIZE:
+                batch.append(self.pending.popitem(last=False)[0])
+            definitions = self.modulestore.db_connection.get_definitions(batch)
+            for batch_id in batch:
+                self.fetched[batch_id] = definitions.get(batch_id)
+
+        waiting = self.waiting.pop(definition_id, 0) - 1
+        if waiting > 0:
+            # another loader shares the definition, and the caller may change its fields
+            self.waiting[definition_id] = waiting
+            return copy.deepcopy(self.fetched[definition_id])
+        return self.fetched.pop(definition_id)
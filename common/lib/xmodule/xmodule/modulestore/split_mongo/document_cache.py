@@ -0,0 +1,245 @@
+"""
+A process-wide cache of the structure and definition documents that
+SplitMongoModuleStore reads.
+
+A structure or definition never changes once written: edits write a new
+one with a new _id. So the documents can be cached by _id, for as long as
+there's room, and shared by every thread. The one exception is rewriting a
+structure in place (e.g. migrating a course with `continue_version`), which
+goes through `MongoConnection.update_structure`. That starts a new structure
+generation: structures are cached by generation and _id, so every process
+sharing the generation stops using the structures it read before, once it
+next checks the generation (every GENERATION_CHECK_SECONDS).
+
+The cache is a bounded LRU of the BSON encoding of each document. Keeping the
+encoding makes its size easy to account for, and each read decodes a fresh
+copy, so the caller is free to change it (e.g. computing inheritance changes
+the blocks of a structure) without affecting the cache.
+
+When a django-style cache (e.g. memcached) is supplied, it's a second tier
+behind the in-process LRU, so that one process reading a document saves the
+others the round trip to Mongo. Documents larger than memcached's value limit
+simply aren't stored there. The structure generation is kept there too;
+without a shared cache, it's only tracked within the process.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from uuid import uuid4
+
+from bson import BSON
+
+
+# The kinds of documents cached
+STRUCTURE = 'structure'
+DEFINITION = 'definition'
+
+# The shared caches, one per (host, port, db, collection)
+_DOCUMENT_CACHES = {}
+_DOCUMENT_CACHES_LOCK = threading.Lock()
+
+
+def get_document_cache(key, max_size, shared_cache=None, tz_aware=True):
+    """
+    Return the DocumentCache shared by every modulestore reading from the
+    collections identified by `key`, creating it if needed.
+    """
+    with _DOCUMENT_CACHES_LOCK:
+        if key not in _DOCUMENT_CACHES:
+            _DOCUMENT_CACHES[key] = DocumentCache(
+                max_size, shared_cache=shared_cache, namespace=key, tz_aware=tz_aware
+            )
+        return _DOCUMENT_CACHES[key]
+
+
+class DocumentCache(object):
+    """
+    A bounded LRU of immutable documents, keyed by kind and _id, with an
+    optional second tier in a django-style cache.
+    """
+    SHARED_KEY = u'split_mongo_document/{0}'
+    GENERATION_KEY = u'split_mongo_structure_generation/{0}'
+    # How long the shared cache keeps the structure generation: losing it
+    # throws away every cached structure
+    GENERATION_TIMEOUT = 30 * 24 * 60 * 60
+    # How long a process goes on using the structure generation it last read
+    # from the shared cache before reading it again
+    GENERATION_CHECK_SECONDS = 5
+
+    def __init__(self, max_size, shared_cache=None, namespace=None, tz_aware=True):
+        """
+        max_size: the most bytes of encoded documents to keep in process
+
+        shared_cache: an optional django-style cache to also keep documents in
+
+        namespace: distinguishes the documents of different databases in the
+            shared cache
+
+        tz_aware: whether decoded datetimes are timezone aware, as they are
+            when read from the database
+        """
+        self.max_size = max_size
+        self.shared_cache = shared_cache
+        self.namespace = namespace
+        self.tz_aware = tz_aware
+        self.size = 0
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._generation = 0
+        # the generation last read from the shared cache, and when to read it again
+        self._shared_generation = None
+        self._shared_generation_expires = 0
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def generation(self):
+        """
+        Return the current structure generation, which must be read before the
+        structures to be cached at it are read from Mongo.
+        """
+        if self.shared_cache is None:
+            with self._lock:
+                return self._generation
+
+        with self._lock:
+            if time.time() < self._shared_generation_expires:
+                return self._shared_generation
+
+        cache_key = self._generation_key()
+        generation = self.shared_cache.get(cache_key)
+        if generation is None:
+            # never written, or evicted: anything we hold may be stale
+            self.shared_cache.add(cache_key, uuid4().hex, self.GENERATION_TIMEOUT)
+            generation = self.shared_cache.get(cache_key) or uuid4().hex
+        self._remember_generation(generation)
+        return generation
+
+    def bump_generation(self):
+        """
+        Start a new structure generation, after a structure was rewritten in place
+        """
+        if self.shared_cache is not None:
+            generation = uuid4().hex
+            self.shared_cache.set(self._generation_key(), generation, self.GENERATION_TIMEOUT)
+            self._remember_generation(generation)
+
+        with self._lock:
+            self._generation += 1
+
+    def _remember_generation(self, generation):
+        """
+        Use `generation`, read from or written to the shared cache, for the next
+        GENERATION_CHECK_SECONDS.
+        """
+        with self._lock:
+            self._shared_generation = generation
+            self._shared_generation_expires = time.time() + self.GENERATION_CHECK_SECONDS
+
+    def get(self, kind, doc_id, generation=None):
+        """
+        Return a copy of the cached document, or None if it isn't cached (at
+        `generation`, for structures).
+        """
+        key = (kind, doc_id, generation)
+        with self._lock:
+            encoded = self._documents.pop(key, None)
+            if encoded is not None:
+                # mark as most recently used
+                self._documents[key] = encoded
+                self.hits += 1
+
+        if encoded is None and self.shared_cache is not None:
+            encoded = self.shared_cache.get(self._shared_key(key))
+            if encoded is not None:
+                encoded = BSON(encoded)
+                self._store(key, encoded)
+                with self._lock:
+                    self.shared_hits += 1
+
+        if encoded is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        return encoded.decode(tz_aware=self.tz_aware)
+
+    def set(self, kind, doc_id, document, generation=None):
+        """
+        Cache the document, as it is now (and, for structures, at `generation`).
+        """
+        key = (kind, doc_id, generation)
+        encoded = BSON.encode(document)
+        self._store(key, encoded)
+        if self.shared_cache is not None:
+            self.shared_cache.set(self._shared_key(key), str(encoded))
+
+    def delete(self, kind, doc_id, generation=None):
+        """
+        Forget the document.
+        """
+        key = (kind, doc_id, generation)
+        with self._lock:
+            encoded = self._documents.pop(key, None)
+            if encoded is not None:
+                self.size -= len(encoded)
+        if self.shared_cache is not None:
+            self.shared_cache.delete(self._shared_key(key))
+
+    def clear(self):
+        """
+        Forget every document held in process.
+        """
+        with self._lock:
+            self._documents.clear()
+            self.size = 0
+
+    def stats(self):
+        """
+        Return a dict of the cache's counters, for monitoring.
+        """
+        with self._lock:
+            return {
+                'documents': len(self._documents),
+                'size': self.size,
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _store(self, key, encoded):
+        """
+        Keep the encoded document in process, evicting the least recently used
+        documents to make room.
+        """
+        if len(encoded) > self.max_size:
+            return
+        with self._lock:
+            previous = self._documents.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._documents[key] = encoded
+            self.size += len(encoded)
+            while self.size > self.max_size:
+                __, evicted = self._documents.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def _shared_key(self, key):
+        """
+        The key of a document in the shared cache, which must be short and
+        free of spaces for memcached.
+        """
+        return self.SHARED_KEY.format(
+            hashlib.md5(repr((self.namespace, key[0], str(key[1]), key[2]))).hexdigest()
+        )
+
+    def _generation_key(self):
+        """
+        The key of the structure generation in the shared cache.
+        """
+        return self.GENERATION_KEY.format(hashlib.md5(repr(self.namespace)).hexdigest())
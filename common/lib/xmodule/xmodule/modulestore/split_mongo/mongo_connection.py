@@ -3,16 +3,22 @@ Segregation of pymongo functions from the data modeling mechanisms for split mod
 """
 import pymongo
 
+from .document_cache import STRUCTURE, DEFINITION
+
 class MongoConnection(object):
     """
     Segregation of pymongo functions from the data modeling mechanisms for split modulestore.
     """
     def __init__(
-        self, db, collection, host, port=27017, tz_aware=True, user=None, password=None, **kwargs
+        self, db, collection, host, port=27017, tz_aware=True, user=None, password=None, document_cache=None,
+        **kwargs
     ):
         """
         Create & open the connection, authenticate, and provide pointers to the collections
+
+        :param document_cache: an optional DocumentCache in which to cache structures and definitions
         """
+        self.document_cache = document_cache
         self.database = pymongo.database.Database(
             pymongo.MongoClient(
                 host=host,
@@ -42,7 +48,7 @@ class MongoConnection(object):
         """
         Get the structure from the persistence mechanism whose id is the given key
         """
-        return self.structures.find_one({'_id': key})
+        return self._get_document(STRUCTURE, self.structures, key, self._structure_generation())
 
     def find_matching_structures(self, query):
         """
@@ -55,13 +61,21 @@ class MongoConnection(object):
         """
         Create the structure in the db
         """
+        generation = self._structure_generation()
         self.structures.insert(structure)
+        if self.document_cache is not None:
+            self.document_cache.set(STRUCTURE, structure['_id'], structure, generation)
 
     def update_structure(self, structure):
         """
         Update the db record for structure
         """
         self.structures.update({'_id': structure['_id']}, structure)
+        if self.document_cache is not None:
+            # the one case of a structure changing without getting a new _id: other
+            # processes may hold the old one, so none of the cached structures are used again
+            self.document_cache.bump_generation()
+            self.document_cache.set(STRUCTURE, structure['_id'], structure, self._structure_generation())
 
     def get_course_index(self, key):
         """
@@ -98,7 +112,27 @@ class MongoConnection(object):
         """
         Get the definition from the persistence mechanism whose id is the given key
         """
-        return self.definitions.find_one({'_id': key})
+        return self._get_document(DEFINITION, self.definitions, key)
+
+    def get_definitions(self, keys):
+        """
+        Get the definitions whose ids are the given keys in one query, as a dict of id -> definition.
+        Ids with no definition are left out.
+        """
+        definitions = {}
+        missing = []
+        for key in keys:
+            document = self.document_cache.get(DEFINITION, key) if self.document_cache is not None else None
+            if document is None:
+                missing.append(key)
+            else:
+                definitions[key] = document
+        if missing:
+            for document in self.definitions.find({'_id': {'$in': missing}}):
+                definitions[document['_id']] = document
+                if self.document_cache is not None:
+                    self.document_cache.set(DEFINITION, document['_id'], document)
+        return definitions
 
     def find_matching_definitions(self, query):
         """
@@ -112,5 +146,29 @@ class MongoConnection(object):
         Create the definition in the db
         """
         self.definitions.insert(definition)
+        if self.document_cache is not None:
+            self.document_cache.set(DEFINITION, definition['_id'], definition)
+
+    def _structure_generation(self):
+        """
+        The document cache's current structure generation, if there's a cache.
+        """
+        if self.document_cache is None:
+            return None
+        return self.document_cache.generation()
+
+    def _get_document(self, kind, collection, key, generation=None):
+        """
+        Get the document whose id is key from collection, or from the document
+        cache if it's there (at `generation`).
+        """
+        if self.document_cache is None:
+            return collection.find_one({'_id': key})
+        document = self.document_cache.get(kind, key, generation)
+        if document is None:
+            document = collection.find_one({'_id': key})
+            if document is not None:
+                self.document_cache.set(kind, key, document, generation)
+        return document
 
 
@@ -48,6 +48,7 @@ import threading
 import datetime
 import logging
 import re
+from collections import OrderedDict
 from importlib import import_module
 from path import path
 import copy
@@ -68,6 +69,7 @@ from .caching_descriptor_system import CachingDescriptorSystem
 from xblock.fields import Scope
 from bson.objectid import ObjectId
 from xmodule.modulestore.split_mongo.mongo_connection import MongoConnection
+from xmodule.modulestore.split_mongo.document_cache import get_document_cache
 from xblock.core import XBlock
 from xmodule.modulestore.loc_mapper_store import LocMapperStore
 
@@ -101,24 +103,40 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
 
     SCHEMA_VERSION = 1
     reference_type = Locator
+    # How many CachingDescriptorSystems each thread keeps
+    SYSTEM_CACHE_SIZE = 16
+
     def __init__(self, doc_store_config, fs_root, render_template,
                  default_class=None,
                  error_tracker=null_error_tracker,
                  loc_mapper=None,
                  i18n_service=None,
+                 document_cache_size=0,
                  **kwargs):
         """
         :param doc_store_config: must have a host, db, and collection entries. Other common entries: port, tz_aware.
+        :param document_cache_size: how many bytes of structures and definitions to keep in the
+            process-wide document cache, which also uses the metadata inheritance cache (e.g. memcached)
+            as a second tier. 0 disables the cache.
         """
 
         super(SplitMongoModuleStore, self).__init__(**kwargs)
         self.loc_mapper = loc_mapper
 
-        self.db_connection = MongoConnection(**doc_store_config)
+        if document_cache_size:
+            document_cache = get_document_cache(
+                tuple(doc_store_config.get(key) for key in ('host', 'port', 'db', 'collection')),
+                document_cache_size,
+                self.metadata_inheritance_cache_subsystem,
+                tz_aware=doc_store_config.get('tz_aware', True),
+            )
+        else:
+            document_cache = None
+        self.db_connection = MongoConnection(document_cache=document_cache, **doc_store_config)
         self.db = self.db_connection.database
 
-        # Code review question: How should I expire entries?
-        # _add_cache could use a lru mechanism to control the cache size?
+        # The descriptors of each system may be changed by the thread using them, so
+        # systems aren't shared between threads; the documents they're built from are
         self.thread_cache = threading.local()
 
         if default_class is not None:
@@ -139,7 +157,8 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         :param system: a CachingDescriptorSystem
         :param base_block_ids: list of block_ids to fetch
         :param depth: how deep below these to prefetch
-        :param lazy: whether to fetch definitions or use placeholders
+        :param lazy: whether to fetch definitions or use placeholders. The placeholders
+            fetch the definitions of all the blocks cached this way together.
         '''
         new_module_data = {}
         for block_id in base_block_ids:
@@ -152,7 +171,7 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
 
         if lazy:
             for block in new_module_data.itervalues():
-                block['definition'] = DefinitionLazyLoader(self, block['definition'])
+                block['definition'] = DefinitionLazyLoader(self, block['definition'], system.definition_batch)
         else:
             # Load all descendants by id
             descendent_definitions = self.db_connection.find_matching_definitions({
@@ -204,19 +223,28 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         :param course_version_guid:
         """
         if not hasattr(self.thread_cache, 'course_cache'):
-            self.thread_cache.course_cache = {}
-        system = self.thread_cache.course_cache
-        return system.get(course_version_guid)
+            self.thread_cache.course_cache = OrderedDict()
+        course_cache = self.thread_cache.course_cache
+        system = course_cache.pop(course_version_guid, None)
+        if system is not None:
+            # mark as most recently used
+            course_cache[course_version_guid] = system
+        return system
 
     def _add_cache(self, course_version_guid, system):
         """
-        Save this cache for subsequent access
+        Save this cache for subsequent access, evicting the least recently used
+        caches beyond SYSTEM_CACHE_SIZE
         :param course_version_guid:
         :param system:
         """
         if not hasattr(self.thread_cache, 'course_cache'):
-            self.thread_cache.course_cache = {}
-        self.thread_cache.course_cache[course_version_guid] = system
+            self.thread_cache.course_cache = OrderedDict()
+        course_cache = self.thread_cache.course_cache
+        course_cache.pop(course_version_guid, None)
+        course_cache[course_version_guid] = system
+        while len(course_cache) > self.SYSTEM_CACHE_SIZE:
+            course_cache.popitem(last=False)
         return system
 
     def _clear_cache(self, course_version_guid=None):
@@ -225,9 +253,9 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         :param course_version_guid: if provided, clear only this entry
         """
         if course_version_guid:
-            del self.thread_cache.course_cache[course_version_guid]
+            self.thread_cache.course_cache.pop(course_version_guid, None)
         else:
-            self.thread_cache.course_cache = {}
+            self.thread_cache.course_cache = OrderedDict()
 
     def _lookup_course(self, course_locator):
         '''
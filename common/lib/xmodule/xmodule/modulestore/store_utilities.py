@@ -174,12 +174,13 @@ def clone_course(modulestore, contentstore, source_location, dest_location, dele
     modules = modulestore.get_items([source_location.tag, source_location.org, source_location.course, None, None, 'draft'])
     _clone_modules(modulestore, modules, source_location, dest_location)
 
-    # now iterate through all of the assets and clone them
+    # now iterate through all of the assets and clone them, as streams since
+    # the clones share the stored data of the originals
     # first the thumbnails
     thumbs = contentstore.get_all_content_thumbnails_for_course(source_location)
     for thumb in thumbs:
         thumb_loc = Location(thumb["_id"])
-        content = contentstore.find(thumb_loc)
+        content = contentstore.find(thumb_loc, as_stream=True)
         content.location = content.location._replace(org=dest_location.org,
                                                      course=dest_location.course)
 
@@ -192,7 +193,7 @@ def clone_course(modulestore, contentstore, source_location, dest_location, dele
     assets, __ = contentstore.get_all_content_for_course(source_location)
     for asset in assets:
         asset_loc = Location(asset["_id"])
-        content = contentstore.find(asset_loc)
+        content = contentstore.find(asset_loc, as_stream=True)
         content.location = content.location._replace(org=dest_location.org,
                                                      course=dest_location.course)
 
@@ -9,7 +9,7 @@ from xmodule.modulestore import Location
 from xmodule.modulestore.locator import BlockUsageLocator
 from xmodule.modulestore.exceptions import ItemNotFoundError, InvalidLocationError
 from xmodule.modulestore.loc_mapper_store import LocMapperStore
-from mock import Mock
+from mock import Mock, patch
 
 
 class LocMapperSetupSansDjango(unittest.TestCase):
@@ -419,6 +419,74 @@ class TestLocationMapper(LocMapperSetupSansDjango):
         with self.assertRaises(ItemNotFoundError):
             chapter_xlate = loc_mapper().translate_location(None, eponymous_block, add_entry_if_missing=False)
 
+    def test_translate_locations(self):
+        """
+        Test translating many locations fetches the course's map once
+        """
+        org = 'foo_org'
+        course = 'bar_course'
+        old_style_course_id = '{}/{}/{}'.format(org, course, 'baz_run')
+        new_style_package_id = '{}.{}.{}'.format(org, course, 'baz_run')
+        loc_mapper().create_map_entry(
+            Location('i4x', org, course, 'course', 'baz_run'),
+            block_map={'abc123': {'problem': 'problem2'}, 'def456': {'vertical': 'vertical4'}},
+        )
+        locations = [
+            Location('i4x', org, course, 'vertical', 'def456'),
+            Location('i4x', org, course, 'problem', 'abc123'),
+            Location('i4x', org, course, 'html', 'intro'),
+        ]
+        location_map = loc_mapper().location_map
+        with patch.object(location_map, 'find', wraps=location_map.find) as find:
+            locators = loc_mapper().translate_locations(old_style_course_id, locations, published=False)
+            self.assertEqual([locator.block_id for locator in locators], ['vertical4', 'problem2', 'intro'])
+            self.assertEqual(set(locator.package_id for locator in locators), set([new_style_package_id]))
+            self.assertEqual(set(locator.branch for locator in locators), set(['draft']))
+            # intro isn't mapped; so, the map is refetched in case another process has since mapped it
+            self.assertEqual(find.call_count, 2)
+
+            # now all in the cache
+            locators = loc_mapper().translate_locations(old_style_course_id, locations)
+            self.assertEqual([locator.block_id for locator in locators], ['vertical4', 'problem2', 'intro'])
+            self.assertEqual(set(locator.branch for locator in locators), set(['published']))
+            self.assertEqual(find.call_count, 2)
+
+        with self.assertRaises(ItemNotFoundError):
+            loc_mapper().translate_locations(
+                old_style_course_id, [Location('i4x', org, course, 'problem', 'nope')], add_entry_if_missing=False
+            )
+
+    def test_map_entry_refreshed(self):
+        """
+        Test the process's copy of a map is refetched when it lacks a location or the map is deleted
+        """
+        org = 'foo_org'
+        course = 'bar_course'
+        course_location = Location('i4x', org, course, 'course', 'baz_run')
+        loc_mapper().create_map_entry(
+            course_location, block_map={'abc123': {'problem': 'problem2'}, 'ghi789': {'problem': 'problem7'}}
+        )
+        self.translate_n_check(
+            course_location.replace(category='problem', name='abc123'), course_location.course_id,
+            '{}.{}.baz_run'.format(org, course), 'problem2', 'published'
+        )
+
+        # as if another process mapped a new location
+        # pylint: disable=protected-access
+        location_id = {'_id': loc_mapper()._construct_location_son(org, course, 'baz_run')}
+        loc_mapper().location_map.update(location_id, {'$set': {'block_map.def456': {'problem': 'problem4'}}})
+        self.translate_n_check(
+            course_location.replace(category='problem', name='def456'), course_location.course_id,
+            '{}.{}.baz_run'.format(org, course), 'problem4', 'published'
+        )
+
+        loc_mapper().delete_course_mapping(course_location)
+        with self.assertRaises(ItemNotFoundError):
+            loc_mapper().translate_location(
+                course_location.course_id, course_location.replace(category='problem', name='ghi789'),
+                add_entry_if_missing=False
+            )
+
 
 #==================================
 # functions to mock existing services
@@ -448,6 +516,12 @@ class TrivialCache(object):
         """
         return self.cache.get(key, default)
 
+    def get_many(self, keys):
+        """
+        Mock the .get_many
+        """
+        return {key: self.cache[key] for key in keys if key in self.cache}
+
     def set_many(self, entries):
         """
         mock set_many
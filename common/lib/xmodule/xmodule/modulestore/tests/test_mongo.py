@@ -1,3 +1,4 @@
+import datetime
 from pprint import pprint
 # pylint: disable=E0611
 from nose.tools import assert_equals, assert_raises, \
@@ -5,7 +6,12 @@ from nose.tools import assert_equals, assert_raises, \
 from itertools import ifilter
 # pylint: enable=E0611
 import pymongo
+from bson.objectid import ObjectId
 import logging
+import pickle
+import threading
+import time
+from mock import patch, Mock
 from uuid import uuid4
 
 from xblock.fields import Scope
@@ -15,14 +21,16 @@ from xblock.exceptions import InvalidScopeError
 from xmodule.tests import DATA_DIR
 from xmodule.modulestore import Location, MONGO_MODULESTORE_TYPE
 from xmodule.modulestore.mongo import MongoModuleStore, MongoKeyValueStore
+from xmodule.modulestore.mongo.base import namedtuple_to_son, metadata_cache_key, metadata_generation_cache_key
 from xmodule.modulestore.draft import DraftModuleStore
 from xmodule.modulestore.xml_importer import import_from_xml, perform_xlint
+from xmodule.contentstore.content import StaticContent, StaticContentStream
 from xmodule.contentstore.mongo import MongoContentStore
 
 from xmodule.modulestore.tests.test_modulestore import check_path_to_location
-from nose.tools import assert_in
+from nose.tools import assert_in, assert_not_in
 from xmodule.exceptions import NotFoundError
-from xmodule.modulestore.exceptions import InsufficientSpecificationError
+from xmodule.modulestore.exceptions import InsufficientSpecificationError, ItemNotFoundError
 
 log = logging.getLogger(__name__)
 
@@ -186,6 +194,20 @@ class TestMongoModuleStore(object):
         '''Make sure that path_to_location works'''
         check_path_to_location(self.store)
 
+    def test_path_to_location_uses_parent_index(self):
+        '''path_to_location walks up the cached parent index without querying parents'''
+        store = MongoModuleStore(
+            {'host': HOST, 'db': DB, 'collection': COLLECTION},
+            FS_ROOT, RENDER_TEMPLATE, default_class=DEFAULT_CLASS, request_cache=Mock(data={})
+        )
+        with patch.object(store, 'get_parent_locations') as get_parent_locations:
+            check_path_to_location(store)
+            assert_false(get_parent_locations.called)
+        assert_equals(
+            store.get_cached_parent_location(Location('i4x://edX/toy/video/Welcome'), 'edX/toy/2012_Fall'),
+            Location('i4x://edX/toy/chapter/Overview')
+        )
+
     def test_xlinter(self):
         '''
         Run through the xlinter, we know the 'toy' course has violations, but the
@@ -274,6 +296,101 @@ class TestMongoModuleStore(object):
             {'displayname': 'hello'}
         )
 
+    def test_contentstore_dedup(self):
+        """
+        Test that assets with the same data share a blob, which is deleted with the last of them.
+        """
+        content_store = TestMongoModuleStore.content_store
+        data = 'the same data'
+        first, second = [
+            StaticContent(Location('c4x', 'edX', 'dedup', 'asset', name), name, 'text/plain', data)
+            for name in ('first.txt', 'second.txt')
+        ]
+        content_store.save(first)
+        content_store.save(second)
+        # saving again replaces the asset
+        content_store.save(second)
+
+        blob_id = content_store.get_attr(first.location, 'blob')
+        assert_equals(content_store.get_attr(second.location, 'blob'), blob_id)
+        assert_equals(content_store.blob_files.find_one({'_id': blob_id})['refcount'], 2)
+        assert_equals(content_store.get_attr(second.location, 'length'), len(data))
+        assert_equals(content_store.find(second.location).data, data)
+
+        content_store.delete(first.get_id())
+        assert_raises(NotFoundError, content_store.find, first.location)
+        assert_equals(content_store.blob_files.find_one({'_id': blob_id})['refcount'], 1)
+        assert_equals(content_store.find(second.location).data, data)
+
+        content_store.delete(second.get_id())
+        assert content_store.blob_files.find_one({'_id': blob_id}) is None
+        assert_equals(content_store.blob_chunks.find({'files_id': blob_id}).count(), 0)
+
+    def test_contentstore_blob_being_deleted(self):
+        """
+        Test that a blob being deleted isn't referenced, and that an abandoned deletion is finished.
+        """
+        content_store = TestMongoModuleStore.content_store
+        location = Location('c4x', 'edX', 'dedup', 'asset', 'deleting.txt')
+        content = StaticContent(location, 'deleting.txt', 'text/plain', 'deleted data')
+        content_store.save(content)
+        blob_id = content_store.get_attr(location, 'blob')
+        content_store.fs_files.remove({'_id': content.get_id()})
+        content_store.blob_files.update(
+            {'_id': blob_id},
+            {'$set': {'refcount': 0, 'deleting': ObjectId.from_datetime(datetime.datetime(2000, 1, 1))}}
+        )
+        assert_false(content_store._increment_blob(blob_id))  # pylint: disable=protected-access
+
+        content_store.save(content)
+        blob = content_store.blob_files.find_one({'_id': blob_id})
+        assert_equals(blob['refcount'], 1)
+        assert_not_in('deleting', blob)
+        assert_equals(content_store.find(location).data, 'deleted data')
+        content_store.delete(content.get_id())
+
+    def test_contentstore_concurrent_deletes(self):
+        """
+        Test that deleting an asset from several threads at once only uncounts its blob once.
+        """
+        content_store = TestMongoModuleStore.content_store
+        data = 'shared data'
+        kept, deleted = [
+            StaticContent(Location('c4x', 'edX', 'dedup', 'asset', name), name, 'text/plain', data)
+            for name in ('kept.txt', 'deleted.txt')
+        ]
+        content_store.save(kept)
+        blob_id = content_store.get_attr(kept.location, 'blob')
+        for __ in range(10):
+            content_store.save(deleted)
+            threads = [threading.Thread(target=content_store.delete, args=(deleted.get_id(),)) for __ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert_equals(content_store.blob_files.find_one({'_id': blob_id})['refcount'], 1)
+
+        assert_equals(content_store.find(kept.location).data, data)
+        content_store.delete(kept.get_id())
+
+    def test_contentstore_copy_shares_blob(self):
+        """
+        Test that saving a found asset at another location doesn't copy its data.
+        """
+        content_store = TestMongoModuleStore.content_store
+        location = Location('c4x', 'edX', 'dedup', 'asset', 'original.txt')
+        content_store.save(StaticContent(location, 'original.txt', 'text/plain', 'original data'))
+
+        content = content_store.find(location, as_stream=True)
+        content.location = content.location._replace(course='dedup_copy')
+        with patch.object(StaticContentStream, 'stream_data', side_effect=AssertionError):
+            content_store.save(content)
+
+        assert_equals(content_store.find(content.location).data, 'original data')
+        assert_equals(content_store.get_attr(content.location, 'blob'), content_store.get_attr(location, 'blob'))
+        content_store.delete(content.get_id())
+        content_store.delete(StaticContent.get_id_from_location(location))
+
     def test_get_courses_for_wiki(self):
         """
         Test the get_courses_for_wiki method
@@ -310,6 +427,228 @@ class TestMongoModuleStore(object):
         assert_equals(len(course_locations), 1)
         assert_in(Location('i4x', 'edX', 'simple', 'course', '2012_Fall'), course_locations)
 
+    def test_structure_cache(self):
+        """
+        Loading a course tree a second time is served from the structure cache
+        until the course is written to
+        """
+        store = MongoModuleStore(
+            {'host': HOST, 'db': DB, 'collection': COLLECTION},
+            FS_ROOT, RENDER_TEMPLATE, default_class=DEFAULT_CLASS, structure_cache_size=2
+        )
+        store.structure_cache.clear()
+        location = Location('i4x', 'edX', 'toy', 'course', '2012_Fall')
+        course = store.get_item(location, depth=None)
+        chapter_names = [chapter.display_name for chapter in course.get_children()]
+
+        with patch.object(store, '_find_one', wraps=store._find_one) as find_one:
+            cached_course = store.get_item(location, depth=None)
+            cached_chapters = cached_course.get_children()
+            assert_equals(find_one.call_count, 0)
+            assert_equals([chapter.display_name for chapter in cached_chapters], chapter_names)
+
+            # descriptors are loaded from copies of the cached json
+            cached_chapters[0].display_name = 'Changed but never saved'
+            reloaded_course = store.get_item(location, depth=None)
+            assert_equals(reloaded_course.get_children()[0].display_name, chapter_names[0])
+            assert_equals(find_one.call_count, 0)
+
+            # writing to the course starts a new generation
+            store.update_item(reloaded_course)
+            store.get_item(location, depth=None)
+            assert_equals(find_one.call_count, 1)
+
+        # missing items are cached as such too
+        missing = Location('i4x', 'edX', 'toy', 'course', 'no_such_run')
+        assert_raises(ItemNotFoundError, store.get_item, missing, depth=None)
+        with patch.object(store, '_find_one') as find_one:
+            assert_raises(ItemNotFoundError, store.get_item, missing, depth=None)
+            assert_false(find_one.called)
+
+
+class PicklingCache(object):
+    """
+    An in-memory django-style cache which pickles its values, like memcached
+    """
+    def __init__(self):
+        self.cache = {}
+
+    def get(self, key, default=None):
+        """Unpickle the value of key"""
+        return pickle.loads(self.cache[key]) if key in self.cache else default
+
+    def get_many(self, keys):
+        """Unpickle the values of those keys which are set"""
+        return {key: self.get(key) for key in keys if key in self.cache}
+
+    def set(self, key, value):
+        """Pickle value into key"""
+        self.cache[key] = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    def set_many(self, entries):
+        """Pickle each of the values into its key"""
+        for key, value in entries.iteritems():
+            self.set(key, value)
+
+    def add(self, key, value):
+        """Set key unless it's already set"""
+        if key not in self.cache:
+            self.set(key, value)
+
+    def incr(self, key):
+        """Increment the number in key, which must be set"""
+        if key not in self.cache:
+            raise ValueError(key)
+        self.set(key, self.get(key) + 1)
+        return self.get(key)
+
+
+class TestMetadataInheritanceRefresh(object):
+    """
+    Compare full and incremental refreshes of the metadata inheritance tree
+    of a course with over 5000 blocks
+    """
+    COURSE = Location('i4x', 'bench', 'inheritance', 'course', 'run')
+
+    @classmethod
+    def setupClass(cls):
+        cls.connection = pymongo.MongoClient(host=HOST, port=PORT, tz_aware=True)
+        cls.db = 'test_inheritance_%s' % uuid4().hex[:5]
+        cls.store = MongoModuleStore(
+            {'host': HOST, 'db': cls.db, 'collection': COLLECTION},
+            FS_ROOT, RENDER_TEMPLATE, default_class=DEFAULT_CLASS
+        )
+        # 1 course, 10 chapters, 100 sequentials, 500 verticals and 4500 problems
+        documents = []
+
+        def add_block(category, name, children=(), metadata=None):
+            location = cls.COURSE.replace(category=category, name=name)
+            documents.append({
+                '_id': namedtuple_to_son(location),
+                'definition': {'children': list(children)},
+                'metadata': metadata or {},
+            })
+            return location.url()
+
+        chapters = []
+        for chapter in range(10):
+            sequentials = []
+            for sequential in range(10):
+                verticals = []
+                for vertical in range(5):
+                    name = '{}_{}_{}'.format(chapter, sequential, vertical)
+                    problems = [add_block('problem', '{}_{}'.format(name, problem)) for problem in range(9)]
+                    verticals.append(add_block('vertical', name, problems))
+                name = '{}_{}'.format(chapter, sequential)
+                sequentials.append(add_block('sequential', name, verticals, {'graded': sequential % 2 == 0}))
+            chapters.append(add_block('chapter', str(chapter), sequentials))
+        add_block('course', cls.COURSE.name, chapters, {'showanswer': 'always'})
+        cls.store.collection.insert(documents)
+
+    @classmethod
+    def teardownClass(cls):
+        cls.connection.drop_database(cls.db)
+        cls.connection.close()
+
+    def assert_trees_equal(self, tree, expected):
+        assert_equals(dict(tree), dict(expected))
+        assert_equals(tree.children, expected.children)
+        assert_equals(tree.parents, expected.parents)
+
+    def test_incremental_refresh(self):
+        started = time.time()
+        tree = self.store.compute_metadata_inheritance_tree(self.COURSE)
+        full_time = time.time() - started
+        assert_equals(len(tree), 5110)
+
+        # edit a sequential's inheritable metadata and move a vertical out of it
+        sequential = self.COURSE.replace(category='sequential', name='3_3')
+        moved = self.COURSE.replace(category='vertical', name='3_3_4')
+        self.store.collection.update(
+            {'_id': namedtuple_to_son(sequential)},
+            {'$set': {'metadata.graded': True, 'metadata.due': '2014-01-01T00:00'},
+             '$pull': {'definition.children': moved.url()}},
+        )
+        started = time.time()
+        updated = self.store.update_metadata_inheritance_tree(tree, sequential)
+        incremental_time = time.time() - started
+        log.info(
+            'metadata inheritance refresh of %s blocks: full %.4fs, incremental %.4fs',
+            len(tree), full_time, incremental_time
+        )
+
+        self.assert_trees_equal(updated, self.store.compute_metadata_inheritance_tree(self.COURSE))
+        assert_equals(updated[self.COURSE.replace(category='problem', name='3_3_0_0').url()]['due'], '2014-01-01T00:00')
+        assert_false(moved.url() in updated)
+        # the tree it was refreshed from is left as it was
+        assert_in(moved.url(), tree)
+
+    def make_cached_store(self):
+        """
+        Return a store over the course which shares its inheritance trees through a new cache
+        """
+        return MongoModuleStore(
+            {'host': HOST, 'db': self.db, 'collection': COLLECTION},
+            FS_ROOT, RENDER_TEMPLATE, default_class=DEFAULT_CLASS,
+            metadata_inheritance_cache_subsystem=PicklingCache(),
+        )
+
+    def test_structure_cached_separately(self):
+        store = self.make_cached_store()
+        cache = store.metadata_inheritance_cache_subsystem
+        key = metadata_cache_key(self.COURSE)
+        store.get_cached_metadata_inheritance_tree(self.COURSE)
+
+        cached = cache.get(key)
+        assert_equals(len(cached), 5110)
+        assert cached.parents is None
+        assert_not_in('children', cache.cache[key])
+
+        problem = self.COURSE.replace(category='problem', name='4_4_4_4')
+        assert_equals(
+            store.get_cached_parent_location(problem, None),
+            self.COURSE.replace(category='vertical', name='4_4_4')
+        )
+
+    def test_refresh_after_concurrent_edit_recomputes(self):
+        store = self.make_cached_store()
+        cache = store.metadata_inheritance_cache_subsystem
+        key = metadata_cache_key(self.COURSE)
+        sequential = self.COURSE.replace(category='sequential', name='5_5')
+        store.get_cached_metadata_inheritance_tree(self.COURSE)
+
+        # the edit generation each refresh starts is one after the tree's
+        with patch.object(store, 'compute_metadata_inheritance_tree') as compute:
+            store.get_cached_metadata_inheritance_tree(sequential, force_refresh=True)
+        assert_false(compute.called)
+        assert_equals(cache.get(key).generation, cache.get(metadata_generation_cache_key(key)))
+
+        # another process started refreshing an edit, but hasn't written its tree yet
+        cache.incr(metadata_generation_cache_key(key))
+        compute_tree = store.compute_metadata_inheritance_tree
+        with patch.object(store, 'compute_metadata_inheritance_tree', wraps=compute_tree) as compute:
+            tree = store.get_cached_metadata_inheritance_tree(sequential, force_refresh=True)
+        assert compute.called
+        self.assert_trees_equal(tree, compute_tree(self.COURSE))
+
+        # and readers don't use a tree from before the latest edit either
+        cache.incr(metadata_generation_cache_key(key))
+        with patch.object(store, 'compute_metadata_inheritance_tree', wraps=compute_tree) as compute:
+            store.get_cached_metadata_inheritance_tree(self.COURSE)
+        assert compute.called
+
+    def test_leaf_edit_keeps_tree(self):
+        tree = self.store.compute_metadata_inheritance_tree(self.COURSE)
+        problem = self.COURSE.replace(category='problem', name='1_1_1_1')
+        assert tree is self.store.update_metadata_inheritance_tree(tree, problem)
+
+    def test_unchanged_metadata_is_shared(self):
+        tree = self.store.compute_metadata_inheritance_tree(self.COURSE)
+        vertical = self.COURSE.replace(category='vertical', name='2_2_2').url()
+        problem = self.COURSE.replace(category='problem', name='2_2_2_2').url()
+        assert tree[vertical] is tree[problem]
+        assert tree[vertical] is tree[self.COURSE.replace(category='sequential', name='2_2').url()]
+
 
 class TestMongoKeyValueStore(object):
     """
@@ -2,12 +2,14 @@
     Test split modulestore w/o using any django stuff.
 """
 import datetime
+import time
 import unittest
 import uuid
 from importlib import import_module
 from path import path
 import re
 import random
+from mock import Mock, patch
 
 from xblock.fields import Scope
 from xmodule.course_module import CourseDescriptor
@@ -19,6 +21,7 @@ from xmodule.x_module import XModuleMixin
 from xmodule.fields import Date, Timedelta
 from bson.objectid import ObjectId
 from xmodule.modulestore.split_mongo.split import SplitMongoModuleStore
+from xmodule.modulestore.split_mongo.document_cache import DocumentCache, STRUCTURE
 
 
 class SplitModuleTest(unittest.TestCase):
@@ -612,6 +615,24 @@ class SplitModuleCourseTests(SplitModuleTest):
         self.assertIn('chapter1', block_map)
         self.assertIn('problem3_2', block_map)
 
+    def test_definitions_batched(self):
+        """
+        Test that the lazily loaded definitions of prefetched blocks are fetched together
+        """
+        modulestore()._clear_cache()
+        locator = BlockUsageLocator(package_id='testx.GreekHero', branch='draft', block_id='chapter3')
+        definitions = modulestore().db_connection.definitions
+        with patch.object(definitions, 'find', wraps=definitions.find) as find:
+            chapter = modulestore().get_item(locator, depth=1)
+            problems = chapter.get_children()
+            for problem in problems:
+                self.assertIsNotNone(problem.data)
+        self.assertEqual(find.call_count, 1)
+        # the batch doesn't hold on to definitions it has handed over
+        fetched = chapter.runtime.definition_batch.fetched
+        for problem in problems:
+            self.assertNotIn(problem.definition_locator.definition_id, fetched)
+
     def test_course_successors(self):
         """
         get_course_successors(course_locator, version_history_depth=1)
@@ -1652,6 +1673,144 @@ class TestSchema(SplitModuleTest):
                 "{0.name} has records with wrong schema_version".format(collection)
             )
 
+
+class DictCache(object):
+    """
+    A django-style cache in a dict, which records the timeout of each key
+    """
+    def __init__(self):
+        self.values = {}
+        self.timeouts = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, timeout=None):
+        self.values[key] = value
+        self.timeouts[key] = timeout
+
+    def add(self, key, value, timeout=None):
+        if key not in self.values:
+            self.set(key, value, timeout)
+
+    def delete(self, key):
+        self.values.pop(key, None)
+        self.timeouts.pop(key, None)
+
+
+class TestDocumentCache(unittest.TestCase):
+    """
+    Test the bounded cache of structures and definitions
+    """
+    def setUp(self):
+        self.cache = DocumentCache(200)
+
+    def test_copies(self):
+        self.cache.set(STRUCTURE, 'one', {'_id': 'one', 'blocks': {'head': {'fields': {}}}})
+        self.cache.get(STRUCTURE, 'one')['blocks']['head']['fields']['changed'] = True
+        self.assertEqual(self.cache.get(STRUCTURE, 'one')['blocks']['head']['fields'], {})
+        self.assertEqual(self.cache.stats()['hits'], 2)
+        self.assertIsNone(self.cache.get(STRUCTURE, 'two'))
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+    def test_eviction_by_size(self):
+        for doc_id in ('one', 'two', 'three'):
+            self.cache.set(STRUCTURE, doc_id, {'_id': doc_id, 'padding': 'x' * 50})
+        # one is least recently used once two is read
+        self.cache.get(STRUCTURE, 'two')
+        self.cache.set(STRUCTURE, 'four', {'_id': 'four', 'padding': 'x' * 50})
+        self.assertIsNone(self.cache.get(STRUCTURE, 'one'))
+        for doc_id in ('two', 'three', 'four'):
+            self.assertIsNotNone(self.cache.get(STRUCTURE, doc_id))
+        stats = self.cache.stats()
+        self.assertLessEqual(stats['size'], 200)
+        self.assertEqual(stats['evictions'], 1)
+
+        # too big to cache at all
+        self.cache.set(STRUCTURE, 'big', {'_id': 'big', 'padding': 'x' * 500})
+        self.assertIsNone(self.cache.get(STRUCTURE, 'big'))
+        self.assertIsNotNone(self.cache.get(STRUCTURE, 'four'))
+
+    def test_shared_cache(self):
+        shared_cache = DictCache()
+        DocumentCache(200, shared_cache=shared_cache).set(STRUCTURE, 'one', {'_id': 'one'})
+        other = DocumentCache(200, shared_cache=shared_cache)
+        self.assertEqual(other.get(STRUCTURE, 'one'), {'_id': 'one'})
+        self.assertEqual(other.get(STRUCTURE, 'one'), {'_id': 'one'})
+        self.assertEqual(other.stats()['shared_hits'], 1)
+        self.assertEqual(other.stats()['hits'], 1)
+
+    def test_structure_generations(self):
+        shared_cache = DictCache()
+        one, other = DocumentCache(200, shared_cache=shared_cache), DocumentCache(200, shared_cache=shared_cache)
+        generation = one.generation()
+        one.set(STRUCTURE, 'one', {'_id': 'one'}, generation)
+        self.assertEqual(other.generation(), generation)
+        self.assertEqual(one.get(STRUCTURE, 'one', generation), {'_id': 'one'})
+
+        # a structure rewritten in place by another process isn't read from the cache again,
+        # once the generation is next checked
+        other.bump_generation()
+        self.assertNotEqual(other.generation(), generation)
+        self.assertEqual(one.generation(), generation)
+        later = time.time() + DocumentCache.GENERATION_CHECK_SECONDS
+        with patch('xmodule.modulestore.split_mongo.document_cache.time.time', return_value=later):
+            self.assertEqual(one.generation(), other.generation())
+            self.assertIsNone(one.get(STRUCTURE, 'one', one.generation()))
+
+    def test_generation_checked_periodically(self):
+        shared_cache = DictCache()
+        cache = DocumentCache(200, shared_cache=shared_cache)
+        with patch.object(shared_cache, 'get', wraps=shared_cache.get) as shared_get:
+            generations = set(cache.generation() for __ in range(10))
+        self.assertEqual(len(generations), 1)
+        # the first read finds no generation, so it starts one and reads it back
+        self.assertEqual(shared_get.call_count, 2)
+        self.assertEqual(shared_cache.timeouts.values(), [DocumentCache.GENERATION_TIMEOUT])
+
+
+class TestSplitDocumentCache(SplitModuleTest):
+    """
+    Test reading the modulestore through the document cache
+    """
+    def setUp(self):
+        super(TestSplitDocumentCache, self).setUp()
+        modulestore()
+        SplitModuleTest.modulestore = SplitMongoModuleStore(
+            SplitModuleTest.MODULESTORE['DOC_STORE_CONFIG'],
+            render_template=render_to_template_mock,
+            document_cache_size=10 * 1024 * 1024,
+            **SplitModuleTest.MODULESTORE['OPTIONS']
+        )
+        self.document_cache = modulestore().db_connection.document_cache
+        self.document_cache.clear()
+
+    def test_structures_cached(self):
+        locator = CourseLocator(package_id="testx.GreekHero", branch="draft")
+        course = modulestore().get_course(locator)
+        modulestore()._clear_cache()
+        with patch.object(modulestore().db_connection.structures, 'find_one') as find_one:
+            self.assertEqual(modulestore().get_course(locator).location.version_guid, course.location.version_guid)
+        self.assertFalse(find_one.called)
+
+    def test_updated_structure(self):
+        connection = modulestore().db_connection
+        structure = connection.get_structure(connection.get_course_index("testx.GreekHero")['versions']['draft'])
+        structure['edited_by'] = 'someone@edx.org'
+        generation = self.document_cache.generation()
+        connection.update_structure(structure)
+        self.assertNotEqual(self.document_cache.generation(), generation)
+        self.assertEqual(connection.get_structure(structure['_id'])['edited_by'], 'someone@edx.org')
+
+    def test_system_cache_bounded(self):
+        store = modulestore()
+        for index in range(store.SYSTEM_CACHE_SIZE + 1):
+            store._add_cache(index, Mock())
+        self.assertIsNone(store._get_cache(0))
+        self.assertIsNotNone(store._get_cache(1))
+        self.assertEqual(len(store.thread_cache.course_cache), store.SYSTEM_CACHE_SIZE)
+
+
 #===========================================
 def modulestore():
     """
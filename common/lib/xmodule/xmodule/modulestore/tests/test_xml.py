@@ -2,18 +2,25 @@
 Tests around our XML modulestore, including importing
 well-formed and not-well-formed XML.
 """
+import logging
 import os.path
+import shutil
+import tempfile
+import time
 import unittest
 from glob import glob
 from mock import patch
 
 from xmodule.course_module import CourseDescriptor
-from xmodule.modulestore.xml import XMLModuleStore
+from xmodule.modulestore.inheritance import own_metadata
+from xmodule.modulestore.xml import XMLModuleStore, IndexedModules, create_block_from_xml
 from xmodule.modulestore import Location, XML_MODULESTORE_TYPE
 
 from .test_modulestore import check_path_to_location
 from xmodule.tests import DATA_DIR
 
+log = logging.getLogger(__name__)
+
 
 def glob_tildes_at_end(path):
     """
@@ -101,3 +108,204 @@ class TestXMLModuleStore(unittest.TestCase):
         self.assertEqual(len(course_locations), 2)
         for course_number in ['toy', 'simple']:
             self.assertIn(Location('i4x', 'edX', course_number, 'course', '2012_Fall'), course_locations)
+
+    def test_get_items(self):
+        store = XMLModuleStore(DATA_DIR, course_dirs=['toy', 'simple'])
+        queries = [
+            Location('i4x', 'edX', 'toy', 'chapter', None),
+            Location('i4x', 'edX', 'toy', 'video', 'Welcome'),
+            Location('i4x', 'edX', None, 'course', None),
+            Location('i4x', 'edX', 'toy', None, None),
+            Location(None, None, None, None, None),
+        ]
+        for course_id in ['edX/toy/2012_Fall', None]:
+            all_modules = [
+                (location, module)
+                for modules in store.modules.values()
+                if course_id is None or modules is store.modules[course_id]
+                for location, module in modules.items()
+            ]
+            for query in queries:
+                expected = [
+                    module for location, module in all_modules
+                    if all(goal is None or goal == value for goal, value in zip(query, location))
+                ]
+                self.assertItemsEqual(store.get_items(query, course_id=course_id), expected)
+
+
+class TestIndexedModules(unittest.TestCase):
+    """
+    Test the indexes of an XML course's modules
+    """
+    CATEGORIES = ['chapter', 'sequential', 'vertical', 'problem', 'html', 'video', 'discussion', 'lti']
+
+    def setUp(self):
+        # A course of 5000 modules, plus a few from another course
+        self.modules = IndexedModules()
+        for index in xrange(5000):
+            category = self.CATEGORIES[index % len(self.CATEGORIES)]
+            location = Location('i4x', 'edX', 'big', category, 'module_{}'.format(index))
+            self.modules[location] = object()
+        for category in self.CATEGORIES:
+            self.modules[Location('i4x', 'edX', 'other', category, 'module')] = object()
+
+    def scan(self, location):
+        """
+        Find matching modules the way get_items used to, by comparing every location
+        """
+        return [
+            module for mod_loc, module in self.modules.iteritems()
+            if all(goal is None or goal == value for goal, value in zip(location, mod_loc))
+        ]
+
+    def test_find(self):
+        queries = [
+            Location('i4x', 'edX', 'big', 'discussion', None),
+            Location('i4x', 'edX', None, 'lti', None),
+            Location('i4x', 'edX', 'big', 'problem', 'module_3'),
+            Location('i4x', 'edX', 'big', 'html', 'module_3'),
+            Location('i4x', 'edX', 'other', None, None),
+            Location('i4x', None, None, None, None),
+            Location('i4x', 'edX', 'big', 'static_tab', None),
+        ]
+        for query in queries:
+            self.assertItemsEqual(self.modules.find(query), self.scan(query))
+
+    def test_remove(self):
+        location = Location('i4x', 'edX', 'other', 'lti', 'module')
+        del self.modules[location]
+        self.assertEqual(self.modules.find(Location('i4x', 'edX', 'other', 'lti', None)), [])
+
+        module = object()
+        self.modules[location] = module
+        self.assertEqual(self.modules.pop(location), module)
+        self.assertEqual(self.modules.find(location), [])
+
+        self.modules.clear()
+        self.assertEqual(self.modules.find(Location('i4x', 'edX', 'big', 'lti', None)), [])
+
+    def test_replace(self):
+        location = Location('i4x', 'edX', 'other', 'lti', 'module')
+        module = object()
+        self.modules[location] = module
+        self.assertEqual(self.modules.find(location), [module])
+
+    def test_find_compares_only_candidates(self):
+        queries = [Location('i4x', 'edX', 'big', category, None) for category in self.CATEGORIES] * 25
+
+        start = time.time()
+        for query in queries:
+            self.scan(query)
+        scan_time = time.time() - start
+
+        # each module find compares to the query is zipped with it
+        found = 0
+        start = time.time()
+        with patch('xmodule.modulestore.xml.zip', side_effect=zip, create=True) as compare:
+            for query in queries:
+                found += len(self.modules.find(query))
+        indexed_time = time.time() - start
+
+        log.info(
+            "%s category lookups over %s modules: scanning took %.3fs, the index %.3fs",
+            len(queries), len(self.modules), scan_time, indexed_time
+        )
+        # only the modules of each category, including the one from the other course
+        self.assertEqual(found, len(queries) * 5000 / len(self.CATEGORIES))
+        self.assertEqual(compare.call_count, found + len(queries))
+
+
+class TestCourseSnapshots(unittest.TestCase):
+    """
+    Test restoring XML courses from snapshots
+    """
+    COURSE_DIRS = ['toy', 'simple', 'conditional_and_poll']
+
+    def setUp(self):
+        # Work on a copy of the courses, so they can be changed
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.data_dir = os.path.join(self.temp_dir, 'data')
+        self.snapshot_dir = os.path.join(self.temp_dir, 'snapshots')
+        for course_dir in self.COURSE_DIRS:
+            shutil.copytree(os.path.join(DATA_DIR, course_dir), os.path.join(self.data_dir, course_dir))
+
+    def load(self, **kwargs):
+        return XMLModuleStore(self.data_dir, course_dirs=self.COURSE_DIRS, snapshot_dir=self.snapshot_dir, **kwargs)
+
+    def assertStoresEqual(self, store, other):
+        self.assertItemsEqual(store.courses.keys(), other.courses.keys())
+        self.assertItemsEqual(store.modules.keys(), other.modules.keys())
+        for course_id, modules in store.modules.items():
+            other_modules = other.modules[course_id]
+            self.assertItemsEqual(modules.keys(), other_modules.keys())
+            for location, module in modules.items():
+                other_module = other_modules[location]
+                self.assertEqual(module.unmixed_class, other_module.unmixed_class)
+                self.assertEqual(own_metadata(module), own_metadata(other_module))
+                self.assertEqual(module.data_dir, other_module.data_dir)
+                self.assertItemsEqual(
+                    store.get_parent_locations(location, course_id),
+                    other.get_parent_locations(location, course_id)
+                )
+        for course in store.get_courses():
+            self.assertEqual(store.get_item_errors(course.location), other.get_item_errors(course.location))
+
+    def test_restore(self):
+        store = self.load()
+        with patch.object(XMLModuleStore, 'load_course') as load_course:
+            restored = self.load()
+        self.assertFalse(load_course.called)
+        self.assertStoresEqual(store, restored)
+
+        course = restored.get_course('edX/toy/2012_Fall')
+        self.assertEqual(course.display_name, 'Toy Course')
+        self.assertTrue(course.get_children())
+
+    def test_stale(self):
+        self.load()
+        os.utime(os.path.join(self.data_dir, 'toy', 'course.xml'), (0, 0))
+        with patch.object(XMLModuleStore, 'load_course', side_effect=XMLModuleStore.load_course, autospec=True) as load_course:
+            restored = self.load()
+        self.assertEqual([call[0][1] for call in load_course.call_args_list], ['toy'])
+        self.assertStoresEqual(XMLModuleStore(self.data_dir, course_dirs=self.COURSE_DIRS), restored)
+
+    def test_course_ids(self):
+        self.load()
+        store = self.load(course_ids=['edX/simple/2012_Fall'])
+        self.assertEqual(store.courses.keys(), ['simple'])
+
+    def test_corrupt(self):
+        self.load()
+        with open(os.path.join(self.snapshot_dir, 'toy.pickle'), 'r+b') as snapshot_file:
+            snapshot_file.seek(100)
+            snapshot_file.write('garbage')
+        self.assertStoresEqual(XMLModuleStore(self.data_dir, course_dirs=self.COURSE_DIRS), self.load())
+
+    def test_workers(self):
+        with patch.object(XMLModuleStore, '_restore_snapshot', side_effect=XMLModuleStore._restore_snapshot,
+                          autospec=True) as restore:
+            store = self.load(load_workers=2)
+        # The workers loaded the courses, this process restored them
+        self.assertEqual(restore.call_count, len(self.COURSE_DIRS))
+        self.assertStoresEqual(XMLModuleStore(self.data_dir, course_dirs=self.COURSE_DIRS), store)
+
+    def test_restore_parses_nothing(self):
+        with patch('xmodule.modulestore.xml.create_block_from_xml', side_effect=create_block_from_xml) as parse:
+            start = time.time()
+            XMLModuleStore(self.data_dir, course_dirs=self.COURSE_DIRS)
+            parse_time = time.time() - start
+            blocks_parsed = parse.call_count
+
+            self.load()
+            parse.reset_mock()
+            start = time.time()
+            self.load()
+            restore_time = time.time() - start
+
+        log.info(
+            "loading %s courses: parsing %s blocks took %.3fs, restoring snapshots %.3fs",
+            len(self.COURSE_DIRS), blocks_parsed, parse_time, restore_time
+        )
+        self.assertGreater(blocks_parsed, 0)
+        self.assertEqual(parse.call_count, 0)
@@ -1,11 +1,14 @@
+import cPickle
 import hashlib
 import itertools
 import json
 import logging
+import multiprocessing
 import os
 import re
 import sys
 import glob
+import tempfile
 
 from collections import defaultdict
 from cStringIO import StringIO
@@ -22,14 +25,16 @@ from xmodule.x_module import XMLParsingSystem, policy_key
 from xmodule.modulestore.xml_exporter import DEFAULT_CONTENT_FIELDS
 from xmodule.tabs import CourseTabList
 
+import xblock
 from xblock.fields import ScopeIds
 from xblock.field_data import DictFieldData
-from xblock.runtime import DictKeyValueStore, IdReader, IdGenerator
+from xblock.runtime import DictKeyValueStore, IdReader, IdGenerator, KvsFieldData
 
+import xmodule
 from . import ModuleStoreReadBase, Location, XML_MODULESTORE_TYPE
 
 from .exceptions import ItemNotFoundError
-from .inheritance import compute_inherited_metadata, inheriting_field_data
+from .inheritance import compute_inherited_metadata, inheriting_field_data, InheritanceKeyValueStore
 
 edx_xml_parser = etree.XMLParser(dtd_validation=False, load_dtd=False,
                                  remove_comments=True, remove_blank_text=True)
@@ -38,6 +43,9 @@ etree.set_default_parser(edx_xml_parser)
 
 log = logging.getLogger(__name__)
 
+# Bump whenever the contents of course snapshots change
+SNAPSHOT_FORMAT = 1
+
 
 # VS[compat]
 # TODO (cpennington): Remove this once all fall 2012 courses have been imported
@@ -312,6 +320,79 @@ def create_block_from_xml(xml_data, system, id_generator):
     return xblock
 
 
+def _qualified_name(obj):
+    """
+    The dotted name of a class or function, which unlike its repr is the same in every process.
+    """
+    return '{0}.{1}'.format(getattr(obj, '__module__', None), getattr(obj, '__name__', repr(obj)))
+
+
+def _fingerprint(digest, root, suffix=''):
+    """
+    Update `digest` with the path, modification time and size of every file
+    under `root` whose name ends with `suffix`.
+    """
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(dirname for dirname in dirnames if dirname != '.git')
+        for filename in sorted(filenames):
+            if filename.endswith(suffix):
+                filepath = os.path.join(dirpath, filename)
+                stat = os.stat(filepath)
+                digest.update('{0}|{1}|{2}\n'.format(os.path.relpath(filepath, root), stat.st_mtime, stat.st_size))
+
+
+_CODE_FINGERPRINT = None
+
+
+def _code_fingerprint():
+    """
+    A fingerprint of the xmodule and xblock code, which decides how courses are parsed.
+    """
+    global _CODE_FINGERPRINT  # pylint: disable=global-statement
+    if _CODE_FINGERPRINT is None:
+        digest = hashlib.sha1()
+        for package in (xmodule, xblock):
+            _fingerprint(digest, os.path.dirname(package.__file__), '.py')
+        _CODE_FINGERPRINT = digest.hexdigest()
+    return _CODE_FINGERPRINT
+
+
+def _dump_field_data(field_data):
+    """
+    Return the state of an XBlock's field data, for a course snapshot.
+    """
+    # pylint: disable=protected-access
+    if isinstance(field_data, KvsFieldData) and isinstance(field_data._kvs, InheritanceKeyValueStore):
+        return ('kvs', field_data._kvs._fields, field_data._kvs.inherited_settings)
+    if isinstance(field_data, DictFieldData):
+        return ('dict', field_data._data, None)
+    raise TypeError("Can't snapshot field data {0!r}".format(field_data))
+
+
+def _load_field_data(kind, values, inherited_settings):
+    """
+    Rebuild the field data dumped by _dump_field_data.
+    """
+    if kind == 'kvs':
+        return KvsFieldData(InheritanceKeyValueStore(initial_values=values, inherited_settings=inherited_settings))
+    return DictFieldData(values)
+
+
+# The store whose courses are being snapshotted, inherited by the worker processes
+_SNAPSHOTTING_STORE = None
+
+
+def _snapshot_course(args):
+    """
+    Load a course in a worker process, so that it writes the course's snapshot.
+    """
+    course_dir, course_ids = args
+    try:
+        _SNAPSHOTTING_STORE.try_load_course(course_dir, course_ids)
+    except Exception:  # pylint: disable=broad-except
+        log.exception("Failed to snapshot course '%s'", course_dir)
+
+
 class ParentTracker(object):
     """A simple class to factor out the logic for tracking location parent pointers."""
     def __init__(self):
@@ -348,13 +429,111 @@ class ParentTracker(object):
         return list(self._parents[child])
 
 
+class IndexedModules(dict):
+    """
+    The modules of one course, as a dict of location -> XBlock, which also
+    indexes them by category, by (category, name) and by (org, course), so
+    that `find` can look at just the modules which might match.
+    """
+    def __init__(self, *args, **kwargs):
+        super(IndexedModules, self).__init__()
+        # index key -> dict(location -> XBlock)
+        self._by_category = defaultdict(dict)
+        self._by_name = defaultdict(dict)
+        self._by_course = defaultdict(dict)
+        self.update(*args, **kwargs)
+
+    def _indexes(self, location):
+        """
+        Return the (index, key) pairs under which `location` is indexed.
+        """
+        return (
+            (self._by_category, location.category),
+            (self._by_name, (location.category, location.name)),
+            (self._by_course, (location.org, location.course)),
+        )
+
+    def __setitem__(self, location, module):
+        super(IndexedModules, self).__setitem__(location, module)
+        for index, key in self._indexes(location):
+            index[key][location] = module
+
+    def __delitem__(self, location):
+        super(IndexedModules, self).__delitem__(location)
+        for index, key in self._indexes(location):
+            del index[key][location]
+            if not index[key]:
+                del index[key]
+
+    def pop(self, location, *default):
+        if location in self:
+            module = self[location]
+            del self[location]
+            return module
+        return super(IndexedModules, self).pop(location, *default)
+
+    def popitem(self):
+        location, module = next(self.iteritems())
+        del self[location]
+        return location, module
+
+    def setdefault(self, location, default=None):
+        if location not in self:
+            self[location] = default
+        return self[location]
+
+    def update(self, *args, **kwargs):
+        for location, module in dict(*args, **kwargs).iteritems():
+            self[location] = module
+
+    def clear(self):
+        super(IndexedModules, self).clear()
+        self._by_category.clear()
+        self._by_name.clear()
+        self._by_course.clear()
+
+    def find(self, location):
+        """
+        Return the modules whose locations match `location`: each of its
+        fields which isn't None must be equal to the module location's.
+        """
+        tag, org, course, category, name = tuple(location)[:5]
+        if category is not None and name is not None:
+            candidates = self._by_name.get((category, name), {})
+        elif category is not None:
+            candidates = self._by_category.get(category, {})
+        elif org is not None and course is not None:
+            candidates = self._by_course.get((org, course), {})
+        else:
+            candidates = self
+        return [
+            module for mod_loc, module in candidates.iteritems()
+            # Locations match if each value in `location` is None or if the value from `location`
+            # matches the value from `mod_loc`
+            if all(goal is None or goal == value for goal, value in zip(location, mod_loc))
+        ]
+
+
 class XMLModuleStore(ModuleStoreReadBase):
     """
     An XML backed ModuleStore
+
+    Parsing a big course takes a while, and every process used to parse every
+    course at startup.  When given a `snapshot_dir`, the store pickles the
+    field data of each course's XBlocks there once the course has loaded.  At
+    the next startup, a course whose files haven't changed (judging by their
+    modification times and sizes) is rebuilt from its snapshot instead of
+    being parsed again.  The snapshots also go stale when the xmodule or
+    xblock code changes.  They are only read by the store itself, so the
+    snapshot_dir must not be writable by anyone else.
+
+    With `load_workers` as well, the courses whose snapshots are stale are
+    first loaded in that many worker processes in parallel, which write
+    their snapshots for this process to rebuild the courses from.
     """
     def __init__(
         self, data_dir, default_class=None, course_dirs=None, course_ids=None,
-        load_error_modules=True, i18n_service=None, **kwargs
+        load_error_modules=True, i18n_service=None, snapshot_dir=None, load_workers=0, **kwargs
     ):
         """
         Initialize an XMLModuleStore from data_dir
@@ -366,11 +545,16 @@ class XMLModuleStore(ModuleStoreReadBase):
 
         course_dirs or course_ids: If specified, the list of course_dirs or course_ids to load. Otherwise,
             load all courses. Note, providing both
+
+        snapshot_dir: If specified, the directory to keep course snapshots in
+
+        load_workers: If more than 1, the number of processes to load courses
+            with stale snapshots in
         """
         super(XMLModuleStore, self).__init__(**kwargs)
 
         self.data_dir = path(data_dir)
-        self.modules = defaultdict(dict)  # course_id -> dict(location -> XBlock)
+        self.modules = defaultdict(IndexedModules)  # course_id -> dict(location -> XBlock)
         self.courses = {}  # course_dir -> XBlock for the course
         self.errored_courses = {}  # course_dir -> errorlog, for dirs that failed to load
 
@@ -391,6 +575,14 @@ class XMLModuleStore(ModuleStoreReadBase):
 
         self.i18n_service = i18n_service
 
+        self.snapshot_dir = path(snapshot_dir) if snapshot_dir else None
+        self._snapshot_keys = {}  # course_dir -> key of its snapshot, as of this load
+        if self.snapshot_dir is not None and not os.path.isdir(self.snapshot_dir):
+            try:
+                os.makedirs(self.snapshot_dir)
+            except OSError:
+                log.warning("Couldn't create course snapshot dir %s", self.snapshot_dir, exc_info=True)
+
         # If we are specifically asked for missing courses, that should
         # be an error.  If we are asked for "all" courses, find the ones
         # that have a course.xml. We sort the dirs in alpha order so we always
@@ -399,6 +591,8 @@ class XMLModuleStore(ModuleStoreReadBase):
         if course_dirs is None:
             course_dirs = sorted([d for d in os.listdir(self.data_dir) if
                                   os.path.exists(self.data_dir / d / "course.xml")])
+        if self.snapshot_dir is not None and load_workers > 1:
+            self.snapshot_courses(course_dirs, course_ids, load_workers)
         for course_dir in course_dirs:
             self.try_load_course(course_dir, course_ids)
 
@@ -413,6 +607,20 @@ class XMLModuleStore(ModuleStoreReadBase):
         # place after the course loads and we have its location
         errorlog = make_error_tracker()
         course_descriptor = None
+
+        snapshot = self._read_snapshot(course_dir)
+        if snapshot is not None:
+            if course_ids is not None and snapshot['course_id'] not in course_ids:
+                return
+            try:
+                course_descriptor = self._restore_snapshot(course_dir, snapshot, errorlog)
+            except Exception:  # pylint: disable=broad-except
+                log.exception("Failed to restore course '%s' from its snapshot, loading it from xml", course_dir)
+            else:
+                self.courses[course_dir] = course_descriptor
+                self._location_errors[course_descriptor.scope_ids.usage_id] = errorlog
+                return
+
         try:
             course_descriptor = self.load_course(course_dir, course_ids, errorlog.tracker)
         except Exception as e:
@@ -432,6 +640,190 @@ class XMLModuleStore(ModuleStoreReadBase):
             self.courses[course_dir] = course_descriptor
             self._location_errors[course_descriptor.scope_ids.usage_id] = errorlog
             self.parent_trackers[course_descriptor.id].make_known(course_descriptor.scope_ids.usage_id)
+            if self.snapshot_dir is not None:
+                self._write_snapshot(course_dir, course_descriptor, errorlog)
+
+    def snapshot_courses(self, course_dirs, course_ids, workers):
+        """
+        Load the courses in course_dirs whose snapshots are stale in `workers`
+        processes in parallel, to bring their snapshots up to date.
+        """
+        global _SNAPSHOTTING_STORE  # pylint: disable=global-statement
+        stale = [course_dir for course_dir in course_dirs if not self._snapshot_is_current(course_dir)]
+        if len(stale) < 2:
+            # Not worth starting processes for
+            return
+
+        log.info("Snapshotting %d courses in %d processes", len(stale), min(workers, len(stale)))
+        # The workers are forked, and so get this store without pickling it
+        _SNAPSHOTTING_STORE = self
+        try:
+            pool = multiprocessing.Pool(min(workers, len(stale)))
+            try:
+                pool.map(_snapshot_course, [(course_dir, course_ids) for course_dir in stale], chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+        except Exception:  # pylint: disable=broad-except
+            log.exception("Failed to snapshot courses in worker processes")
+        finally:
+            _SNAPSHOTTING_STORE = None
+
+    def _snapshot_path(self, course_dir):
+        """
+        The file holding the snapshot of the course in course_dir.
+        """
+        return self.snapshot_dir / u'{0}.pickle'.format(course_dir)
+
+    def _snapshot_key(self, course_dir):
+        """
+        A key which changes whenever anything that went into loading the course
+        in course_dir does.  Computed once per load, before the course is read.
+        """
+        if course_dir not in self._snapshot_keys:
+            digest = hashlib.sha1()
+            digest.update(repr([
+                SNAPSHOT_FORMAT,
+                _code_fingerprint(),
+                _qualified_name(self.default_class),
+                self.load_error_modules,
+                [_qualified_name(mixin) for mixin in self.xblock_mixins],
+                _qualified_name(self.xblock_select),
+            ]))
+            _fingerprint(digest, self.data_dir / course_dir)
+            self._snapshot_keys[course_dir] = digest.hexdigest()
+        return self._snapshot_keys[course_dir]
+
+    def _open_snapshot(self, course_dir):
+        """
+        Open the snapshot of the course in course_dir, returning the file
+        positioned after the key if the snapshot is current, or None.
+        """
+        if self.snapshot_dir is None:
+            return None
+        key = self._snapshot_key(course_dir)
+        try:
+            snapshot_file = open(self._snapshot_path(course_dir), 'rb')
+        except IOError:
+            return None
+        try:
+            if cPickle.load(snapshot_file) == key:
+                return snapshot_file
+        except Exception:  # pylint: disable=broad-except
+            log.warning("Failed to read the snapshot of course '%s'", course_dir, exc_info=True)
+        snapshot_file.close()
+        return None
+
+    def _snapshot_is_current(self, course_dir):
+        """
+        Is there a snapshot of the course in course_dir as it is now?
+        """
+        snapshot_file = self._open_snapshot(course_dir)
+        if snapshot_file is None:
+            return False
+        snapshot_file.close()
+        return True
+
+    def _read_snapshot(self, course_dir):
+        """
+        Return the current snapshot of the course in course_dir, or None.
+        """
+        snapshot_file = self._open_snapshot(course_dir)
+        if snapshot_file is None:
+            return None
+        try:
+            with snapshot_file:
+                return cPickle.load(snapshot_file)
+        except Exception:  # pylint: disable=broad-except
+            # e.g. a block class which has gone away
+            log.warning("Failed to read the snapshot of course '%s'", course_dir, exc_info=True)
+            return None
+
+    def _write_snapshot(self, course_dir, course_descriptor, errorlog):
+        """
+        Write a snapshot of the course just loaded from course_dir.
+        """
+        course_id = course_descriptor.id
+        modules = [
+            module for module in self.modules[course_id].itervalues()
+            if getattr(module, 'data_dir', None) == course_dir
+        ]
+        locations = set(module.scope_ids.usage_id for module in modules)
+        temp_path = None
+        try:
+            snapshot = {
+                'course_id': course_id,
+                'course_location': course_descriptor.scope_ids.usage_id,
+                'modules': [
+                    (
+                        getattr(module, 'unmixed_class', module.__class__),
+                        module.scope_ids,
+                        _dump_field_data(module._field_data),  # pylint: disable=protected-access
+                    )
+                    for module in modules
+                ],
+                'parents': dict(
+                    (child, parents)
+                    for child, parents in self.parent_trackers[course_id]._parents.iteritems()  # pylint: disable=protected-access
+                    if child in locations
+                ),
+                'errors': list(errorlog.errors),
+            }
+            # Write it under a temporary name, so other processes never see half a snapshot
+            handle, temp_path = tempfile.mkstemp(dir=self.snapshot_dir, suffix='.tmp')
+            with os.fdopen(handle, 'wb') as snapshot_file:
+                cPickle.dump(self._snapshot_key(course_dir), snapshot_file, cPickle.HIGHEST_PROTOCOL)
+                cPickle.dump(snapshot, snapshot_file, cPickle.HIGHEST_PROTOCOL)
+            os.rename(temp_path, self._snapshot_path(course_dir))
+        except Exception:  # pylint: disable=broad-except
+            log.warning("Failed to snapshot course '%s'", course_dir, exc_info=True)
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _restore_snapshot(self, course_dir, snapshot, errorlog):
+        """
+        Rebuild the course in course_dir from its snapshot, returning its
+        CourseDescriptor.  Nothing is added to the store unless that succeeds.
+        """
+        course_id = snapshot['course_id']
+        system = self._make_import_system(course_id, course_dir, errorlog.tracker, lambda usage_id: {})
+
+        modules = {}
+        for cls, scope_ids, field_data in snapshot['modules']:
+            module = system.construct_xblock_from_class(cls, scope_ids, _load_field_data(*field_data))
+            module.data_dir = course_dir
+            modules[scope_ids.usage_id] = module
+        course_descriptor = modules[snapshot['course_location']]
+
+        self.modules[course_id].update(modules)
+        parent_tracker = self.parent_trackers[course_id]
+        for child, parents in snapshot['parents'].iteritems():
+            parent_tracker._parents.setdefault(child, set()).update(parents)  # pylint: disable=protected-access
+        errorlog.errors.extend(snapshot['errors'])
+        return course_descriptor
+
+    def _make_import_system(self, course_id, course_dir, tracker, get_policy):
+        """
+        Return the ImportSystem for loading the course course_id from course_dir.
+        """
+        services = {}
+        if self.i18n_service:
+            services['i18n'] = self.i18n_service
+
+        return ImportSystem(
+            xmlstore=self,
+            course_id=course_id,
+            course_dir=course_dir,
+            error_tracker=tracker,
+            parent_tracker=self.parent_trackers[course_id],
+            load_error_modules=self.load_error_modules,
+            get_policy=get_policy,
+            mixins=self.xblock_mixins,
+            default_class=self.default_class,
+            select=self.xblock_select,
+            field_data=self.field_data,
+            services=services,
+        )
 
     def __unicode__(self):
         '''
@@ -531,24 +923,7 @@ class XMLModuleStore(ModuleStoreReadBase):
                 """
                 return policy.get(policy_key(usage_id), {})
 
-            services = {}
-            if self.i18n_service:
-                services['i18n'] = self.i18n_service
-
-            system = ImportSystem(
-                xmlstore=self,
-                course_id=course_id,
-                course_dir=course_dir,
-                error_tracker=tracker,
-                parent_tracker=self.parent_trackers[course_id],
-                load_error_modules=self.load_error_modules,
-                get_policy=get_policy,
-                mixins=self.xblock_mixins,
-                default_class=self.default_class,
-                select=self.xblock_select,
-                field_data=self.field_data,
-                services=services,
-            )
+            system = self._make_import_system(course_id, course_dir, tracker, get_policy)
 
             course_descriptor = system.process_xml(etree.tostring(course_data, encoding='unicode'))
 
@@ -719,22 +1094,13 @@ class XMLModuleStore(ModuleStoreReadBase):
                                   " are unique. Use get_instance.")
 
     def get_items(self, location, course_id=None, depth=0, qualifiers=None):
-        items = []
-
-        def _add_get_items(self, location, modules):
-            for mod_loc, module in modules.iteritems():
-                # Locations match if each value in `location` is None or if the value from `location`
-                # matches the value from `mod_loc`
-                if all(goal is None or goal == value for goal, value in zip(location, mod_loc)):
-                    items.append(module)
-
         if course_id is None:
-            for _, modules in self.modules.iteritems():
-                _add_get_items(self, location, modules)
-        else:
-            _add_get_items(self, location, self.modules[course_id])
+            items = []
+            for modules in self.modules.itervalues():
+                items.extend(modules.find(location))
+            return items
 
-        return items
+        return self.modules[course_id].find(location)
 
     def get_courses(self, depth=0):
         """
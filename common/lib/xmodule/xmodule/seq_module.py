@@ -2,7 +2,9 @@ import json
 import logging
 
 from lxml import etree
+from webob import Response
 
+from xblock.core import XBlock
 from xblock.fields import Integer, Scope
 from xblock.fragment import Fragment
 from pkg_resources import resource_string
@@ -11,7 +13,7 @@ from .exceptions import NotFoundError
 from .fields import Date
 from .mako_module import MakoModuleDescriptor
 from .progress import Progress
-from .x_module import XModule
+from .x_module import XModule, XModuleDescriptor, module_attr
 from .xml_module import XmlDescriptor
 
 log = logging.getLogger(__name__)
@@ -38,8 +40,22 @@ class SequenceFields(object):
     )
 
 
+def _is_all_xmodules(descriptor):
+    """
+    Are descriptor and all of its descendants XModules?
+    """
+    return isinstance(descriptor, XModuleDescriptor) and all(
+        _is_all_xmodules(child) for child in descriptor.get_children()
+    )
+
+
 class SequenceModule(SequenceFields, XModule):
     ''' Layout module which lays out content in a temporal sequence
+
+    If the runtime sets `lazy_sequence_tabs`, only the active tab is rendered
+    with the page.  The others are rendered by the `render_child` handler
+    when they're first shown, so their student state needn't be loaded for
+    the page either.
     '''
     js = {'coffee': [resource_string(__name__,
                                      'js/src/sequence/display.coffee')],
@@ -72,6 +88,45 @@ class SequenceModule(SequenceFields, XModule):
             return json.dumps({'success': True})
         raise NotFoundError('Unexpected dispatch type')
 
+    @property
+    def renders_lazily(self):
+        '''
+        Is only the active tab rendered with the page?
+        '''
+        return bool(getattr(self.system, 'lazy_sequence_tabs', False))
+
+    def get_children_rendered_with_page(self):
+        '''
+        Return the display items whose content student_view renders: all of
+        them, or when rendering lazily, the active one.  Tabs containing
+        XBlocks are always rendered with the page, since their javascript and
+        css are only set up then.
+        '''
+        position = self.position or 1
+        return [
+            child for index, child in enumerate(self.get_display_items(), 1)
+            if not self.renders_lazily or index == position or not _is_all_xmodules(getattr(child, 'descriptor', child))
+        ]
+
+    @XBlock.handler
+    def render_child(self, request, suffix=''):  # pylint: disable=unused-argument
+        '''
+        Render the tab for the display item with the id request.GET['id'],
+        returning its html and progress status as json.
+        '''
+        child_id = request.GET.get('id')
+        for child in self.get_display_items():
+            if child.id == child_id:
+                progress = child.get_progress()
+                return Response(
+                    json.dumps({
+                        'html': child.render('student_view', {}).content,
+                        'progress_status': Progress.to_js_status_str(progress),
+                    }),
+                    content_type='application/json'
+                )
+        raise NotFoundError(u'No tab with id {0}'.format(child_id))
+
     def student_view(self, context):
         # If we're rendering this sequence, but no position is set yet,
         # default the position to the first element
@@ -83,23 +138,35 @@ class SequenceModule(SequenceFields, XModule):
 
         fragment = Fragment()
 
+        rendered_children = self.get_children_rendered_with_page()
         for child in self.get_display_items():
-            progress = child.get_progress()
-            rendered_child = child.render('student_view', context)
-            fragment.add_frag_resources(rendered_child)
-
             titles = child.get_content_titles()
             childinfo = {
-                'content': rendered_child.content,
                 'title': "\n".join(titles),
                 'page_title': titles[0] if titles else '',
-                'progress_status': Progress.to_js_status_str(progress),
-                'progress_detail': Progress.to_js_detail_str(progress),
                 'type': child.get_icon_class(),
                 'id': child.id,
             }
             if childinfo['title'] == '':
                 childinfo['title'] = child.display_name_with_default
+
+            if child in rendered_children:
+                progress = child.get_progress()
+                rendered_child = child.render('student_view', context)
+                fragment.add_frag_resources(rendered_child)
+                childinfo.update({
+                    'content': rendered_child.content,
+                    'progress_status': Progress.to_js_status_str(progress),
+                    'progress_detail': Progress.to_js_detail_str(progress),
+                })
+            else:
+                # The student state needed for the progress isn't loaded
+                # either, so that's sent along with the content
+                childinfo.update({
+                    'content': None,
+                    'progress_status': Progress.to_js_status_str(None),
+                    'progress_detail': Progress.to_js_detail_str(None),
+                })
             contents.append(childinfo)
 
         params = {'items': contents,
@@ -108,6 +175,7 @@ class SequenceModule(SequenceFields, XModule):
                   'position': self.position,
                   'tag': self.location.category,
                   'ajax_url': self.system.ajax_url,
+                  'child_url': self.runtime.handler_url(self, 'render_child') if self.renders_lazily else '',
                   }
 
         fragment.add_content(self.system.render_template('seq_module.html', params))
@@ -131,6 +199,9 @@ class SequenceDescriptor(SequenceFields, MakoModuleDescriptor, XmlDescriptor):
     js = {'coffee': [resource_string(__name__, 'js/src/sequence/edit.coffee')]}
     js_module_name = "SequenceDescriptor"
 
+    get_children_rendered_with_page = module_attr('get_children_rendered_with_page')
+    render_child = module_attr('render_child')
+
     @classmethod
     def definition_from_xml(cls, xml_object, system):
         children = []
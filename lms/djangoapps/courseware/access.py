@@ -5,7 +5,9 @@ import logging
 from datetime import datetime, timedelta
 
 from django.conf import settings
-from django.contrib.auth.models import AnonymousUser
+from django.contrib.auth.models import AnonymousUser, User
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
 
 from xmodule.course_module import CourseDescriptor
 from xmodule.error_module import ErrorDescriptor
@@ -18,6 +20,7 @@ from student.models import CourseEnrollmentAllowed
 from external_auth.models import ExternalAuthMap
 from courseware.masquerade import is_masquerading_as_student
 from django.utils.timezone import UTC
+from request_cache.middleware import RequestCache
 from student.models import CourseEnrollment
 from student.roles import (
     GlobalStaff, CourseStaffRole, CourseInstructorRole,
@@ -25,6 +28,10 @@ from student.roles import (
 )
 DEBUG_ACCESS = False
 
+# Request cache keys of the memoized access decisions and course roles
+DECISIONS_KEY = 'courseware.access.decisions'
+ROLES_KEY = 'courseware.access.roles'
+
 log = logging.getLogger(__name__)
 
 
@@ -61,6 +68,10 @@ def has_access(user, obj, action, course_context=None):
 
     Returns a bool.  It is up to the caller to actually deny access in a way
     that makes sense in context.
+
+    Building a course's table of contents checks access to every module in
+    it, so the decisions for modules and locations are memoized for the rest
+    of the request.
     """
     # Just in case user is passed in as None, make them anonymous
     if not user:
@@ -72,17 +83,17 @@ def has_access(user, obj, action, course_context=None):
         return _has_access_course_desc(user, obj, action)
 
     if isinstance(obj, ErrorDescriptor):
-        return _has_access_error_desc(user, obj, action, course_context)
+        return _memoized_access(_has_access_error_desc, user, obj, obj.location, action, course_context)
 
     if isinstance(obj, XModule):
         return _has_access_xmodule(user, obj, action, course_context)
 
     # NOTE: any descriptor access checkers need to go above this
     if isinstance(obj, XBlock):
-        return _has_access_descriptor(user, obj, action, course_context)
+        return _memoized_access(_has_access_descriptor, user, obj, obj.location, action, course_context)
 
     if isinstance(obj, Location):
-        return _has_access_location(user, obj, action, course_context)
+        return _memoized_access(_has_access_location, user, obj, obj, action, course_context)
 
     if isinstance(obj, basestring):
         return _has_access_string(user, obj, action, course_context)
@@ -327,6 +338,55 @@ def _has_access_string(user, perm, action, course_context):
 
 #####  Internal helper methods below
 
+def _request_memo(name):
+    """
+    The dict memoizing `name` for the current request.  Outside of a request,
+    nothing is memoized, so this is a throwaway dict.
+    """
+    if RequestCache.get_current_request() is None:
+        return {}
+    return RequestCache.get_request_cache().data.setdefault(name, {})
+
+
+def _memoized_access(checker, user, obj, location, action, course_context):
+    """
+    Return checker(user, obj, action, course_context), memoized for the rest
+    of the request by user, location, action and course_context.
+    """
+    decisions = _request_memo(DECISIONS_KEY)
+    key = (user.id, user.is_staff, is_masquerading_as_student(user), location, action, course_context)
+    if key not in decisions:
+        decisions[key] = checker(user, obj, action, course_context)
+    return decisions[key]
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def _forget_access_decisions(sender, **kwargs):  # pylint: disable=unused-argument
+    """
+    Someone was added to or removed from a group, and so perhaps a role.
+    """
+    _request_memo(DECISIONS_KEY).clear()
+
+
+def _course_role(role_class, location, course_context):
+    """
+    Return role_class(location, course_context), memoized for the rest of the
+    request.
+
+    Creating a course role looks up the course's locator, which is the same
+    for every location in the course, so the roles are memoized per course.
+    """
+    if not isinstance(location, Location):
+        return role_class(location, course_context)
+    if location.category == 'course':
+        course_context = location.course_id
+    roles = _request_memo(ROLES_KEY)
+    key = (role_class, location.tag, location.org, location.course, course_context)
+    if key not in roles:
+        roles[key] = role_class(location, course_context)
+    return roles[key]
+
+
 def _dispatch(table, action, user, obj):
     """
     Helper: call table[action], raising a nice pretty error if there is no such key.
@@ -373,7 +433,7 @@ def _adjust_start_date_for_beta_testers(user, descriptor, course_context=None):
         # bail early if no beta testing is set up
         return descriptor.start
 
-    if CourseBetaTesterRole(descriptor.location, course_context=course_context).has_user(user):
+    if _course_role(CourseBetaTesterRole, descriptor.location, course_context).has_user(user):
         debug("Adjust start time: user in beta role for %s", descriptor)
         delta = timedelta(descriptor.days_early_for_beta)
         effective = descriptor.start - delta
@@ -422,7 +482,7 @@ def _has_access_to_location(user, location, access_level, course_context):
         return False
 
     staff_access = (
-        CourseStaffRole(location, course_context).has_user(user) or
+        _course_role(CourseStaffRole, location, course_context).has_user(user) or
         OrgStaffRole(location).has_user(user)
     )
 
@@ -431,7 +491,7 @@ def _has_access_to_location(user, location, access_level, course_context):
         return True
 
     instructor_access = (
-        CourseInstructorRole(location, course_context).has_user(user) or
+        _course_role(CourseInstructorRole, location, course_context).has_user(user) or
         OrgInstructorRole(location).has_user(user)
     )
 
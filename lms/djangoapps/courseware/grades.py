@@ -1,13 +1,16 @@
 # Compute grades using real division, with no integer truncation
 from __future__ import division
 from collections import defaultdict
+from itertools import islice
+import hashlib
 import json
 import random
 import logging
+import weakref
 
 from contextlib import contextmanager
 from django.conf import settings
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.test.client import RequestFactory
 
 from dogapi import dog_stats_api
@@ -16,16 +19,23 @@ from courseware import courses
 from courseware.model_data import FieldDataCache
 from student.models import anonymous_id_for_user
 from submissions import api as sub_api
+from util.query import use_read_replica_if_available
 from xmodule import graders
 from xmodule.graders import Score
 from xmodule.modulestore.django import modulestore
 from xmodule.modulestore.exceptions import ItemNotFoundError
 from xmodule.util.duedate import get_extended_due_date
-from .models import StudentModule
+from .models import StudentModule, StudentSectionGrade
 from .module_render import get_module_for_descriptor
 
 log = logging.getLogger("edx.courseware")
 
+# Number of students graded together by iterate_grades_for
+STUDENT_BATCH_SIZE = 100
+
+# The grading_structure_version of each loaded course
+_grading_structure_versions = weakref.WeakKeyDictionary()
+
 
 def yield_dynamic_descriptor_descendents(descriptor, module_creator):
     """
@@ -146,17 +156,139 @@ def answer_distributions(course_id):
 
     return answer_counts
 
+def grading_structure_version(course):
+    """
+    Return a fingerprint of everything in `course` that affects how a student's
+    graded sections are scored: the graded sections, their formats, the scored
+    descriptors they contain, and those descriptors' weights and content.
+
+    Persisted section grades computed against a different fingerprint are
+    considered stale.
+
+    Like its grading_context, the fingerprint is only computed once for each
+    course object: an edited course is loaded again.
+    """
+    version = _grading_structure_versions.get(course)
+    if version is None:
+        version = _grading_structure_versions[course] = _fingerprint_grading_structure(course)
+    return version
+
+
+def _fingerprint_grading_structure(course):
+    """
+    Compute the `grading_structure_version` of `course`.
+    """
+    fingerprint = hashlib.sha1()
+    for section_format, sections in sorted(course.grading_context['graded_sections'].iteritems()):
+        fingerprint.update(section_format.encode('utf-8'))
+        for section in sections:
+            for descriptor in [section['section_descriptor']] + section['xmoduledescriptors']:
+                fingerprint.update(repr((
+                    descriptor.location.url(),
+                    descriptor.display_name_with_default,
+                    descriptor.graded,
+                    getattr(descriptor, 'weight', None),
+                )))
+                if descriptor.has_score:
+                    fingerprint.update(repr(getattr(descriptor, 'data', None)))
+    return fingerprint.hexdigest()
+
+
+class PersistedSectionGrades(object):
+    """
+    Read/write access to the StudentSectionGrade rows of one student in one
+    course. All of the student's rows are fetched with a single query when the
+    object is created.
+
+    Persistence is only enabled when FEATURES['ENABLE_PERSISTENT_GRADES'] is
+    set; otherwise `get` always misses and `set` does nothing.
+    """
+    def __init__(self, student, course):
+        self.student = student
+        self.course_id = course.id
+        self.enabled = (
+            settings.FEATURES.get('ENABLE_PERSISTENT_GRADES', False) and
+            student.is_authenticated() and
+            not settings.GENERATE_PROFILE_SCORES
+        )
+        self._rows = {}
+        if self.enabled:
+            self.version = grading_structure_version(course)
+            self._rows = dict(
+                (row.section_id, row)
+                for row in StudentSectionGrade.objects.filter(student=student, course_id=course.id)
+            )
+
+    def _row_version(self, locations, student_module_scores):
+        """
+        Return the version of a row computed for `locations` from
+        `student_module_scores`: a fingerprint of the course structure and of
+        the locations' StudentModule scores. A row computed from scores read
+        before a grade event then doesn't match the scores after it, even if it
+        was written after the event invalidated the section.
+        """
+        student_module_scores = student_module_scores or {}
+        inputs = json.dumps([
+            (location, student_module_scores.get(location)) for location in sorted(set(locations))
+        ])
+        return hashlib.sha1(self.version + inputs).hexdigest()
+
+    def get(self, section_id, scores_cache=None, student_module_scores=None):
+        """
+        Return the list of Scores persisted for `section_id`, or None if there
+        are none, they were computed for a different course structure or from
+        different `student_module_scores` (see `student_module_scores_for`), or
+        any of their locations has a score in `scores_cache` (which takes
+        precedence, as in `get_score`).
+        """
+        row = self._rows.get(section_id)
+        if row is None:
+            return None
+        locations = json.loads(row.locations)
+        if row.course_version != self._row_version(locations, student_module_scores):
+            return None
+        if scores_cache and any(location in scores_cache for location in locations):
+            return None
+        return [Score(*score) for score in json.loads(row.scores)]
+
+    def set(self, section_id, scores, locations, student_module_scores):
+        """
+        Persist `scores` for `section_id`, computed from `student_module_scores`.
+        `locations` are the location urls whose grade events must invalidate the
+        persisted scores.
+        """
+        if not self.enabled:
+            return
+        row = self._rows.get(section_id)
+        if row is None:
+            row = StudentSectionGrade(student=self.student, course_id=self.course_id, section_id=section_id)
+        row.course_version = self._row_version(locations, student_module_scores)
+        row.locations = json.dumps(sorted(set(locations)))
+        row.scores = json.dumps(scores)
+
+        # A concurrent request may have created the same row; losing that race
+        # only means the grade gets recomputed next time.
+        sid = transaction.savepoint()
+        try:
+            row.save()
+        except IntegrityError:
+            transaction.savepoint_rollback(sid)
+        else:
+            transaction.savepoint_commit(sid)
+            self._rows[section_id] = row
+
+
 @transaction.commit_manually
-def grade(student, request, course, keep_raw_scores=False):
+def grade(student, request, course, keep_raw_scores=False, student_module_scores=None):
     """
     Wraps "_grade" with the manual_transaction context manager just in case
     there are unanticipated errors.
     """
     with manual_transaction():
-        return _grade(student, request, course, keep_raw_scores)
+        return _grade(student, request, course, keep_raw_scores, student_module_scores)
 
 
-def _grade(student, request, course, keep_raw_scores):
+def _grade(student, request, course, keep_raw_scores, student_module_scores=None):
     """
     Unwrapped version of "grade"
 
@@ -175,6 +307,12 @@ def _grade(student, request, course, keep_raw_scores):
     - keep_raw_scores : if True, then value for key 'raw_scores' contains scores
       for every graded module
 
+    If `student_module_scores` is given, it must map the location url of
+    every StudentModule the student has in the course to its (grade,
+    max_grade), and it is used instead of querying StudentModule (see
+    `student_module_scores_for`). As it may have been read from a lagging
+    read replica, sections scored from it aren't persisted.
+
     More information on the format is in the docstring for CourseGrader.
     """
     grading_context = course.grading_context
@@ -185,6 +323,37 @@ def _grade(student, request, course, keep_raw_scores):
     # means only openassessment (edx-ora2)
     submissions_scores = sub_api.get_scores(course.id, anonymous_id_for_user(student, course.id))
 
+    with manual_transaction():
+        persisted_grades = PersistedSectionGrades(student, course)
+
+        # Only persist sections scored from up to date StudentModule scores
+        persist_scores = student_module_scores is None
+
+        # Fetch the grade of every problem in one query, rather than one per
+        # problem, so that grading takes a constant number of queries
+        if student_module_scores is None and student.is_authenticated():
+            student_module_scores = student_module_scores_for(course.id, [student.id])[student.id]
+
+    # State for every descriptor that could affect grading, fetched the first
+    # time a module has to be created
+    shared_cache = {}
+    all_locations = set(descriptor.location.url() for descriptor in grading_context['all_descriptors'])
+
+    def create_module(descriptor):
+        '''creates an XModule instance given a descriptor'''
+        # TODO: We need the request to pass into here. If we could forego that, our arguments
+        # would be simpler
+        with manual_transaction():
+            if descriptor.location.url() not in all_locations:
+                field_data_cache = FieldDataCache([descriptor], course.id, student)
+            else:
+                if 'field_data_cache' not in shared_cache:
+                    shared_cache['field_data_cache'] = FieldDataCache(
+                        grading_context['all_descriptors'], course.id, student
+                    )
+                field_data_cache = shared_cache['field_data_cache']
+        return get_module_for_descriptor(student, request, descriptor, field_data_cache, course.id)
+
     totaled_scores = {}
     # This next complicated loop is just to collect the totaled_scores, which is
     # passed to the grader
@@ -193,6 +362,7 @@ def _grade(student, request, course, keep_raw_scores):
         for section in sections:
             section_descriptor = section['section_descriptor']
             section_name = section_descriptor.display_name_with_default
+            section_id = section_descriptor.location.url()
 
             # some problems have state that is updated independently of interaction
             # with the LMS, so they need to always be scored. (E.g. foldit.,
@@ -210,32 +380,40 @@ def _grade(student, request, course, keep_raw_scores):
                     for descriptor in section['xmoduledescriptors']
                 )
 
-            if not should_grade_section:
-                with manual_transaction():
-                    should_grade_section = StudentModule.objects.filter(
-                        student=student,
-                        module_state_key__in=[
-                            descriptor.location for descriptor in section['xmoduledescriptors']
-                        ]
-                    ).exists()
+            # Sections whose scores can change without a grade event are never
+            # persisted, so only they skip the persisted grades.
+            can_persist = not should_grade_section
+            scores = None
+            if can_persist:
+                scores = persisted_grades.get(section_id, submissions_scores, student_module_scores)
+
+            if scores is None and not should_grade_section:
+                if student_module_scores is not None:
+                    should_grade_section = any(
+                        descriptor.location.url() in student_module_scores
+                        for descriptor in section['xmoduledescriptors']
+                    )
+                else:
+                    with manual_transaction():
+                        should_grade_section = StudentModule.objects.filter(
+                            student=student,
+                            module_state_key__in=[
+                                descriptor.location for descriptor in section['xmoduledescriptors']
+                            ]
+                        ).exists()
 
             # If we haven't seen a single problem in the section, we don't have
             # to grade it at all! We can assume 0%
-            if should_grade_section:
+            if scores is None and should_grade_section:
                 scores = []
 
-                def create_module(descriptor):
-                    '''creates an XModule instance given a descriptor'''
-                    # TODO: We need the request to pass into here. If we could forego that, our arguments
-                    # would be simpler
-                    with manual_transaction():
-                        field_data_cache = FieldDataCache([descriptor], course.id, student)
-                    return get_module_for_descriptor(student, request, descriptor, field_data_cache, course.id)
-
+                locations = [descriptor.location.url() for descriptor in section['xmoduledescriptors']]
                 for module_descriptor in yield_dynamic_descriptor_descendents(section_descriptor, create_module):
+                    locations.append(module_descriptor.location.url())
 
                     (correct, total) = get_score(
-                        course.id, student, module_descriptor, create_module, scores_cache=submissions_scores
+                        course.id, student, module_descriptor, create_module, scores_cache=submissions_scores,
+                        student_module_scores=student_module_scores
                     )
                     if correct is None and total is None:
                         continue
@@ -253,6 +431,11 @@ def _grade(student, request, course, keep_raw_scores):
 
                     scores.append(Score(correct, total, graded, module_descriptor.display_name_with_default))
 
+                if can_persist and persist_scores:
+                    with manual_transaction():
+                        persisted_grades.set(section_id, scores, locations, student_module_scores)
+
+            if scores is not None:
                 _, graded_total = graders.aggregate_scores(scores, section_name)
                 if keep_raw_scores:
                     raw_scores += scores
@@ -352,6 +535,12 @@ def _progress_summary(student, request, course):
 
     submissions_scores = sub_api.get_scores(course.id, anonymous_id_for_user(student, course.id))
 
+    with manual_transaction():
+        persisted_grades = PersistedSectionGrades(student, course)
+
+    # The field_data_cache already holds every StudentModule in the course
+    student_module_scores = field_data_cache.student_module_scores()
+
     chapters = []
     # Don't include chapters that aren't displayable (e.g. due to error)
     for chapter_module in course_module.get_display_items():
@@ -370,17 +559,28 @@ def _progress_summary(student, request, course):
                 graded = section_module.graded
                 scores = []
 
-                module_creator = section_module.xmodule_runtime.get_module
-
-                for module_descriptor in yield_dynamic_descriptor_descendents(section_module, module_creator):
-                    course_id = course.id
-                    (correct, total) = get_score(
-                        course_id, student, module_descriptor, module_creator, scores_cache=submissions_scores
+                # Graded sections may have had their scores persisted by grade()
+                persisted_scores = None
+                if graded:
+                    persisted_scores = persisted_grades.get(
+                        section_module.location.url(), submissions_scores, student_module_scores
                     )
-                    if correct is None and total is None:
-                        continue
 
-                    scores.append(Score(correct, total, graded, module_descriptor.display_name_with_default))
+                if persisted_scores is not None:
+                    scores = [Score(score.earned, score.possible, graded, score.section) for score in persisted_scores]
+                else:
+                    module_creator = section_module.xmodule_runtime.get_module
+
+                    for module_descriptor in yield_dynamic_descriptor_descendents(section_module, module_creator):
+                        course_id = course.id
+                        (correct, total) = get_score(
+                            course_id, student, module_descriptor, module_creator, scores_cache=submissions_scores,
+                            student_module_scores=student_module_scores
+                        )
+                        if correct is None and total is None:
+                            continue
+
+                        scores.append(Score(correct, total, graded, module_descriptor.display_name_with_default))
 
                 scores.reverse()
                 section_total, _ = graders.aggregate_scores(
@@ -407,7 +607,7 @@ def _progress_summary(student, request, course):
     return chapters
 
 
-def get_score(course_id, user, problem_descriptor, module_creator, scores_cache=None):
+def get_score(course_id, user, problem_descriptor, module_creator, scores_cache=None, student_module_scores=None):
     """
     Return the score for a user on a problem, as a tuple (correct, total).
     e.g. (5,7) if you got 5 out of 7 points.
@@ -421,6 +621,9 @@ def get_score(course_id, user, problem_descriptor, module_creator, scores_cache=
            Can return None if user doesn't have access, or if something else went wrong.
     scores_cache: A dict of location names to (earned, possible) point tuples.
            If an entry is found in this cache, it takes precedence.
+    student_module_scores: A dict of location names to the (grade, max_grade)
+           of every StudentModule the user has in the course. If given, it is
+           used instead of querying StudentModule.
     """
     scores_cache = scores_cache or {}
 
@@ -447,18 +650,23 @@ def get_score(course_id, user, problem_descriptor, module_creator, scores_cache=
         # These are not problems, and do not have a score
         return (None, None)
 
-    try:
-        student_module = StudentModule.objects.get(
-            student=user,
-            course_id=course_id,
-            module_state_key=problem_descriptor.location
-        )
-    except StudentModule.DoesNotExist:
-        student_module = None
+    if student_module_scores is not None:
+        module_grade, module_max_grade = student_module_scores.get(location_url, (None, None))
+    else:
+        try:
+            student_module = StudentModule.objects.get(
+                student=user,
+                course_id=course_id,
+                module_state_key=problem_descriptor.location
+            )
+        except StudentModule.DoesNotExist:
+            module_grade, module_max_grade = None, None
+        else:
+            module_grade, module_max_grade = student_module.grade, student_module.max_grade
 
-    if student_module is not None and student_module.max_grade is not None:
-        correct = student_module.grade if student_module.grade is not None else 0
-        total = student_module.max_grade
+    if module_max_grade is not None:
+        correct = module_grade if module_grade is not None else 0
+        total = module_max_grade
     else:
         # If the problem was not in the cache, or hasn't been graded yet,
         # we need to instantiate the problem.
@@ -479,7 +687,7 @@ def get_score(course_id, user, problem_descriptor, module_creator, scores_cache=
     weight = problem_descriptor.weight
     if weight is not None:
         if total == 0:
-            log.exception("Cannot reweight a problem with zero total points. Problem: " + str(student_module))
+            log.exception("Cannot reweight a problem with zero total points. Problem: " + location_url)
             return (correct, total)
         correct = correct * weight / total
         total = weight
@@ -500,6 +708,29 @@ def manual_transaction():
         transaction.commit()
 
 
+def student_module_scores_for(course_id, student_ids, read_replica=False):
+    """
+    Return a dict mapping each id in `student_ids` to a dict of
+    {location url: (grade, max_grade)} covering every StudentModule that
+    student has in `course_id`. This is the `student_module_scores` argument of
+    `grade` and `get_score`.
+
+    All rows are streamed from a single query that only fetches the grade
+    columns. If `read_replica` is set, use a read replica if one exists for
+    this environment: it may lag behind, so only do that for reports, not to
+    show students their own grades.
+    """
+    scores = dict((student_id, {}) for student_id in student_ids)
+    queryset = StudentModule.objects.filter(course_id=course_id, student__in=student_ids)
+    if read_replica:
+        queryset = use_read_replica_if_available(queryset)
+
+    rows = queryset.values_list('student_id', 'module_state_key', 'grade', 'max_grade')
+    for student_id, module_state_key, module_grade, module_max_grade in rows.iterator():
+        scores[student_id][module_state_key] = (module_grade, module_max_grade)
+    return scores
+
+
 def iterate_grades_for(course_id, students):
     """Given a course_id and an iterable of students (User), yield a tuple of:
 
@@ -517,6 +748,11 @@ def iterate_grades_for(course_id, students):
     - grade_breakdown : A breakdown of the major components that
         make up the final grade. (For display)
     - raw_scores: contains scores for every graded module
+
+    Students are graded in batches of STUDENT_BATCH_SIZE, and the StudentModule
+    scores of each batch are loaded with a single query (see
+    `student_module_scores_for`) instead of one query per problem. `students`
+    is consumed lazily, so it can be a streaming iterator.
     """
     course = courses.get_course_by_id(course_id)
 
@@ -525,25 +761,36 @@ def iterate_grades_for(course_id, students):
     # grading that student.
     request = RequestFactory().get('/')
 
-    for student in students:
-        with dog_stats_api.timer('lms.grades.iterate_grades_for', tags=['action:{}'.format(course_id)]):
-            try:
-                request.user = student
-                # Grading calls problem rendering, which calls masquerading,
-                # which checks session vars -- thus the empty session dict below.
-                # It's not pretty, but untangling that is currently beyond the
-                # scope of this feature.
-                request.session = {}
-                gradeset = grade(student, request, course)
-                yield student, gradeset, ""
-            except Exception as exc:  # pylint: disable=broad-except
-                # Keep marching on even if this student couldn't be graded for
-                # some reason, but log it for future reference.
-                log.exception(
-                    'Cannot grade student %s (%s) in course %s because of exception: %s',
-                    student.username,
-                    student.id,
-                    course_id,
-                    exc.message
-                )
-                yield student, {}, exc.message
+    students = iter(students)
+    while True:
+        batch = list(islice(students, STUDENT_BATCH_SIZE))
+        if not batch:
+            break
+
+        with dog_stats_api.timer('lms.grades.iterate_grades_for.prefetch', tags=['action:{}'.format(course_id)]):
+            batch_scores = student_module_scores_for(
+                course_id, [student.id for student in batch], read_replica=True
+            )
+
+        for student in batch:
+            with dog_stats_api.timer('lms.grades.iterate_grades_for', tags=['action:{}'.format(course_id)]):
+                try:
+                    request.user = student
+                    # Grading calls problem rendering, which calls masquerading,
+                    # which checks session vars -- thus the empty session dict below.
+                    # It's not pretty, but untangling that is currently beyond the
+                    # scope of this feature.
+                    request.session = {}
+                    gradeset = grade(student, request, course, student_module_scores=batch_scores[student.id])
+                    yield student, gradeset, ""
+                except Exception as exc:  # pylint: disable=broad-except
+                    # Keep marching on even if this student couldn't be graded for
+                    # some reason, but log it for future reference.
+                    log.exception(
+                        'Cannot grade student %s (%s) in course %s because of exception: %s',
+                        student.username,
+                        student.id,
+                        course_id,
+                        exc.message
+                    )
+                    yield student, {}, exc.message
@@ -10,7 +10,7 @@ from optparse import make_option
 
 from django.core.management.base import BaseCommand
 
-from courseware.models import StudentModule
+from courseware.models import StudentModule, StudentSectionGrade
 from capa.correctmap import CorrectMap
 
 LOG = logging.getLogger(__name__)
@@ -101,6 +101,7 @@ class Command(BaseCommand):
                                                     student=module.student.username, course_id=module.course_id))
             module.grade = correct
             module.save()
+            StudentSectionGrade.invalidate(module.student_id, module.course_id, module.module_state_key)
             self.num_changed += 1
         else:
             # don't make the change, but log that the change would be made
@@ -7,13 +7,15 @@ from collections import defaultdict
 from itertools import chain
 from .models import (
     StudentModule,
+    StudentModuleHistory,
     XModuleUserStateSummaryField,
     XModuleStudentPrefsField,
     XModuleStudentInfoField
 )
 import logging
 
-from django.db import DatabaseError
+from contextlib import contextmanager
+from django.db import DatabaseError, IntegrityError, transaction
 from django.contrib.auth.models import User
 
 from xblock.runtime import KeyValueStore
@@ -38,6 +40,43 @@ def chunks(items, chunk_size):
     return (items[i:i + chunk_size] for i in xrange(0, len(items), chunk_size))
 
 
+def copy_json_value(value):
+    """
+    Return a copy of `value`, a value that can be encoded as json, which
+    shares no dicts or lists with it. This is much cheaper than copy.deepcopy,
+    as json values can't contain cycles or other mutable types.
+    """
+    if isinstance(value, dict):
+        return dict((key, copy_json_value(item)) for key, item in value.iteritems())
+    elif isinstance(value, list):
+        return [copy_json_value(item) for item in value]
+    return value
+
+
+def get_child_descriptors(descriptor, depth, descriptor_filter):
+    """
+    Return a list of all child descriptors down to the specified depth
+    that match the descriptor filter. Includes `descriptor`
+
+    descriptor: The parent to search inside
+    depth: The number of levels to descend, or None for infinite depth
+    descriptor_filter(descriptor): A function that returns True
+        if descriptor should be included in the results
+    """
+    if descriptor_filter(descriptor):
+        descriptors = [descriptor]
+    else:
+        descriptors = []
+
+    if depth is None or depth > 0:
+        new_depth = depth - 1 if depth is not None else depth
+
+        for child in descriptor.get_children() + descriptor.get_required_module_descriptors():
+            descriptors.extend(get_child_descriptors(child, new_depth, descriptor_filter))
+
+    return descriptors
+
+
 class FieldDataCache(object):
     """
     A cache of django model objects needed to supply the data
@@ -57,15 +96,52 @@ class FieldDataCache(object):
         select_for_update: True if rows should be locked until end of transaction
         '''
         self.cache = {}
-        self.descriptors = descriptors
+        # Decoded StudentModule.state dicts, keyed by module_state_key. Each
+        # entry also holds the serialized state it was decoded from, so that a
+        # StudentModule whose state is replaced gets decoded again.
+        self._user_states = {}
+        # The module_state_keys of the decoded states that have been changed
+        # since they were last encoded
+        self._dirty_user_states = set()
+        # Newly created field objects that haven't been written to the
+        # database yet, keyed by id(), when creates are being batched (see
+        # `batch_creates`)
+        self._pending_creates = None
+        self.descriptors = []
         self.select_for_update = select_for_update
         self.course_id = course_id
         self.user = user
 
-        if user.is_authenticated():
-            for scope, fields in self._fields_to_cache().items():
-                for field_object in self._retrieve_fields(scope, fields):
-                    self.cache[self._cache_key_from_field_object(scope, field_object)] = field_object
+        self.add_descriptors(descriptors)
+
+    def add_descriptors(self, descriptors):
+        """
+        Also cache the objects needed by each of descriptors, e.g. for those
+        descendents of a module that weren't known to be needed when the cache
+        was created.  Descriptors that are already cached are skipped, and
+        objects already in the cache are kept.
+        """
+        cached_ids = set(descriptor.scope_ids.usage_id for descriptor in self.descriptors)
+        descriptors = [
+            descriptor for descriptor in descriptors
+            if descriptor.scope_ids.usage_id not in cached_ids
+        ]
+        if not descriptors:
+            return
+        self.descriptors.extend(descriptors)
+
+        if self.user.is_authenticated():
+            for scope, fields in self._fields_to_cache(descriptors).items():
+                for field_object in self._retrieve_fields(scope, fields, descriptors):
+                    self.cache.setdefault(self._cache_key_from_field_object(scope, field_object), field_object)
+
+    def add_descriptor_descendents(self, descriptor, depth=None,
+                                   descriptor_filter=lambda descriptor: True):
+        """
+        Also cache the objects needed by descriptor and its descendents.  The
+        arguments are as for `cache_for_descriptor_descendents`.
+        """
+        self.add_descriptors(get_child_descriptors(descriptor, depth, descriptor_filter))
 
     @classmethod
     def cache_for_descriptor_descendents(cls, course_id, user, descriptor, depth=None,
@@ -81,30 +157,6 @@ class FieldDataCache(object):
             should be cached
         select_for_update: Flag indicating whether the rows should be locked until end of transaction
         """
-
-        def get_child_descriptors(descriptor, depth, descriptor_filter):
-            """
-            Return a list of all child descriptors down to the specified depth
-            that match the descriptor filter. Includes `descriptor`
-
-            descriptor: The parent to search inside
-            depth: The number of levels to descend, or None for infinite depth
-            descriptor_filter(descriptor): A function that returns True
-                if descriptor should be included in the results
-            """
-            if descriptor_filter(descriptor):
-                descriptors = [descriptor]
-            else:
-                descriptors = []
-
-            if depth is None or depth > 0:
-                new_depth = depth - 1 if depth is not None else depth
-
-                for child in descriptor.get_children() + descriptor.get_required_module_descriptors():
-                    descriptors.extend(get_child_descriptors(child, new_depth, descriptor_filter))
-
-            return descriptors
-
         descriptors = get_child_descriptors(descriptor, depth, descriptor_filter)
 
         return FieldDataCache(descriptors, course_id, user, select_for_update)
@@ -134,15 +186,16 @@ class FieldDataCache(object):
         )
         return res
 
-    def _retrieve_fields(self, scope, fields):
+    def _retrieve_fields(self, scope, fields, descriptors):
         """
         Queries the database for all of the fields in the specified scope
+        needed by descriptors
         """
         if scope == Scope.user_state:
             return self._chunked_query(
                 StudentModule,
                 'module_state_key__in',
-                (str(descriptor.scope_ids.usage_id) for descriptor in self.descriptors),
+                (str(descriptor.scope_ids.usage_id) for descriptor in descriptors),
                 course_id=self.course_id,
                 student=self.user.pk,
             )
@@ -150,14 +203,14 @@ class FieldDataCache(object):
             return self._chunked_query(
                 XModuleUserStateSummaryField,
                 'usage_id__in',
-                (str(descriptor.scope_ids.usage_id) for descriptor in self.descriptors),
+                (str(descriptor.scope_ids.usage_id) for descriptor in descriptors),
                 field_name__in=set(field.name for field in fields),
             )
         elif scope == Scope.preferences:
             return self._chunked_query(
                 XModuleStudentPrefsField,
                 'module_type__in',
-                set(descriptor.scope_ids.block_type for descriptor in self.descriptors),
+                set(descriptor.scope_ids.block_type for descriptor in descriptors),
                 student=self.user.pk,
                 field_name__in=set(field.name for field in fields),
             )
@@ -170,12 +223,13 @@ class FieldDataCache(object):
         else:
             return []
 
-    def _fields_to_cache(self):
+    def _fields_to_cache(self, descriptors):
         """
         Returns a map of scopes to fields in that scope that should be cached
+        for descriptors
         """
         scope_map = defaultdict(set)
-        for descriptor in self.descriptors:
+        for descriptor in descriptors:
             for field in descriptor.fields.values():
                 scope_map[field.scope].add(field)
         return scope_map
@@ -222,6 +276,61 @@ class FieldDataCache(object):
 
         return self.cache.get(self._cache_key_from_kvs_key(key))
 
+    def user_state(self, student_module):
+        """
+        Return the decoded state dict of `student_module`, a StudentModule
+        from this cache. The state is only parsed the first time it is
+        requested, and the dict is kept by this cache, so callers must not
+        modify it or hand out its mutable values (see `copy_json_value`), and
+        must only change it through `update_user_state`.
+        """
+        raw_state, state = self._user_states.get(student_module.module_state_key, (None, None))
+        if state is None or raw_state is not student_module.state:
+            state = json.loads(student_module.state)
+            self._user_states[student_module.module_state_key] = (student_module.state, state)
+            self._dirty_user_states.discard(student_module.module_state_key)
+        return state
+
+    def update_user_state(self, student_module, values=None, deleted=()):
+        """
+        Set the fields in `values` and remove the fields named in `deleted`
+        from the decoded state of `student_module`. The state isn't encoded
+        until `encode_user_state` is called, so that any number of changes to
+        a StudentModule are serialized once, when it is saved.
+        """
+        state = self.user_state(student_module)
+        for field_name, value in (values or {}).iteritems():
+            # Copied so that later in place changes by the caller aren't saved
+            # along with other fields
+            state[field_name] = copy_json_value(value)
+        for field_name in deleted:
+            del state[field_name]
+        self._dirty_user_states.add(student_module.module_state_key)
+
+    def encode_user_state(self, student_module):
+        """
+        Serialize the decoded state of `student_module` into its `state` field,
+        ready to be saved, if it has changed since it was last encoded.
+        """
+        if student_module.module_state_key not in self._dirty_user_states:
+            return
+        state = self.user_state(student_module)
+        student_module.state = json.dumps(state)
+        self._user_states[student_module.module_state_key] = (student_module.state, state)
+        self._dirty_user_states.discard(student_module.module_state_key)
+
+    def student_module_scores(self):
+        """
+        Return a dict mapping the location url of every cached StudentModule
+        to its (grade, max_grade), in the form expected by
+        `courseware.grades.get_score`.
+        """
+        return dict(
+            (cache_key[1], (field_object.grade, field_object.max_grade))
+            for cache_key, field_object in self.cache.iteritems()
+            if cache_key[0] == Scope.user_state
+        )
+
     def find_or_create(self, key):
         '''
         Find a model data object in this cache, or create it if it doesn't
@@ -233,36 +342,198 @@ class FieldDataCache(object):
             return field_object
 
         if key.scope == Scope.user_state:
-            field_object, _ = StudentModule.objects.get_or_create(
-                course_id=self.course_id,
-                student=User.objects.get(id=key.user_id),
-                module_state_key=key.block_scope_id.url(),
-                defaults={
-                    'state': json.dumps({}),
-                    'module_type': key.block_scope_id.category,
-                },
-            )
+            fields = {
+                'course_id': self.course_id,
+                'student': self._user_for_key(key),
+                'module_state_key': key.block_scope_id.url(),
+            }
+            defaults = {
+                'state': json.dumps({}),
+                'module_type': key.block_scope_id.category,
+            }
+            field_object = self._get_or_create(StudentModule, fields, defaults)
         elif key.scope == Scope.user_state_summary:
             field_object, _ = XModuleUserStateSummaryField.objects.get_or_create(
                 field_name=key.field_name,
                 usage_id=key.block_scope_id.url()
             )
         elif key.scope == Scope.preferences:
-            field_object, _ = XModuleStudentPrefsField.objects.get_or_create(
-                field_name=key.field_name,
-                module_type=key.block_scope_id,
-                student=User.objects.get(id=key.user_id),
-            )
+            fields = {
+                'field_name': key.field_name,
+                'module_type': key.block_scope_id,
+                'student': self._user_for_key(key),
+            }
+            field_object = self._get_or_create(XModuleStudentPrefsField, fields)
         elif key.scope == Scope.user_info:
             field_object, _ = XModuleStudentInfoField.objects.get_or_create(
                 field_name=key.field_name,
-                student=User.objects.get(id=key.user_id),
+                student=self._user_for_key(key),
             )
 
         cache_key = self._cache_key_from_kvs_key(key)
         self.cache[cache_key] = field_object
         return field_object
 
+    def discard_pending_create(self, key):
+        """
+        Forget the queued, not yet inserted, field object for `key`.
+        """
+        field_object = self.cache.pop(self._cache_key_from_kvs_key(key))
+        del self._pending_creates[id(field_object)]
+
+    def _user_for_key(self, key):
+        """
+        Return the User that `key` belongs to, reusing the cache's own User
+        rather than fetching it again.
+        """
+        if key.user_id == self.user.id:
+            return self.user
+        return User.objects.get(id=key.user_id)
+
+    def _get_or_create(self, model_class, fields, defaults=None):
+        """
+        Return the `model_class` object identified by `fields`. Inside
+        `batch_creates`, a missing object is only instantiated and queued to
+        be inserted with all the other missing objects; otherwise it is
+        created right away.
+        """
+        if self._pending_creates is None or fields['student'] is not self.user:
+            field_object, _ = model_class.objects.get_or_create(defaults=defaults, **fields)
+            return field_object
+
+        field_object = model_class(**dict(fields, **(defaults or {})))
+        self._pending_creates[id(field_object)] = field_object
+        return field_object
+
+    def is_pending_create(self, field_object):
+        """
+        Return whether `field_object` is queued to be inserted by
+        `batch_creates` and hasn't been written to the database yet.
+        """
+        return (
+            field_object.pk is None and
+            self._pending_creates is not None and
+            id(field_object) in self._pending_creates
+        )
+
+    @contextmanager
+    def batch_creates(self):
+        """
+        Within this context, StudentModule and XModuleStudentPrefsField rows
+        that `find_or_create` has to create are only inserted when the context
+        exits, using a single multi-row insert per table (plus one query to
+        read back their ids), instead of a get_or_create per row.
+
+        Objects that are explicitly saved before then are inserted at that time
+        as usual. If another request inserted some of the same rows
+        concurrently, the queued objects are merged into the existing rows one
+        at a time.
+        """
+        if self._pending_creates is not None:
+            # Already batching; the outermost context does the insert
+            yield
+            return
+
+        self._pending_creates = {}
+        try:
+            yield
+        finally:
+            pending = [field_object for field_object in self._pending_creates.itervalues() if field_object.pk is None]
+            self._pending_creates = None
+            self._insert_pending(pending)
+
+    def _insert_pending(self, pending):
+        """
+        Insert the queued field objects in `pending`.
+        """
+        for model_class, unique_fields in (
+            (StudentModule, ('student', 'module_state_key', 'course_id')),
+            (XModuleStudentPrefsField, ('student', 'module_type', 'field_name')),
+        ):
+            field_objects = [field_object for field_object in pending if isinstance(field_object, model_class)]
+            if not field_objects:
+                continue
+
+            sid = transaction.savepoint()
+            try:
+                model_class.objects.bulk_create(field_objects)
+            except IntegrityError:
+                # Another request created some of these rows in the meantime
+                transaction.savepoint_rollback(sid)
+                for field_object in field_objects:
+                    self._save_or_merge(field_object, unique_fields)
+            else:
+                transaction.savepoint_commit(sid)
+                self._read_back_ids(model_class, field_objects, unique_fields)
+                if model_class is StudentModule:
+                    StudentModuleHistory.objects.bulk_create([
+                        StudentModuleHistory(
+                            student_module=field_object,
+                            version=None,
+                            created=field_object.modified,
+                            state=field_object.state,
+                            grade=field_object.grade,
+                            max_grade=field_object.max_grade,
+                        )
+                        for field_object in field_objects
+                        if field_object.module_type in StudentModuleHistory.HISTORY_SAVING_TYPES
+                    ])
+
+    def _read_back_ids(self, model_class, field_objects, unique_fields):
+        """
+        Set the primary keys of the just-inserted `field_objects`, which
+        bulk_create doesn't do, so that later saves update their rows.
+        """
+        # All of the rows belong to this cache's user; they are selected by
+        # the last of their unique fields
+        lookup_field = unique_fields[-1]
+        filters = {'student': self.user.pk}
+        if model_class is StudentModule:
+            filters['course_id'] = self.course_id
+        rows = self._chunked_query(
+            model_class,
+            lookup_field + '__in',
+            set(getattr(field_object, lookup_field) for field_object in field_objects),
+            **filters
+        )
+
+        attnames = [
+            model_class._meta.get_field(field_name).attname  # pylint: disable=protected-access
+            for field_name in unique_fields
+        ]
+
+        def identity(field_object):
+            """The values that uniquely identify the row of `field_object`"""
+            return tuple(getattr(field_object, attname) for attname in attnames)
+
+        ids = dict((identity(row), row.pk) for row in rows)
+        for field_object in field_objects:
+            field_object.pk = ids.get(identity(field_object))
+
+    def _save_or_merge(self, field_object, unique_fields):
+        """
+        Insert `field_object`, or if its row already exists, make
+        `field_object` update that row instead. For a StudentModule, the
+        fields set in this request are merged into the existing state.
+        """
+        sid = transaction.savepoint()
+        try:
+            field_object.save()
+        except IntegrityError:
+            transaction.savepoint_rollback(sid)
+            existing = field_object.__class__.objects.get(
+                **dict((field_name, getattr(field_object, field_name)) for field_name in unique_fields)
+            )
+            field_object.pk = existing.pk
+            if isinstance(field_object, StudentModule):
+                state = json.loads(existing.state or '{}')
+                state.update(self.user_state(field_object))
+                field_object.state = json.dumps(state)
+                field_object.created = existing.created
+            field_object.save()
+        else:
+            transaction.savepoint_commit(sid)
+
 
 class DjangoKeyValueStore(KeyValueStore):
     """
@@ -301,7 +572,9 @@ class DjangoKeyValueStore(KeyValueStore):
             raise KeyError(key.field_name)
 
         if key.scope == Scope.user_state:
-            return json.loads(field_object.state)[key.field_name]
+            # The decoded state is shared by every block bound to this row, so
+            # each reader gets its own copy of the value to modify
+            return copy_json_value(self._field_data_cache.user_state(field_object)[key.field_name])
         else:
             return json.loads(field_object.value)
 
@@ -320,7 +593,10 @@ class DjangoKeyValueStore(KeyValueStore):
 
         """
         saved_fields = []
-        # field_objects maps a field_object to a list of associated fields
+        # field_objects maps the id() of a field_object to the field_object and
+        # a list of associated fields. Objects are keyed by identity because
+        # unsaved model instances (see FieldDataCache.batch_creates) all
+        # compare equal.
         field_objects = dict()
         for field in kv_dict:
             # Check field for validity
@@ -329,30 +605,34 @@ class DjangoKeyValueStore(KeyValueStore):
 
             # If the field is valid and isn't already in the dictionary, add it.
             field_object = self._field_data_cache.find_or_create(field)
-            if field_object not in field_objects.keys():
-                field_objects[field_object] = []
+            if id(field_object) not in field_objects:
+                field_objects[id(field_object)] = (field_object, [])
             # Update the list of associated fields
-            field_objects[field_object].append(field)
+            field_objects[id(field_object)][1].append(field)
 
-            # Special case when scope is for the user state, because this scope saves fields in a single row
-            if field.scope == Scope.user_state:
-                state = json.loads(field_object.state)
-                state[field.field_name] = kv_dict[field]
-                field_object.state = json.dumps(state)
-            else:
+            # The user state scope saves all of a row's fields at once, in the loop below.
             # The remaining scopes save fields on different rows, so
             # we don't have to worry about conflicts
+            if field.scope != Scope.user_state:
                 field_object.value = json.dumps(kv_dict[field])
 
-        for field_object in field_objects:
+        for field_object, fields in field_objects.itervalues():
+            if fields[0].scope == Scope.user_state:
+                self._field_data_cache.update_user_state(
+                    field_object,
+                    dict((field.field_name, kv_dict[field]) for field in fields)
+                )
+                self._field_data_cache.encode_user_state(field_object)
             try:
-                # Save the field object that we made above
-                field_object.save()
+                # Save the field object that we made above, unless it will be
+                # inserted by FieldDataCache.batch_creates
+                if not self._field_data_cache.is_pending_create(field_object):
+                    field_object.save()
                 # If save is successful on this scope, add the saved fields to
                 # the list of successful saves
-                saved_fields.extend([field.field_name for field in field_objects[field_object]])
+                saved_fields.extend([field.field_name for field in fields])
             except DatabaseError:
-                log.exception('Error saving fields %r', field_objects[field_object])
+                log.exception('Error saving fields %r', fields)
                 raise KeyValueMultiSaveError(saved_fields)
 
     def delete(self, key):
@@ -364,10 +644,12 @@ class DjangoKeyValueStore(KeyValueStore):
             raise KeyError(key.field_name)
 
         if key.scope == Scope.user_state:
-            state = json.loads(field_object.state)
-            del state[key.field_name]
-            field_object.state = json.dumps(state)
-            field_object.save()
+            self._field_data_cache.update_user_state(field_object, deleted=[key.field_name])
+            self._field_data_cache.encode_user_state(field_object)
+            if not self._field_data_cache.is_pending_create(field_object):
+                field_object.save()
+        elif self._field_data_cache.is_pending_create(field_object):
+            self._field_data_cache.discard_pending_create(key)
         else:
             field_object.delete()
 
@@ -380,6 +662,6 @@ class DjangoKeyValueStore(KeyValueStore):
             return False
 
         if key.scope == Scope.user_state:
-            return key.field_name in json.loads(field_object.state)
+            return key.field_name in self._field_data_cache.user_state(field_object)
         else:
             return True
@@ -15,7 +15,7 @@ ASSUMPTIONS: modules have unique IDs, even across different module_types
 from django.contrib.auth.models import User
 from django.conf import settings
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 
@@ -251,3 +251,60 @@ class OfflineComputedGradeLog(models.Model):
 
     def __unicode__(self):
         return "[OCGLog] %s: %s" % (self.course_id, self.created)
+
+
+class StudentSectionGrade(models.Model):
+    """
+    Persisted grade for one graded section (subsection) of a course for one
+    student. Rows are written by courseware.grades after a section has been
+    scored, and are deleted whenever a problem they depend on publishes a new
+    grade, so that only the affected section is recomputed on the next grade.
+
+    `course_version` is a fingerprint of the course's grading structure and of
+    the StudentModule scores the row was computed from; a row whose version
+    does not match the current course and scores is ignored and rewritten.
+    """
+    class Meta:
+        unique_together = (('student', 'course_id', 'section_id'),)
+
+    student = models.ForeignKey(User, db_index=True)
+    course_id = models.CharField(max_length=255, db_index=True)
+
+    # location url of the section descriptor
+    section_id = models.CharField(max_length=255)
+    course_version = models.CharField(max_length=40)
+
+    # JSON list of the location urls of every scored descendant that was
+    # considered when the row was computed
+    locations = models.TextField(default='[]')
+    # JSON list of [earned, possible, graded, display_name] per scored descendant
+    scores = models.TextField(default='[]')
+
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+    modified = models.DateTimeField(auto_now=True, db_index=True)
+
+    @classmethod
+    def invalidate(cls, student_id, course_id, location_url):
+        """
+        Delete every persisted section grade of `student_id` in `course_id`
+        that depends on the problem at `location_url`.
+        """
+        cls.objects.filter(
+            student_id=student_id,
+            course_id=course_id,
+            locations__contains=u'"{}"'.format(location_url),
+        ).delete()
+
+    def __unicode__(self):
+        return "[StudentSectionGrade] %s: %s %s (%s)" % (
+            self.student_id, self.course_id, self.section_id, self.course_version
+        )
+
+
+@receiver(post_delete, sender=StudentModule)
+def invalidate_section_grades(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Deleting a student's module state (e.g. when an instructor resets it)
+    invalidates the persisted section grades that depend on it.
+    """
+    StudentSectionGrade.invalidate(instance.student_id, instance.course_id, instance.module_state_key)
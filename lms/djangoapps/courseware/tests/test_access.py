@@ -1,12 +1,15 @@
 import courseware.access as access
 import datetime
 
-from mock import Mock
+from mock import Mock, patch
 
 from django.test import TestCase
+from django.test.client import RequestFactory
 from django.test.utils import override_settings
 
 from courseware.tests.factories import UserFactory, CourseEnrollmentAllowedFactory, StaffFactory, InstructorFactory
+from request_cache.middleware import RequestCache
+from student.roles import CourseStaffRole
 from student.tests.factories import AnonymousUserFactory
 from xmodule.modulestore import Location
 from courseware.tests.tests import TEST_DATA_MIXED_MODULESTORE
@@ -103,6 +106,65 @@ class AccessTestCase(TestCase):
         """Ensure has_access handles a user being passed as null"""
         access.has_access(None, 'global', 'staff', None)
 
+
+@override_settings(MODULESTORE=TEST_DATA_MIXED_MODULESTORE)
+class AccessMemoTestCase(TestCase):
+    """
+    Tests for memoizing access decisions and course roles within a request
+    """
+    def setUp(self):
+        self.course = Location('i4x://edX/toy/course/2012_Fall')
+        self.html = Location('i4x://edX/toy/html/toyhtml')
+        self.student = UserFactory()
+        self.course_staff = StaffFactory(course=self.course)
+
+        self.middleware = RequestCache()
+        self.middleware.process_request(RequestFactory().get('dummy_url'))
+        self.addCleanup(self.middleware.process_response, None, None)
+
+    @patch('courseware.access._has_staff_access_to_location', return_value=True)
+    def test_memoized_within_request(self, check):
+        self.assertTrue(access.has_access(self.course_staff, self.html, 'staff', self.course.course_id))
+        self.assertTrue(access.has_access(self.course_staff, self.html, 'staff', self.course.course_id))
+        self.assertEqual(check.call_count, 1)
+
+        # Decisions are per user and location
+        access.has_access(self.student, self.html, 'staff', self.course.course_id)
+        access.has_access(self.course_staff, self.course, 'staff')
+        self.assertEqual(check.call_count, 3)
+
+    @patch('courseware.access._has_staff_access_to_location', return_value=True)
+    def test_not_memoized_across_requests(self, check):
+        access.has_access(self.course_staff, self.html, 'staff', self.course.course_id)
+        self.middleware.process_response(None, None)
+        self.middleware.process_request(RequestFactory().get('dummy_url'))
+        access.has_access(self.course_staff, self.html, 'staff', self.course.course_id)
+        self.middleware.process_response(None, None)
+        access.has_access(self.course_staff, self.html, 'staff', self.course.course_id)
+        access.has_access(self.course_staff, self.html, 'staff', self.course.course_id)
+        self.assertEqual(check.call_count, 4)
+
+    def test_forgotten_when_roles_change(self):
+        self.assertFalse(access.has_access(self.student, self.html, 'staff', self.course.course_id))
+        CourseStaffRole(self.course).add_users(self.student)
+        self.assertTrue(access.has_access(self.student, self.html, 'staff', self.course.course_id))
+        CourseStaffRole(self.course).remove_users(self.student)
+        self.assertFalse(access.has_access(self.student, self.html, 'staff', self.course.course_id))
+
+    def test_masquerade(self):
+        self.assertTrue(access.has_access(self.course_staff, self.html, 'staff', self.course.course_id))
+        self.course_staff.masquerade_as_student = True
+        self.assertFalse(access.has_access(self.course_staff, self.html, 'staff', self.course.course_id))
+
+    def test_roles_memoized_per_course(self):
+        with patch('courseware.access.CourseStaffRole', Mock(wraps=CourseStaffRole)) as role_class:
+            for name in ['toyhtml', 'toylab', 'toyjumpto']:
+                location = Location('i4x', 'edX', 'toy', 'html', name)
+                self.assertFalse(access._has_access_to_location(self.student, location, 'staff', self.course.course_id))
+                self.assertTrue(access._has_access_to_location(self.course_staff, location, 'staff', self.course.course_id))
+        self.assertEqual(role_class.call_count, 1)
+
+
 class UserRoleTestCase(TestCase):
     """
     Tests for user roles.
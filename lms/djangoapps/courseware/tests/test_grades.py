@@ -1,7 +1,10 @@
 """
 Test grade calculation.
 """
+from django.conf import settings
+from django.db.models.query import QuerySet
 from django.http import Http404
+from django.test.client import RequestFactory
 from django.test.utils import override_settings
 from mock import patch
 
@@ -10,10 +13,11 @@ from student.tests.factories import UserFactory
 from xmodule.modulestore.tests.factories import CourseFactory
 from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase
 
-from courseware.grades import grade, iterate_grades_for
+from courseware.grades import grade, iterate_grades_for, student_module_scores_for, _fingerprint_grading_structure
+from courseware.tests.factories import StudentModuleFactory
 
 
-def _grade_with_errors(student, request, course, keep_raw_scores=False):
+def _grade_with_errors(student, request, course, keep_raw_scores=False, student_module_scores=None):
     """This fake grade method will throw exceptions for student3 and
     student4, but allow any other students to go through normal grading.
 
@@ -24,7 +28,7 @@ def _grade_with_errors(student, request, course, keep_raw_scores=False):
     if student.username in ['student3', 'student4']:
         raise Exception("I don't like {}".format(student.username))
 
-    return grade(student, request, course, keep_raw_scores=keep_raw_scores)
+    return grade(student, request, course, keep_raw_scores=keep_raw_scores, student_module_scores=student_module_scores)
 
 
 @override_settings(MODULESTORE=TEST_DATA_MIXED_MODULESTORE)
@@ -105,6 +109,58 @@ class TestGradeIteration(ModuleStoreTestCase):
         self.assertTrue(all_gradesets[student2])
         self.assertTrue(all_gradesets[student5])
 
+    def test_batched_grading(self):
+        """Students are graded in batches, each with one StudentModule query"""
+        with patch('courseware.grades.STUDENT_BATCH_SIZE', 2):
+            with patch('courseware.grades.student_module_scores_for', wraps=student_module_scores_for) as mock_prefetch:
+                all_gradesets, all_errors = self._gradesets_and_errors_for(self.course.id, self.students)
+
+        self.assertEqual(len(all_gradesets), 5)
+        self.assertEqual(len(all_errors), 0)
+        self.assertEqual(mock_prefetch.call_count, 3)
+        for call in mock_prefetch.call_args_list:
+            self.assertTrue(call[1]['read_replica'])
+
+    @patch.dict('django.conf.settings.FEATURES', {'ENABLE_PERSISTENT_GRADES': True})
+    def test_structure_fingerprinted_once(self):
+        """The course's grading structure is fingerprinted once, not for every student"""
+        with patch(
+            'courseware.grades._fingerprint_grading_structure', wraps=_fingerprint_grading_structure
+        ) as mock_fingerprint:
+            all_gradesets, all_errors = self._gradesets_and_errors_for(self.course.id, self.students)
+
+        self.assertEqual(len(all_gradesets), 5)
+        self.assertEqual(len(all_errors), 0)
+        self.assertEqual(mock_fingerprint.call_count, 1)
+
+    def test_single_student_not_graded_from_replica(self):
+        """Grading one student reads their scores from the default database, which doesn't lag"""
+        student = self.students[0]
+        request = RequestFactory().get('/')
+        request.user = student
+        request.session = {}
+        with patch.dict(settings.DATABASES, {'read_replica': settings.DATABASES['default']}):
+            with patch.object(QuerySet, 'using', autospec=True, side_effect=QuerySet.using) as mock_using:
+                grade(student, request, self.course)
+        self.assertNotIn('read_replica', [call[0][1] for call in mock_using.call_args_list])
+
+    def test_student_module_scores_for(self):
+        """StudentModule scores are grouped by student and location"""
+        student1, student2 = self.students[:2]
+        StudentModuleFactory.create(
+            student=student1, course_id=self.course.id, module_state_key='i4x://a/b/problem/p1', grade=1, max_grade=2
+        )
+        StudentModuleFactory.create(
+            student=student1, course_id='other/course/id', module_state_key='i4x://a/b/problem/p2', grade=1, max_grade=1
+        )
+        self.assertEqual(
+            student_module_scores_for(self.course.id, [student1.id, student2.id]),
+            {
+                student1.id: {'i4x://a/b/problem/p1': (1, 2)},
+                student2.id: {},
+            }
+        )
+
     ################################# Helpers #################################
     def _gradesets_and_errors_for(self, course_id, students):
         """Simple helper method to iterate through student grades and give us
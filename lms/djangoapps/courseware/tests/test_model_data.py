@@ -150,6 +150,59 @@ class TestStudentModuleStorage(OtherUserFailureTestMixin, TestCase):
         "Test that `has` returns False for missing fields in StudentModule"
         self.assertFalse(self.kvs.has(user_state_key('not_a_field')))
 
+    def test_state_decoded_once(self):
+        "Test that repeated reads of user_state fields only decode the StudentModule state once"
+        with patch('courseware.model_data.json.loads', wraps=json.loads) as mock_loads:
+            for _ in range(12):
+                self.kvs.get(user_state_key('a_field'))
+                self.kvs.has(user_state_key('b_field'))
+        self.assertEquals(1, mock_loads.call_count)
+
+    def test_state_encoded_once_per_save(self):
+        "Test that set_many serializes the StudentModule state once, however many fields change"
+        kv_dict = dict((user_state_key('field_{}'.format(i)), i) for i in range(12))
+        with patch('courseware.model_data.json.dumps', wraps=json.dumps) as mock_dumps:
+            self.kvs.set_many(kv_dict)
+        self.assertEquals(1, mock_dumps.call_count)
+        state = json.loads(StudentModule.objects.all()[0].state)
+        for i in range(12):
+            self.assertEquals(i, state['field_{}'.format(i)])
+
+    @patch('courseware.model_data.json.dumps', wraps=json.dumps)
+    @patch('courseware.model_data.json.loads', wraps=json.loads)
+    def test_reads_copy_without_decoding(self, mock_loads, mock_dumps):
+        "Test that each read of a user_state field gets its own copy of the value, without decoding the state again"
+        key = user_state_key('a_field')
+        self.kvs.set(key, {'answers': [[0]]})
+        mock_loads.reset_mock()
+        mock_dumps.reset_mock()
+        first = self.kvs.get(key)
+        first['answers'][0].append(1)
+        self.assertEquals({'answers': [[0]]}, self.kvs.get(key))
+        self.assertEquals(0, mock_loads.call_count)
+        self.assertEquals(0, mock_dumps.call_count)
+
+    def test_writes_dont_decode(self):
+        "Test that saving user_state fields doesn't decode the StudentModule state again"
+        self.kvs.get(user_state_key('a_field'))
+        with patch('courseware.model_data.json.loads', wraps=json.loads) as mock_loads:
+            with patch('courseware.model_data.json.dumps', wraps=json.dumps) as mock_dumps:
+                for i in range(3):
+                    self.kvs.set(user_state_key('a_field'), i)
+                self.kvs.delete(user_state_key('a_field'))
+        self.assertEquals(0, mock_loads.call_count)
+        self.assertEquals(4, mock_dumps.call_count)
+        self.assertNotIn('a_field', json.loads(StudentModule.objects.all()[0].state))
+
+    def test_modified_values_not_saved(self):
+        "Test that modifying a value returned by get in place doesn't save it with other fields"
+        self.kvs.set(user_state_key('a_field'), {'nested': []})
+        self.kvs.get(user_state_key('a_field'))['nested'].append(1)
+        self.kvs.set(user_state_key('b_field'), 'b_value')
+        state = json.loads(StudentModule.objects.all()[0].state)
+        self.assertEquals({'nested': []}, state['a_field'])
+        self.assertEquals('b_value', state['b_field'])
+
     def construct_kv_dict(self):
         """Construct a kv_dict that can be passed to set_many"""
         key1 = user_state_key('field_a')
@@ -207,6 +260,36 @@ class TestMissingStudentModule(TestCase):
         self.assertEquals(location('usage_id').url(), student_module.module_state_key)
         self.assertEquals(course_id, student_module.course_id)
 
+    def test_batch_creates(self):
+        "Test that StudentModules created within batch_creates are inserted when the batch ends"
+        other_user_state_key = partial(DjangoKeyValueStore.Key, Scope.user_state, 1, location('other_usage_id'))
+        with self.field_data_cache.batch_creates():
+            self.kvs.set(user_state_key('a_field'), 'a_value')
+            self.kvs.set(other_user_state_key('a_field'), 'other_value')
+            self.assertEquals(0, StudentModule.objects.all().count())
+            self.assertEquals('other_value', self.kvs.get(other_user_state_key('a_field')))
+
+        self.assertEquals(2, StudentModule.objects.all().count())
+
+        # Later writes update the inserted rows
+        self.kvs.set(user_state_key('b_field'), 'b_value')
+        self.assertEquals(2, StudentModule.objects.all().count())
+        student_module = StudentModule.objects.get(module_state_key=location('usage_id').url())
+        self.assertEquals({'a_field': 'a_value', 'b_field': 'b_value'}, json.loads(student_module.state))
+        self.assertEquals(self.user, student_module.student)
+
+    def test_batch_creates_concurrent_insert(self):
+        "Test that a row inserted by another request during batch_creates is merged with the queued one"
+        with self.field_data_cache.batch_creates():
+            self.kvs.set(user_state_key('a_field'), 'a_value')
+            StudentModuleFactory(student=self.user, state=json.dumps({'b_field': 'b_value'}))
+
+        self.assertEquals(1, StudentModule.objects.all().count())
+        self.assertEquals(
+            {'a_field': 'a_value', 'b_field': 'b_value'},
+            json.loads(StudentModule.objects.all()[0].state)
+        )
+
     def test_delete_field_from_missing_student_module(self):
         "Test that deleting a field from a missing StudentModule raises a KeyError"
         self.assertRaises(KeyError, self.kvs.delete, user_state_key('a_field'))
@@ -515,6 +515,94 @@ class TestHtmlModifiers(ModuleStoreTestCase):
         )
 
 
+@override_settings(MODULESTORE=TEST_DATA_MIXED_MODULESTORE)
+@patch.dict('django.conf.settings.FEATURES', {'ENABLE_LAZY_SEQUENCE_TABS': True})
+class TestLazySequenceTabs(ModuleStoreTestCase):
+    """
+    Tests of rendering only the active tab of a sequence with the page
+    """
+    def setUp(self):
+        self.user = UserFactory.create()
+        self.request = RequestFactory().get('/')
+        self.request.user = self.user
+        self.request.session = {}
+        self.course = CourseFactory.create()
+        self.sequence = ItemFactory.create(parent_location=self.course.location, category='sequential')
+        self.verticals = []
+        for index in range(2):
+            vertical = ItemFactory.create(parent_location=self.sequence.location, category='vertical')
+            ItemFactory.create(parent_location=vertical.location, category='html', data='Tab content {}'.format(index))
+            self.verticals.append(vertical)
+        self.sequence = modulestore().get_instance(self.course.id, self.sequence.location, depth=None)
+
+    def get_sequence_module(self, field_data_cache):
+        """
+        Return the sequence's module for self.user
+        """
+        return render.get_module_for_descriptor(
+            self.user, self.request, self.sequence, field_data_cache, self.course.id
+        )
+
+    def test_only_active_tab_rendered(self):
+        field_data_cache = FieldDataCache.cache_for_descriptor_descendents(
+            self.course.id, self.user, self.sequence
+        )
+        content = self.get_sequence_module(field_data_cache).render('student_view').content
+        self.assertIn('Tab content 0', content)
+        self.assertNotIn('Tab content 1', content)
+        self.assertIn('data-lazy="true"', content)
+        self.assertIn('handler/render_child', content)
+
+    @patch.dict('django.conf.settings.FEATURES', {'ENABLE_LAZY_SEQUENCE_TABS': False})
+    def test_all_tabs_rendered(self):
+        field_data_cache = FieldDataCache.cache_for_descriptor_descendents(
+            self.course.id, self.user, self.sequence
+        )
+        content = self.get_sequence_module(field_data_cache).render('student_view').content
+        self.assertIn('Tab content 0', content)
+        self.assertIn('Tab content 1', content)
+        self.assertNotIn('data-lazy="true"', content)
+
+    def test_rendered_children_prefetched(self):
+        field_data_cache = FieldDataCache.cache_for_descriptor_descendents(
+            self.course.id, self.user, self.sequence, depth=1
+        )
+        module = self.get_sequence_module(field_data_cache)
+        for child in module.get_children_rendered_with_page():
+            field_data_cache.add_descriptor_descendents(getattr(child, 'descriptor', child))
+
+        cached = set(descriptor.location.url() for descriptor in field_data_cache.descriptors)
+        first_tab, second_tab = self.sequence.get_children()
+        self.assertIn(first_tab.location.url(), cached)
+        self.assertIn(first_tab.get_children()[0].location.url(), cached)
+        self.assertIn(second_tab.location.url(), cached)
+        self.assertNotIn(second_tab.get_children()[0].location.url(), cached)
+
+    def test_render_child(self):
+        request = RequestFactory().get('dummy_url', {'id': self.verticals[1].location.url()})
+        request.user = self.user
+        request.session = {}
+        response = render.handle_xblock_callback(
+            request,
+            self.course.id,
+            quote_slashes(str(self.sequence.location)),
+            'render_child',
+        )
+        self.assertIn('Tab content 1', json.loads(response.content)['html'])
+
+    def test_render_missing_child(self):
+        request = RequestFactory().get('dummy_url', {'id': 'i4x://no/such/vertical/tab'})
+        request.user = self.user
+        request.session = {}
+        with self.assertRaises(Http404):
+            render.handle_xblock_callback(
+                request,
+                self.course.id,
+                quote_slashes(str(self.sequence.location)),
+                'render_child',
+            )
+
+
 class ViewInStudioTest(ModuleStoreTestCase):
     """Tests for the 'View in Studio' link visiblity."""
 
@@ -13,11 +13,12 @@ from django.conf import settings
 from django.contrib.auth.models import User
 from django.test.client import RequestFactory
 from django.core.urlresolvers import reverse
+from django.db import connection
 from django.test.utils import override_settings
 
 # Need access to internal func to put users in the right group
 from courseware import grades
-from courseware.models import StudentModule
+from courseware.models import StudentModule, StudentSectionGrade
 
 from xmodule.modulestore.django import modulestore, editable_modulestore
 
@@ -478,6 +479,38 @@ class TestCourseGrader(TestSubmittingProblems):
         self.check_grade_percent(0.67)
         self.assertEqual(self.get_grade_summary()['grade'], 'B')
 
+    def count_grade_queries(self):
+        """
+        Return the number of SQL queries issued by grading the current user.
+        """
+        connection.use_debug_cursor = True
+        try:
+            num_queries = len(connection.queries)
+            self.get_grade_summary()
+            return len(connection.queries) - num_queries
+        finally:
+            connection.use_debug_cursor = False
+
+    @patch.dict('django.conf.settings.FEATURES', {'ENABLE_PERSISTENT_GRADES': False})
+    def test_grade_query_count_is_constant(self):
+        """
+        Grading takes the same number of queries however many problems have
+        been answered.
+        """
+        self.basic_setup()
+        for name in ['p1', 'p2', 'p3']:
+            self.submit_question_answer(name, {'2_1': 'Correct'})
+        small_course_queries = self.count_grade_queries()
+
+        homework2 = self.add_graded_section_to_course('homework2')
+        for name in ['p4', 'p5', 'p6']:
+            self.add_dropdown_to_section(homework2.location, name, 1)
+        for name in ['p4', 'p5', 'p6']:
+            self.submit_question_answer(name, {'2_1': 'Correct'})
+        self.check_grade_percent(1.0)
+
+        self.assertEqual(self.count_grade_queries(), small_course_queries)
+
     def test_submissions_api_overrides_scores(self):
         """
         Check that answering incorrectly is graded properly.
@@ -595,6 +628,79 @@ class TestCourseGrader(TestSubmittingProblems):
         self.assertEqual(self.score_for_hw('homework3'), [1.0, 1.0])
 
 
+@patch.dict('django.conf.settings.FEATURES', {'ENABLE_PERSISTENT_GRADES': True})
+class TestPersistentGrades(TestCourseGrader):
+    """
+    Runs the course grader suite with persisted section grades enabled, plus
+    checks that the persisted grades are reused and invalidated correctly.
+    """
+
+    def test_persisted_grades_are_reused(self):
+        self.basic_setup()
+        self.submit_question_answer('p1', {'2_1': 'Correct'})
+        self.check_grade_percent(0.33)
+        self.assertEqual(StudentSectionGrade.objects.filter(student=self.student_user).count(), 1)
+
+        # A second grade reads the persisted section instead of scoring problems
+        with patch('courseware.grades.get_score') as mock_get_score:
+            self.check_grade_percent(0.33)
+            self.assertEqual(self.score_for_hw('homework'), [1.0, 0.0, 0.0])
+            self.assertFalse(mock_get_score.called)
+
+    def test_grade_event_invalidates_section(self):
+        self.basic_setup()
+        self.submit_question_answer('p1', {'2_1': 'Correct'})
+        self.check_grade_percent(0.33)
+
+        self.submit_question_answer('p2', {'2_1': 'Correct'})
+        self.assertFalse(StudentSectionGrade.objects.filter(student=self.student_user).exists())
+        self.check_grade_percent(0.67)
+
+    def test_grade_event_while_grading_isnt_overwritten(self):
+        self.basic_setup()
+        self.submit_question_answer('p1', {'2_1': 'Incorrect'})
+        set_section_grade = grades.PersistedSectionGrades.set
+
+        def grade_event_then_set(persisted_grades, *args):
+            """A grade event lands after the scores were read, but before the section is persisted"""
+            StudentModule.objects.filter(
+                student=self.student_user, module_state_key=self.problem_location('p1')
+            ).update(grade=1)
+            StudentSectionGrade.invalidate(self.student_user.id, self.course.id, self.problem_location('p1'))
+            set_section_grade(persisted_grades, *args)
+
+        with patch('courseware.grades.PersistedSectionGrades.set', grade_event_then_set):
+            self.check_grade_percent(0)
+        self.check_grade_percent(0.33)
+
+    def test_reset_state_invalidates_section(self):
+        self.basic_setup()
+        self.submit_question_answer('p1', {'2_1': 'Correct'})
+        self.check_grade_percent(0.33)
+
+        StudentModule.objects.filter(student=self.student_user).delete()
+        self.assertFalse(StudentSectionGrade.objects.filter(student=self.student_user).exists())
+        self.check_grade_percent(0)
+
+    def test_batch_grading_isnt_persisted(self):
+        self.basic_setup()
+        self.submit_question_answer('p1', {'2_1': 'Correct'})
+
+        # The batch's scores may come from a lagging read replica
+        gradesets = list(grades.iterate_grades_for(self.course.id, [self.student_user]))
+        self.assertEqual(gradesets[0][1]['percent'], 0.33)
+        self.assertFalse(StudentSectionGrade.objects.filter(student=self.student_user).exists())
+
+    def test_structure_change_recomputes(self):
+        self.basic_setup()
+        self.submit_question_answer('p1', {'2_1': 'Correct'})
+        self.check_grade_percent(0.33)
+
+        self.add_dropdown_to_section(self.homework.location, 'p4', 1)
+        self.refresh_course()
+        self.check_grade_percent(0.25)
+
+
 class ProblemWithUploadedFilesTest(TestSubmittingProblems):
     """Tests of problems with uploaded files."""
 
@@ -322,27 +322,41 @@ def index(request, course_id, chapter=None, section=None,
             section_descriptor = modulestore().get_instance(course.id, section_descriptor.location, depth=None)
 
             # Load all descendants of the section, because we're going to display its
-            # html, which in general will need all of its children
+            # html, which in general will need all of its children.  When sequence
+            # tabs are rendered lazily, only the section and its children are loaded
+            # here, and the descendants of the tabs rendered with the page below
+            lazy_tabs = settings.FEATURES.get('ENABLE_LAZY_SEQUENCE_TABS', False)
             section_field_data_cache = FieldDataCache.cache_for_descriptor_descendents(
-                course_id, user, section_descriptor, depth=None)
-
-            section_module = get_module_for_descriptor(
-                request.user,
-                request,
-                section_descriptor,
-                section_field_data_cache,
-                course_id,
-                position
-            )
-
-            if section_module is None:
-                # User may be trying to be clever and access something
-                # they don't have access to.
-                raise Http404
-
-            # Save where we are in the chapter
-            save_child_position(chapter_module, section)
-            context['fragment'] = section_module.render('student_view')
+                course_id, user, section_descriptor, depth=1 if lazy_tabs else None)
+
+            # Rows for components the user hasn't visited before are inserted
+            # together once the section has been rendered
+            with section_field_data_cache.batch_creates():
+                section_module = get_module_for_descriptor(
+                    request.user,
+                    request,
+                    section_descriptor,
+                    section_field_data_cache,
+                    course_id,
+                    position
+                )
+
+                if section_module is None:
+                    # User may be trying to be clever and access something
+                    # they don't have access to.
+                    raise Http404
+
+                if lazy_tabs:
+                    rendered_children = getattr(section_module, 'get_children_rendered_with_page', None)
+                    if rendered_children is None:
+                        section_field_data_cache.add_descriptor_descendents(section_descriptor)
+                    else:
+                        for child in rendered_children():
+                            section_field_data_cache.add_descriptor_descendents(getattr(child, 'descriptor', child))
+
+                # Save where we are in the chapter
+                save_child_position(chapter_module, section)
+                context['fragment'] = section_module.render('student_view')
             context['section_title'] = section_descriptor.display_name_with_default
         else:
             # section is none, so display a message
@@ -1,5 +1,6 @@
 import json
 from django.http import Http404
+from django.test import TestCase
 from django.test.utils import override_settings
 from django.test.client import Client, RequestFactory
 from xmodule.modulestore.tests.factories import CourseFactory
@@ -9,6 +10,7 @@ from django.core.urlresolvers import reverse
 from util.testing import UrlResetMixin
 from django_comment_client.tests.unicode import UnicodeTestMixin
 from django_comment_client.forum import views
+import lms.lib.comment_client as cc
 
 from courseware.tests.modulestore_config import TEST_DATA_MIXED_MODULESTORE
 from nose.tools import assert_true  # pylint: disable=E0611
@@ -428,6 +430,108 @@ class CommentsServiceRequestHeadersTestCase(UrlResetMixin, ModuleStoreTestCase):
         self.assert_all_calls_have_header(mock_request, "X-Edx-Api-Key", "test_api_key")
 
 
+@override_settings(
+    MODULESTORE=TEST_DATA_MIXED_MODULESTORE,
+    COMMENTS_SERVICE_POOL={'size': 2, 'concurrency': 4}
+)
+@patch('lms.lib.comment_client.utils.requests.Session.request')
+class PooledRequestsTestCase(UrlResetMixin, ModuleStoreTestCase):
+    """
+    Forum views make their requests to the comments service over pooled
+    connections, several at once.
+    """
+    @patch.dict("django.conf.settings.FEATURES", {"ENABLE_DISCUSSION_SERVICE": True})
+    def setUp(self):
+        super(PooledRequestsTestCase, self).setUp()
+        self.course = CourseFactory.create()
+        self.student = UserFactory.create(username="foo", password="bar")
+        CourseEnrollmentFactory.create(user=self.student, course_id=self.course.id)
+        self.assertTrue(self.client.login(username="foo", password="bar"))
+
+    def get_single_thread(self, **headers):
+        return self.client.get(
+            reverse(
+                "django_comment_client.forum.views.single_thread",
+                kwargs={
+                    "course_id": self.course.id,
+                    "discussion_id": "dummy",
+                    "thread_id": "test_thread_id",
+                }
+            ),
+            **headers
+        )
+
+    def test_single_thread(self, mock_request):
+        mock_request.side_effect = make_mock_request_impl("dummy content", "test_thread_id")
+        response = self.get_single_thread(HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            json.loads(response.content)["content"],
+            make_mock_thread_data("dummy content", "test_thread_id", True)
+        )
+        mock_request.assert_any_call(
+            "get",
+            StringEndsWithMatcher("test_thread_id"),
+            data=None,
+            params=PartialDictMatcher({"user_id": self.student.id, "recursive": True}),
+            headers=ANY,
+            timeout=ANY
+        )
+
+    def test_single_thread_not_found(self, mock_request):
+        mock_request.side_effect = make_mock_request_impl("dummy content", thread_id=None)
+        response = self.get_single_thread()
+        self.assertEqual(response.status_code, 404)
+        # the other threads aren't listed for a page that isn't found
+        for actual in mock_request.call_args_list:
+            self.assertFalse(actual[0][1].endswith("/threads"))
+
+    def test_forum_form_discussion(self, mock_request):
+        mock_request.side_effect = make_mock_request_impl("dummy content", "test_thread_id")
+        response = self.client.get(
+            reverse(
+                "django_comment_client.forum.views.forum_form_discussion",
+                kwargs={"course_id": self.course.id}
+            ),
+            HTTP_X_REQUESTED_WITH="XMLHttpRequest"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        response_data = json.loads(response.content)
+        self.assertEqual(len(response_data["discussion_data"]), 1)
+        self.assertEqual(response_data["discussion_data"][0]["id"], "test_thread_id")
+
+    def test_accept_language(self, mock_request):
+        # Requests made from worker threads are still in the page's language
+        mock_request.side_effect = make_mock_request_impl("dummy content", "test_thread_id")
+        self.get_single_thread(HTTP_ACCEPT_LANGUAGE="eo")
+
+        self.assertTrue(mock_request.call_args_list)
+        for actual in mock_request.call_args_list:
+            self.assertEqual(actual[1]["headers"]["Accept-Language"], "eo")
+
+
+@override_settings(COMMENTS_SERVICE_POOL={'size': 2, 'concurrency': 4})
+class StartRequestTestCase(TestCase):
+    def test_results(self):
+        pending = [cc.utils.start_request(lambda i=i: i * 2) for i in range(10)]
+        self.assertEqual([request.get() for request in pending], [i * 2 for i in range(10)])
+
+    def test_error_raised(self):
+        def fail(message):
+            raise cc.utils.CommentClientRequestError(message, 404)
+
+        request = cc.utils.start_request(fail, "not found")
+        with self.assertRaisesRegexp(cc.utils.CommentClientRequestError, "not found"):
+            request.get()
+
+    @override_settings(COMMENTS_SERVICE_POOL={'size': 0})
+    def test_without_pool(self):
+        self.assertIsNone(cc.utils.get_session())
+        self.assertEqual(cc.utils.start_request(lambda: 1).get(), 1)
+
+
 @override_settings(MODULESTORE=TEST_DATA_MIXED_MODULESTORE)
 class InlineDiscussionUnicodeTestCase(ModuleStoreTestCase, UnicodeTestMixin):
     def setUp(self):
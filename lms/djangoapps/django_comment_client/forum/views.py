@@ -172,6 +172,10 @@ def forum_form_discussion(request, course_id):
     with newrelic.agent.FunctionTrace(nr_transaction, "get_discussion_category_map"):
         category_map = utils.get_discussion_category_map(course)
 
+    # Fetch the user's info from the comments service while the threads are found
+    user = cc.User.from_django_user(request.user)
+    user_request = cc.utils.start_request(user.to_dict)
+
     try:
         unsafethreads, query_params = get_threads(request, course_id)   # This might process a search query
         threads = [utils.safe_content(thread) for thread in unsafethreads]
@@ -179,8 +183,7 @@ def forum_form_discussion(request, course_id):
         log.warning("Forum is in maintenance mode")
         return render_to_response('discussion/maintenance.html', {})
 
-    user = cc.User.from_django_user(request.user)
-    user_info = user.to_dict()
+    user_info = user_request.get()
 
     with newrelic.agent.FunctionTrace(nr_transaction, "get_metadata_for_threads"):
         annotated_content_info = utils.get_metadata_for_threads(course_id, threads, request.user, user_info)
@@ -232,22 +235,28 @@ def single_thread(request, course_id, discussion_id, thread_id):
 
     course = get_course_with_access(request.user, course_id, 'load_forum')
     cc_user = cc.User.from_django_user(request.user)
-    user_info = cc_user.to_dict()
+
+    # Fetch the user's info and the thread from the comments service at once
+    user_request = cc.utils.start_request(cc_user.to_dict)
 
     # Currently, the front end always loads responses via AJAX, even for this
     # page; it would be a nice optimization to avoid that extra round trip to
     # the comments service.
+    thread_request = cc.utils.start_request(
+        cc.Thread.find(thread_id).retrieve,
+        recursive=request.is_ajax(),
+        user_id=request.user.id,
+        response_skip=request.GET.get("resp_skip"),
+        response_limit=request.GET.get("resp_limit")
+    )
+
     try:
-        thread = cc.Thread.find(thread_id).retrieve(
-            recursive=request.is_ajax(),
-            user_id=request.user.id,
-            response_skip=request.GET.get("resp_skip"),
-            response_limit=request.GET.get("resp_limit")
-        )
+        thread = thread_request.get()
     except cc.utils.CommentClientRequestError as e:
         if e.status_code == 404:
             raise Http404
         raise
+    user_info = user_request.get()
 
     if request.is_ajax():
         with newrelic.agent.FunctionTrace(nr_transaction, "get_annotated_content_infos"):
@@ -0,0 +1,142 @@
+"""
+Tests for the caching of models retrieved from the comments service.
+"""
+import json
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
+from mock import patch, Mock
+
+import lms.lib.comment_client as cc
+from request_cache.middleware import RequestCache
+
+
+def make_response(data):
+    return Mock(status_code=200, text=json.dumps(data), json=Mock(return_value=data))
+
+
+def mock_request_impl(method, url, **kwargs):
+    if method == "get" and url.endswith("/users/1"):
+        return make_response({"id": "1", "username": "test", "upvoted_ids": []})
+    if method == "get" and url.endswith("/threads/thread-1"):
+        return make_response({"id": "thread-1", "title": "title", "user_id": "1"})
+    if method == "post" and url.endswith("/threads/thread-1/comments"):
+        return make_response({"id": "comment-1", "thread_id": "thread-1", "user_id": "1"})
+    return make_response({})
+
+
+def get_calls(mock_request, suffix):
+    return [call for call in mock_request.call_args_list if call[0][0] == "get" and call[0][1].endswith(suffix)]
+
+
+@patch('lms.lib.comment_client.utils.requests.request')
+class ModelCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.middleware = RequestCache()
+        self.start_request()
+        self.addCleanup(self.end_request)
+
+    def start_request(self):
+        self.middleware.process_request(RequestFactory().get("dummy_url"))
+
+    def end_request(self):
+        self.middleware.process_response(None, None)
+
+    def retrieve_user(self):
+        return cc.User(id="1").retrieve()
+
+    def test_cached_within_request(self, mock_request):
+        mock_request.side_effect = mock_request_impl
+        self.retrieve_user()
+        user = self.retrieve_user()
+
+        self.assertEqual(user.username, "test")
+        self.assertEqual(len(get_calls(mock_request, "/users/1")), 1)
+
+    def test_copies(self, mock_request):
+        mock_request.side_effect = mock_request_impl
+        self.retrieve_user().upvoted_ids.append("thread-1")
+        self.assertEqual(self.retrieve_user().upvoted_ids, [])
+
+    def test_not_cached_across_requests(self, mock_request):
+        mock_request.side_effect = mock_request_impl
+        self.retrieve_user()
+        self.end_request()
+        self.start_request()
+        self.retrieve_user()
+
+        self.assertEqual(len(get_calls(mock_request, "/users/1")), 2)
+
+    def test_not_cached_outside_request(self, mock_request):
+        mock_request.side_effect = mock_request_impl
+        self.end_request()
+        self.retrieve_user()
+        self.retrieve_user()
+
+        self.assertEqual(len(get_calls(mock_request, "/users/1")), 2)
+
+    @override_settings(COMMENTS_SERVICE_CACHE_TTL=60)
+    def test_cached_across_requests(self, mock_request):
+        mock_request.side_effect = mock_request_impl
+        self.retrieve_user()
+        self.end_request()
+        self.start_request()
+        user = self.retrieve_user()
+
+        self.assertEqual(user.username, "test")
+        self.assertEqual(len(get_calls(mock_request, "/users/1")), 1)
+
+    @override_settings(COMMENTS_SERVICE_CACHE_TTL=60)
+    def test_thread_not_cached_across_requests(self, mock_request):
+        # Retrieving a thread marks it as read
+        mock_request.side_effect = mock_request_impl
+        cc.Thread(id="thread-1").retrieve()
+        cc.Thread(id="thread-1").retrieve()
+        self.end_request()
+        self.start_request()
+        cc.Thread(id="thread-1").retrieve()
+
+        self.assertEqual(len(get_calls(mock_request, "/threads/thread-1")), 2)
+
+    @override_settings(COMMENTS_SERVICE_CACHE_TTL=60)
+    def test_invalidated_by_vote(self, mock_request):
+        mock_request.side_effect = mock_request_impl
+        user = self.retrieve_user()
+        thread = cc.Thread(id="thread-1").retrieve()
+        user.vote(thread, "up")
+
+        self.retrieve_user()
+        cc.Thread(id="thread-1").retrieve()
+        self.assertEqual(len(get_calls(mock_request, "/users/1")), 2)
+        self.assertEqual(len(get_calls(mock_request, "/threads/thread-1")), 2)
+
+        # Also in other requests
+        self.end_request()
+        self.start_request()
+        self.retrieve_user()
+        self.assertEqual(len(get_calls(mock_request, "/users/1")), 2)
+
+    @override_settings(COMMENTS_SERVICE_CACHE_TTL=60)
+    def test_invalidated_by_save(self, mock_request):
+        mock_request.side_effect = mock_request_impl
+        user = self.retrieve_user()
+        user.default_sort_key = "activity"
+        user.save()
+        self.retrieve_user()
+
+        self.assertEqual(len(get_calls(mock_request, "/users/1")), 2)
+
+    def test_invalidated_by_new_comment(self, mock_request):
+        mock_request.side_effect = mock_request_impl
+        cc.Thread(id="thread-1").retrieve()
+        self.retrieve_user()
+        comment = cc.Comment(body="body", thread_id="thread-1", user_id="1", course_id="course")
+        comment.save()
+        cc.Thread(id="thread-1").retrieve()
+        self.retrieve_user()
+
+        self.assertEqual(len(get_calls(mock_request, "/threads/thread-1")), 2)
+        self.assertEqual(len(get_calls(mock_request, "/users/1")), 2)
@@ -504,6 +504,24 @@ class CategoryMapTestCase(ModuleStoreTestCase):
         )
 
 
+    def test_cached(self):
+        self.create_discussion("Chapter", "Discussion")
+        expected = utils.get_discussion_category_map(self.course)
+
+        # Neither map scans the course again until it's edited
+        with mock.patch('django_comment_client.utils._get_discussion_modules') as mock_modules:
+            self.assertCategoryMapEquals(expected)
+            utils.add_courseware_context([{"commentable_id": "discussion1"}], self.course)
+        self.assertFalse(mock_modules.called)
+
+    def test_invalidated_by_edit(self):
+        self.create_discussion("Chapter 1", "Discussion")
+        self.assertEqual(utils.get_discussion_category_map(self.course)["children"], ["Chapter 1"])
+
+        self.create_discussion("Chapter 2", "Discussion")
+        self.assertEqual(utils.get_discussion_category_map(self.course)["children"], ["Chapter 1", "Chapter 2"])
+
+
 class JsonResponseTestCase(TestCase, UnicodeTestMixin):
     def _test_unicode_data(self, text):
         response = utils.JsonResponse(text)
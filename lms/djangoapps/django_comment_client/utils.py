@@ -4,11 +4,12 @@ import logging
 from datetime import datetime
 
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.db import connection
 from django.http import HttpResponse
 from django.utils import simplejson
-from django_comment_common.models import Role, FORUM_ROLE_STUDENT
+from django_comment_common.models import Role, FORUM_ROLE_STUDENT, get_discussion_maps_version
 from django_comment_client.permissions import check_permissions_by_view
 
 from edxmako import lookup_template
@@ -20,6 +21,8 @@ from django.utils.timezone import UTC
 
 log = logging.getLogger(__name__)
 
+DISCUSSION_MAPS_KEY = u'discussion_maps.{0}.{1}'
+
 
 def extract(dic, keys):
     return {k: dic.get(k) for k in keys}
@@ -70,14 +73,35 @@ def _get_discussion_modules(course):
     return filter(has_required_keys, all_modules)
 
 
-def _get_discussion_id_map(course):
+def _get_discussion_maps(course):
+    """
+    Return the course's (category map, discussion id map).
+
+    Finding the discussion modules means scanning the whole course, so the
+    maps are only computed once per version of the course and cached.  The
+    category map is sorted, but not yet filtered by start date.
+    """
+    key = DISCUSSION_MAPS_KEY.format(course.id, get_discussion_maps_version(course.location))
+    maps = cache.get(key)
+    if maps is None:
+        modules = _get_discussion_modules(course)
+        maps = (_build_discussion_category_map(course, modules), _build_discussion_id_map(modules))
+        cache.set(key, maps)
+    return maps
+
+
+def _build_discussion_id_map(modules):
     def get_entry(module):
         discussion_id = module.discussion_id
         title = module.discussion_target
         last_category = module.discussion_category.split("/")[-1].strip()
         return (discussion_id, {"location": module.location, "title": last_category + " / " + title})
 
-    return dict(map(get_entry, _get_discussion_modules(course)))
+    return dict(map(get_entry, modules))
+
+
+def _get_discussion_id_map(course):
+    return _get_discussion_maps(course)[1]
 
 
 def _filter_unstarted_categories(category_map):
@@ -131,11 +155,11 @@ def _sort_map_entries(category_map, sort_alpha):
 
 
 def get_discussion_category_map(course):
-    course_id = course.id
+    return _filter_unstarted_categories(_get_discussion_maps(course)[0])
 
-    unexpanded_category_map = defaultdict(list)
 
-    modules = _get_discussion_modules(course)
+def _build_discussion_category_map(course, modules):
+    unexpanded_category_map = defaultdict(list)
 
     for module in modules:
         id = module.discussion_id
@@ -193,7 +217,7 @@ def get_discussion_category_map(course):
 
     _sort_map_entries(category_map, course.discussion_sort_alpha)
 
-    return _filter_unstarted_categories(category_map)
+    return category_map
 
 
 class JsonResponse(HttpResponse):
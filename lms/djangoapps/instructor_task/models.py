@@ -14,6 +14,7 @@ ASSUMPTIONS: modules have unique IDs, even across different module_types
 """
 from cStringIO import StringIO
 from gzip import GzipFile
+from tempfile import TemporaryFile
 from uuid import uuid4
 import csv
 import json
@@ -192,9 +193,9 @@ class InstructorTask(models.Model):
 class ReportStore(object):
     """
     Simple abstraction layer that can fetch and store CSV files for reports
-    download. Should probably refactor later to create a ReportFile object that
-    can simply be appended to for the sake of memory efficiency, rather than
-    passing in the whole dataset. Doing that for now just because it's simpler.
+    download. `store_rows` accepts any iterable of rows, including generators,
+    and spools the encoded file to a temporary file rather than holding the
+    whole dataset in memory.
     """
     @classmethod
     def from_config(cls):
@@ -275,40 +276,48 @@ class S3ReportStore(ReportStore):
         transparent via the browser). Filenames should end in whatever
         suffix makes sense for the original file, so `.txt` instead of `.gz`
         """
+        data = buff.getvalue()
+        self._store_file(course_id, filename, StringIO(data), len(data))
+
+    def _store_file(self, course_id, filename, gzip_file, size):
+        """
+        Upload the `size` bytes of gzip-encoded data in the file object
+        `gzip_file` (read from the beginning) to the key for `filename`.
+        """
         key = self.key_for(course_id, filename)
 
-        data = buff.getvalue()
-        key.size = len(data)
+        key.size = size
         key.content_encoding = "gzip"
         key.content_type = "text/csv"
 
         # Just setting the content encoding and type above should work
         # according to the docs, but when experimenting, this was necessary for
         # it to actually take.
-        key.set_contents_from_string(
-            data,
+        key.set_contents_from_file(
+            gzip_file,
             headers={
                 "Content-Encoding": "gzip",
-                "Content-Length": len(data),
+                "Content-Length": size,
                 "Content-Type": "text/csv",
-            }
+            },
+            rewind=True,
         )
 
     def store_rows(self, course_id, filename, rows):
         """
-        Given a `course_id`, `filename`, and `rows` (each row is an iterable of
-        strings), create a buffer that is a gzip'd csv file, and then `store()`
-        that buffer.
+        Given a `course_id`, `filename`, and `rows` (an iterable of rows, each
+        of which is an iterable of strings), write a gzip'd csv file to a
+        temporary file as the rows are produced, and then upload it.
 
         Even though we store it in gzip format, browsers will transparently
         download and decompress it. Filenames should end in `.csv`, not `.gz`.
         """
-        output_buffer = StringIO()
-        gzip_file = GzipFile(fileobj=output_buffer, mode="wb")
-        csv.writer(gzip_file).writerows(rows)
-        gzip_file.close()
+        with TemporaryFile() as temp_file:
+            gzip_file = GzipFile(fileobj=temp_file, mode="wb")
+            csv.writer(gzip_file).writerows(rows)
+            gzip_file.close()
 
-        self.store(course_id, filename, output_buffer)
+            self._store_file(course_id, filename, temp_file, temp_file.tell())
 
     def links_for(self, course_id):
         """
@@ -379,12 +388,20 @@ class LocalFSReportStore(ReportStore):
 
     def store_rows(self, course_id, filename, rows):
         """
-        Given a course_id, filename, and rows (each row is an iterable of strings),
-        write this data out.
+        Given a course_id, filename, and rows (an iterable of rows, each of
+        which is an iterable of strings), write this data out. Rows are
+        written to a temporary file as they are produced, which is then moved
+        into place so that only complete files are ever visible.
         """
-        output_buffer = StringIO()
-        csv.writer(output_buffer).writerows(rows)
-        self.store(course_id, filename, output_buffer)
+        full_path = self.path_to(course_id, filename)
+        directory = os.path.dirname(full_path)
+        if not os.path.exists(directory):
+            os.mkdir(directory)
+
+        temp_path = full_path + ".tmp"
+        with open(temp_path, "wb") as f:
+            csv.writer(f).writerows(rows)
+        os.rename(temp_path, full_path)
 
     def links_for(self, course_id):
         """
@@ -401,6 +418,7 @@ class LocalFSReportStore(ReportStore):
             [
                 (filename, ("file://" + urllib.quote(os.path.join(course_dir, filename))))
                 for filename in os.listdir(course_dir)
+                if not filename.endswith(".tmp")
             ],
             reverse=True
         )
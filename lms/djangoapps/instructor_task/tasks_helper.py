@@ -479,90 +479,96 @@ def push_grades_to_s3(_xmodule_instance_args, _entry_id, course_id, _task_input,
     buffered, so we'll never write part of a CSV file to S3 -- i.e. any files
     that are visible in ReportStore will be complete ones.
 
-    As we start to add more CSV downloads, it will probably be worthwhile to
-    make a more general CSVDoc class instead of building out the rows like we
-    do here.
+    Rows are generated while students are being graded and streamed straight
+    into the `ReportStore`, so the grade report is never held in memory.
     """
     start_time = datetime.now(UTC)
     status_interval = 100
 
     enrolled_students = CourseEnrollment.users_enrolled_in(course_id)
-    num_total = enrolled_students.count()
-    num_attempted = 0
-    num_succeeded = 0
-    num_failed = 0
-    curr_step = "Calculating Grades"
+    # The counters are kept in a dict so that the row generator below can
+    # update them.
+    task_progress = {
+        'total': enrolled_students.count(),
+        'attempted': 0,
+        'succeeded': 0,
+        'failed': 0,
+        'step': "Calculating Grades",
+    }
 
     def update_task_progress():
         """Return a dict containing info about current task"""
         current_time = datetime.now(UTC)
         progress = {
             'action_name': action_name,
-            'attempted': num_attempted,
-            'succeeded': num_succeeded,
-            'failed': num_failed,
-            'total': num_total,
+            'attempted': task_progress['attempted'],
+            'succeeded': task_progress['succeeded'],
+            'failed': task_progress['failed'],
+            'total': task_progress['total'],
             'duration_ms': int((current_time - start_time).total_seconds() * 1000),
-            'step': curr_step,
+            'step': task_progress['step'],
         }
         _get_current_task().update_state(state=PROGRESS, meta=progress)
 
         return progress
 
-    # Loop over all our students and build our CSV lists in memory
-    header = None
-    rows = []
     err_rows = [["id", "username", "error_msg"]]
-    for student, gradeset, err_msg in iterate_grades_for(course_id, enrolled_students):
-        # Periodically update task status (this is a cache write)
-        if num_attempted % status_interval == 0:
-            update_task_progress()
-        num_attempted += 1
-
-        if gradeset:
-            # We were able to successfully grade this student for this course.
-            num_succeeded += 1
-            if not header:
-                # Encode the header row in utf-8 encoding in case there are unicode characters
-                header = [section['label'].encode('utf-8') for section in gradeset[u'section_breakdown']]
-                rows.append(["id", "email", "username", "grade"] + header)
-
-            percents = {
-                section['label']: section.get('percent', 0.0)
-                for section in gradeset[u'section_breakdown']
-                if 'label' in section
-            }
-
-            # Not everybody has the same gradable items. If the item is not
-            # found in the user's gradeset, just assume it's a 0. The aggregated
-            # grades for their sections and overall course will be calculated
-            # without regard for the item they didn't have access to, so it's
-            # possible for a student to have a 0.0 show up in their row but
-            # still have 100% for the course.
-            row_percents = [percents.get(label, 0.0) for label in header]
-            rows.append([student.id, student.email, student.username, gradeset['percent']] + row_percents)
-        else:
-            # An empty gradeset means we failed to grade a student.
-            num_failed += 1
-            err_rows.append([student.id, student.username, err_msg])
 
-    # By this point, we've got the rows we're going to stuff into our CSV files.
-    curr_step = "Uploading CSVs"
-    update_task_progress()
+    def grade_rows():
+        """
+        Grade every enrolled student, yielding the CSV header followed by one
+        row per successfully graded student. Students that could not be graded
+        are collected in `err_rows`.
+        """
+        header = None
+        for student, gradeset, err_msg in iterate_grades_for(course_id, enrolled_students.iterator()):
+            # Periodically update task status (this is a cache write)
+            if task_progress['attempted'] % status_interval == 0:
+                update_task_progress()
+            task_progress['attempted'] += 1
+
+            if gradeset:
+                # We were able to successfully grade this student for this course.
+                task_progress['succeeded'] += 1
+                if not header:
+                    # Encode the header row in utf-8 encoding in case there are unicode characters
+                    header = [section['label'].encode('utf-8') for section in gradeset[u'section_breakdown']]
+                    yield ["id", "email", "username", "grade"] + header
+
+                percents = {
+                    section['label']: section.get('percent', 0.0)
+                    for section in gradeset[u'section_breakdown']
+                    if 'label' in section
+                }
+
+                # Not everybody has the same gradable items. If the item is not
+                # found in the user's gradeset, just assume it's a 0. The aggregated
+                # grades for their sections and overall course will be calculated
+                # without regard for the item they didn't have access to, so it's
+                # possible for a student to have a 0.0 show up in their row but
+                # still have 100% for the course.
+                row_percents = [percents.get(label, 0.0) for label in header]
+                yield [student.id, student.email, student.username, gradeset['percent']] + row_percents
+            else:
+                # An empty gradeset means we failed to grade a student.
+                task_progress['failed'] += 1
+                err_rows.append([student.id, student.username, err_msg])
 
     # Generate parts of the file name
     timestamp_str = start_time.strftime("%Y-%m-%d-%H%M")
     course_id_prefix = urllib.quote(course_id.replace("/", "_"))
 
-    # Perform the actual upload
+    # Grade the students while writing their rows to the report
     report_store = ReportStore.from_config()
     report_store.store_rows(
         course_id,
         u"{}_grade_report_{}.csv".format(course_id_prefix, timestamp_str),
-        rows
+        grade_rows()
     )
 
     # If there are any error rows (don't count the header), write them out as well
+    task_progress['step'] = "Uploading CSVs"
+    update_task_progress()
     if len(err_rows) > 1:
         report_store.store_rows(
             course_id,
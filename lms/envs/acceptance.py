@@ -43,6 +43,7 @@ modulestore_options = {
     'default_class': 'xmodule.hidden_module.HiddenDescriptor',
     'fs_root': TEST_ROOT / "data",
     'render_template': 'edxmako.shortcuts.render_to_string',
+    'structure_cache_size': MODULESTORE_STRUCTURE_CACHE_SIZE,
 }
 
 MODULESTORE = {
@@ -26,6 +26,7 @@ modulestore_options = {
     'default_class': 'xmodule.hidden_module.HiddenDescriptor',
     'fs_root': DATA_DIR,
     'render_template': 'edxmako.shortcuts.render_to_string',
+    'structure_cache_size': MODULESTORE_STRUCTURE_CACHE_SIZE,
 }
 
 MODULESTORE = {
@@ -47,6 +47,20 @@ DISCUSSION_SETTINGS = {
     'MAX_COMMENT_DEPTH': 2,
 }
 
+# Connections to the comments service.  A size of 0 opens a new connection
+# for every request, and a page makes its requests one at a time.
+COMMENTS_SERVICE_POOL = {
+    # How many keep-alive connections to keep open in each LMS process?
+    'size': 0,
+    # How many requests can one page make to the comments service at once?
+    'concurrency': 4,
+}
+
+# How many seconds to cache users and other models retrieved from the
+# comments service for, across requests.  0 only caches them for the rest of
+# the request retrieving them.
+COMMENTS_SERVICE_CACHE_TTL = 0
+
 
 # Features
 FEATURES = {
@@ -88,6 +102,10 @@ FEATURES = {
 
     'ENABLE_PSYCHOMETRICS': False,  # real-time psychometrics (eg item response theory analysis in instructor dashboard)
 
+    # Only render the active tab of a sequence with the courseware page, and
+    # fetch the others when they're first shown
+    'ENABLE_LAZY_SEQUENCE_TABS': False,
+
     'ENABLE_DJANGO_ADMIN_SITE': True,  # set true to enable django's admin site, even on prod (e.g. for course ops)
     'ENABLE_SQL_TRACKING_LOGS': False,
     'ENABLE_LMS_MIGRATION': False,
@@ -208,6 +226,10 @@ FEATURES = {
     # grades CSV files to S3 and give links for downloads.
     'ENABLE_S3_GRADE_DOWNLOADS': False,
 
+    # Persist each student's graded section scores (StudentSectionGrade) so
+    # that grading only recomputes sections touched since the last grade.
+    'ENABLE_PERSISTENT_GRADES': False,
+
     # whether to use password policy enforcement or not
     'ENFORCE_PASSWORD_POLICY': False,
 
@@ -458,6 +480,11 @@ MODULESTORE = {
         'OPTIONS': {
             'data_dir': DATA_DIR,
             'default_class': 'xmodule.hidden_module.HiddenDescriptor',
+            # A directory to snapshot loaded courses in, so that unchanged courses
+            # are restored rather than parsed at startup, and how many processes to
+            # parse courses whose snapshots are stale in.  Both off by default.
+            'snapshot_dir': None,
+            'load_workers': 0,
         }
     }
 }
@@ -467,6 +494,11 @@ DOC_STORE_CONFIG = {
     'db': 'xmodule',
     'collection': 'modulestore',
 }
+# How many course structures each process keeps for the Mongo modulestores (their
+# structure_cache_size option), so that a course loaded with all of its descendants
+# isn't read from Mongo again until it is edited.  0 disables the cache.  Deployments
+# whose MODULESTORE comes from auth.json set the option there.
+MODULESTORE_STRUCTURE_CACHE_SIZE = 32
 
 ############# XBlock Configuration ##########
 
@@ -495,6 +527,13 @@ CODE_JAIL = {
         # How many CPU seconds can jailed code use?
         'CPU': 1,
     },
+
+    # Run jailed code in a pool of warm sandboxed Pythons which have already
+    # imported numpy, scipy, etc.  0 starts a new sandbox for every execution.
+    'pool': {
+        # How many sandbox workers can run at once in each LMS process?
+        'size': 0,
+    },
 }
 
 # Some courses are allowed to run unsafe code. This is a list of regexes, one
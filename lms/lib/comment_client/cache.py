@@ -0,0 +1,104 @@
+"""
+Read-through caching of the models retrieved from the comments service.
+
+A forum page often retrieves the same user or thread several times, and
+consecutive pages retrieve them again.  Responses are cached for the rest
+of the request, keyed by URL and parameters, and when
+COMMENTS_SERVICE_CACHE_TTL is set, in the django cache for that many
+seconds too.  Outside of a request (e.g. in a management command), only
+the django cache is used.
+
+Writes through the client invalidate the URLs of the models they change.
+In the django cache, each URL has a version which is part of its responses'
+keys, so invalidating a URL just starts a new version: other processes
+sharing the cache stop seeing the old responses straight away.
+"""
+
+import copy
+import hashlib
+import json
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache as django_cache
+
+from request_cache.middleware import RequestCache
+
+
+VERSION_KEY = u'comment_client.version.{0}'
+RESPONSE_KEY = u'comment_client.response.{0}'
+
+
+def _ttl():
+    return getattr(settings, 'COMMENTS_SERVICE_CACHE_TTL', 0)
+
+
+def _request_responses():
+    """
+    The responses cached for the current request, keyed by (url, params).
+    Outside of a request, responses are cached in a throwaway dict.
+    """
+    if RequestCache.get_current_request() is None:
+        return {}
+    return RequestCache.get_request_cache().data.setdefault('comment_client.responses', {})
+
+
+def _hash(value):
+    return hashlib.md5(value.encode('utf-8')).hexdigest()
+
+
+def _version_key(url):
+    return VERSION_KEY.format(_hash(url))
+
+
+def _response_key(url, params):
+    """
+    The django cache key for the response to `url` with `params`, or None if
+    caching across requests is off.
+    """
+    version = django_cache.get(_version_key(url))
+    if version is None:
+        # Never written, or evicted: whatever was cached may be stale
+        version = uuid4().hex
+        django_cache.set(_version_key(url), version)
+    return RESPONSE_KEY.format(_hash(u'{0}|{1}|{2}'.format(url, params, version)))
+
+
+def retrieve(url, params, fetch, across_requests=True):
+    """
+    Return the response to a GET of `url` with `params`, calling `fetch()` to
+    make the request if it isn't cached.
+
+    Each call returns its own copy of the response, which the caller is
+    free to change.  If `across_requests` is False, the response is only
+    cached for the current request.
+    """
+    params_key = json.dumps(params, sort_keys=True)
+    responses = _request_responses()
+    response = responses.get((url, params_key))
+
+    if response is None:
+        ttl = _ttl() if across_requests else 0
+        key = _response_key(url, params_key) if ttl else None
+        if key is not None:
+            response = django_cache.get(key)
+        if response is None:
+            response = fetch()
+            if key is not None:
+                django_cache.set(key, response, ttl)
+        responses[(url, params_key)] = response
+
+    return copy.deepcopy(response)
+
+
+def invalidate(*urls):
+    """
+    Forget the cached responses for each of `urls`, whatever their parameters.
+    """
+    responses = _request_responses()
+    for key in [key for key in responses if key[0] in urls]:
+        del responses[key]
+
+    # Even if this process doesn't cache across requests, others may
+    for url in urls:
+        django_cache.set(_version_key(url), uuid4().hex)
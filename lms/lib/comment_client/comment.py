@@ -1,6 +1,7 @@
 from .utils import CommentClientRequestError, perform_request
 
 from .thread import Thread, _url_for_flag_abuse_thread, _url_for_unflag_abuse_thread
+from .user import User
 import models
 import settings
 
@@ -30,6 +31,16 @@ class Comment(models.Model):
     def thread(self):
         return Thread(id=self.thread_id, type='thread')
 
+    def changed_by_write(self):
+        changed = [self]
+        if self.attributes.get('thread_id'):
+            changed.append(Thread(id=self.thread_id))
+        if self.attributes.get('parent_id'):
+            changed.append(Comment(id=self.parent_id))
+        if self.attributes.get('user_id'):
+            changed.append(User(id=self.user_id))
+        return changed
+
     @classmethod
     def url_for_comments(cls, params={}):
         if params.get('thread_id'):
@@ -60,6 +71,7 @@ class Comment(models.Model):
             metric_action='comment.abuse.flagged'
         )
         voteable.update_attributes(request)
+        models.invalidate_cached(voteable)
 
     def unFlagAbuse(self, user, voteable, removeAll):
         if voteable.type == 'thread':
@@ -81,6 +93,7 @@ class Comment(models.Model):
             metric_action='comment.abuse.unflagged'
         )
         voteable.update_attributes(request)
+        models.invalidate_cached(voteable)
 
 
 def _url_for_thread_comments(thread_id):
@@ -1,4 +1,15 @@
 from .utils import extract, perform_request, CommentClientRequestError
+import cache
+
+
+def invalidate_cached(*models):
+    """
+    Forget the cached retrieves of each of `models`, after they've been
+    changed through the comments service.
+    """
+    urls = [model.url(action='get', params=model.attributes) for model in models if model.id]
+    if urls:
+        cache.invalidate(*urls)
 
 
 class Model(object):
@@ -9,6 +20,8 @@ class Model(object):
     base_url = None
     default_retrieve_params = {}
     metric_tag_fields = []
+    # Whether retrieves may be cached across requests, not just within one
+    cache_across_requests = True
 
     DEFAULT_ACTIONS_WITH_ID = ['get', 'put', 'delete']
     DEFAULT_ACTIONS_WITHOUT_ID = ['get_all', 'post']
@@ -63,15 +76,27 @@ class Model(object):
 
     def _retrieve(self, *args, **kwargs):
         url = self.url(action='get', params=self.attributes)
-        response = perform_request(
-            'get',
+        response = cache.retrieve(
             url,
             self.default_retrieve_params,
-            metric_tags=self._metric_tags,
-            metric_action='model.retrieve'
+            lambda: perform_request(
+                'get',
+                url,
+                self.default_retrieve_params,
+                metric_tags=self._metric_tags,
+                metric_action='model.retrieve'
+            ),
+            across_requests=self.cache_across_requests
         )
         self.update_attributes(**response)
 
+    def changed_by_write(self):
+        """
+        Returns the models whose retrieved fields a write to this one changes,
+        so that their cached retrieves can be invalidated.
+        """
+        return [self]
+
     @property
     def _metric_tags(self):
         """
@@ -136,6 +161,7 @@ class Model(object):
             )
         self.retrieved = True
         self.update_attributes(**response)
+        invalidate_cached(*self.changed_by_write())
         self.after_save(self)
 
     def delete(self):
@@ -143,6 +169,7 @@ class Model(object):
         response = perform_request('delete', url, metric_tags=self._metric_tags, metric_action='model.delete')
         self.retrieved = True
         self.update_attributes(**response)
+        invalidate_cached(*self.changed_by_write())
 
     @classmethod
     def url_with_id(cls, params={}):
@@ -1,5 +1,7 @@
 from .utils import merge_dict, strip_blank, strip_none, extract, perform_request
 from .utils import CommentClientRequestError
+from .user import User
+import cache
 import models
 import settings
 
@@ -31,6 +33,9 @@ class Thread(models.Model):
     default_retrieve_params = {'recursive': False}
     type = 'thread'
 
+    # Retrieving a thread marks it as read for the user
+    cache_across_requests = False
+
     @classmethod
     def search(cls, query_params):
 
@@ -91,15 +96,26 @@ class Thread(models.Model):
         }
         request_params = strip_none(request_params)
 
-        response = perform_request(
-            'get',
+        response = cache.retrieve(
             url,
             request_params,
-            metric_action='model.retrieve',
-            metric_tags=self._metric_tags
+            lambda: perform_request(
+                'get',
+                url,
+                request_params,
+                metric_action='model.retrieve',
+                metric_tags=self._metric_tags
+            ),
+            across_requests=self.cache_across_requests
         )
         self.update_attributes(**response)
 
+    def changed_by_write(self):
+        changed = [self]
+        if self.attributes.get('user_id'):
+            changed.append(User(id=self.user_id))
+        return changed
+
     def flagAbuse(self, user, voteable):
         if voteable.type == 'thread':
             url = _url_for_flag_abuse_thread(voteable.id)
@@ -116,6 +132,7 @@ class Thread(models.Model):
             metric_tags=self._metric_tags
         )
         voteable.update_attributes(request)
+        models.invalidate_cached(voteable)
 
     def unFlagAbuse(self, user, voteable, removeAll):
         if voteable.type == 'thread':
@@ -137,6 +154,7 @@ class Thread(models.Model):
             metric_action='thread.abuse.unflagged'
         )
         voteable.update_attributes(request)
+        models.invalidate_cached(voteable)
 
     def pin(self, user, thread_id):
         url = _url_for_pin_thread(thread_id)
@@ -149,6 +167,7 @@ class Thread(models.Model):
             metric_action='thread.pin'
         )
         self.update_attributes(request)
+        models.invalidate_cached(self)
 
     def un_pin(self, user, thread_id):
         url = _url_for_un_pin_thread(thread_id)
@@ -161,6 +180,7 @@ class Thread(models.Model):
             metric_action='thread.unpin'
         )
         self.update_attributes(request)
+        models.invalidate_cached(self)
 
 
 def _url_for_flag_abuse_thread(thread_id):
@@ -1,5 +1,6 @@
 from .utils import merge_dict, perform_request, CommentClientRequestError
 
+import cache
 import models
 import settings
 
@@ -37,6 +38,7 @@ class User(models.Model):
             metric_action='user.follow',
             metric_tags=self._metric_tags + ['target.type:{}'.format(source.type)],
         )
+        models.invalidate_cached(self)
 
     def unfollow(self, source):
         params = {'source_type': source.type, 'source_id': source.id}
@@ -47,6 +49,7 @@ class User(models.Model):
             metric_action='user.unfollow',
             metric_tags=self._metric_tags + ['target.type:{}'.format(source.type)],
         )
+        models.invalidate_cached(self)
 
     def vote(self, voteable, value):
         if voteable.type == 'thread':
@@ -64,6 +67,7 @@ class User(models.Model):
             metric_tags=self._metric_tags + ['target.type:{}'.format(voteable.type)],
         )
         voteable.update_attributes(request)
+        models.invalidate_cached(self, voteable)
 
     def unvote(self, voteable):
         if voteable.type == 'thread':
@@ -81,6 +85,7 @@ class User(models.Model):
             metric_tags=self._metric_tags + ['target.type:{}'.format(voteable.type)],
         )
         voteable.update_attributes(request)
+        models.invalidate_cached(self, voteable)
 
     def active_threads(self, query_params={}):
         if not self.course_id:
@@ -116,31 +121,35 @@ class User(models.Model):
 
     def _retrieve(self, *args, **kwargs):
         url = self.url(action='get', params=self.attributes)
-        retrieve_params = self.default_retrieve_params
+        retrieve_params = dict(self.default_retrieve_params)
         if self.attributes.get('course_id'):
             retrieve_params['course_id'] = self.course_id
-        try:
-            response = perform_request(
-                'get',
-                url,
-                retrieve_params,
-                metric_action='model.retrieve',
-                metric_tags=self._metric_tags,
-            )
-        except CommentClientRequestError as e:
-            if e.status_code == 404:
-                # attempt to gracefully recover from a previous failure
-                # to sync this user to the comments service.
-                self.save()
-                response = perform_request(
+
+        def fetch():
+            try:
+                return perform_request(
                     'get',
                     url,
                     retrieve_params,
                     metric_action='model.retrieve',
                     metric_tags=self._metric_tags,
                 )
-            else:
-                raise
+            except CommentClientRequestError as e:
+                if e.status_code == 404:
+                    # attempt to gracefully recover from a previous failure
+                    # to sync this user to the comments service.
+                    self.save()
+                    return perform_request(
+                        'get',
+                        url,
+                        retrieve_params,
+                        metric_action='model.retrieve',
+                        metric_tags=self._metric_tags,
+                    )
+                else:
+                    raise
+
+        response = cache.retrieve(url, retrieve_params, fetch, across_requests=self.cache_across_requests)
         self.update_attributes(**response)
 
 
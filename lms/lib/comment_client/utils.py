@@ -1,15 +1,30 @@
 from contextlib import contextmanager
 from dogapi import dog_stats_api
+import cookielib
 import json
 import logging
+import os
+import sys
+import threading
+from multiprocessing.pool import ThreadPool
 import requests
+from requests.adapters import HTTPAdapter
 from django.conf import settings
 from time import time
 from uuid import uuid4
+from django.utils import translation
 from django.utils.translation import get_language
+from request_cache.middleware import RequestCache
 
 log = logging.getLogger(__name__)
 
+# The keep-alive session and the worker threads used for requests to the
+# comments service, each as a (pid, size, object) tuple.  Both are created
+# lazily, so that processes forked after startup don't share them.
+_session = None
+_workers = None
+_pool_lock = threading.Lock()
+
 
 def strip_none(dic):
     return dict([(k, v) for k, v in dic.iteritems() if v is not None])
@@ -76,8 +91,10 @@ def perform_request(method, url, data_or_params=None, raw=False,
     else:
         data = None
         params = merge_dict(data_or_params, request_id_dict)
+    session = get_session()
+    request = session.request if session is not None else requests.request
     with request_timer(request_id, method, url, metric_tags):
-        response = requests.request(
+        response = request(
             method,
             url,
             data=data,
@@ -125,6 +142,117 @@ def perform_request(method, url, data_or_params=None, raw=False,
             return data
 
 
+def _pool_settings():
+    return getattr(settings, 'COMMENTS_SERVICE_POOL', {})
+
+
+def get_session():
+    """
+    Return the requests Session holding this process's keep-alive
+    connections to the comments service, or None if connections aren't
+    pooled (COMMENTS_SERVICE_POOL['size'] is 0).
+    """
+    global _session
+    size = _pool_settings().get('size', 0)
+    if not size:
+        return None
+    with _pool_lock:
+        if _session is None or _session[:2] != (os.getpid(), size):
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            # The session is shared by every user's requests: never send
+            # cookies set in response to one of them with another.
+            session.cookies.set_policy(cookielib.DefaultCookiePolicy(allowed_domains=[]))
+            _session = (os.getpid(), size, session)
+        return _session[2]
+
+
+def _get_workers():
+    """
+    Return the ThreadPool making concurrent requests to the comments
+    service, or None if requests are made one at a time.
+    """
+    global _workers
+    if not _pool_settings().get('size', 0):
+        return None
+    concurrency = _pool_settings().get('concurrency', 0)
+    if concurrency <= 1:
+        return None
+    with _pool_lock:
+        if _workers is None or _workers[:2] != (os.getpid(), concurrency):
+            _workers = (os.getpid(), concurrency, ThreadPool(concurrency))
+        return _workers[2]
+
+
+class PendingRequest(object):
+    """
+    The result of a call started with `start_request`.
+    """
+    def __init__(self, func, args, kwargs):
+        self._done = threading.Event()
+        self._result = None
+        self._exc_info = None
+
+        workers = _get_workers()
+        if workers is None:
+            self._run(func, args, kwargs)
+        else:
+            # Requests made from the worker threads are for the same
+            # language and share the request cache of the page they're part of.
+            context = (get_language(), RequestCache.get_current_request(), RequestCache.get_request_cache().data)
+            workers.apply_async(self._run_in_context, (context, func, args, kwargs))
+
+    def _run(self, func, args, kwargs):
+        try:
+            self._result = func(*args, **kwargs)
+        except Exception:  # pylint: disable=broad-except
+            self._exc_info = sys.exc_info()
+        finally:
+            self._done.set()
+
+    def _run_in_context(self, context, func, args, kwargs):
+        language, request, request_cache_data = context
+        thread_cache = RequestCache.get_request_cache()
+        translation.activate(language)
+        thread_cache.request, thread_cache.data = request, request_cache_data
+        try:
+            self._run(func, args, kwargs)
+        finally:
+            translation.deactivate()
+            thread_cache.request, thread_cache.data = None, {}
+
+    def wait(self):
+        """
+        Wait for the call to finish.
+        """
+        self._done.wait()
+
+    def get(self):
+        """
+        Wait for the call to finish, and return its result or raise its exception.
+        """
+        self.wait()
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+
+def start_request(func, *args, **kwargs):
+    """
+    Start calling `func(*args, **kwargs)` alongside the caller, returning a
+    PendingRequest whose get() returns the result.
+
+    `func` should only make requests to the comments service, e.g. retrieve
+    a model: it may run on another thread, which can't see the caller's
+    database transaction, and mustn't itself wait for other started
+    requests.  Unless COMMENTS_SERVICE_POOL allows concurrent
+    requests, `func` is called right away.
+    """
+    return PendingRequest(func, args, kwargs)
+
+
 class CommentClientError(Exception):
     def __init__(self, msg):
         self.message = msg
@@ -29,6 +29,9 @@ def run():
     if settings.FEATURES.get('ENABLE_THIRD_PARTY_AUTH', False):
         enable_third_party_auth()
 
+    if settings.CODE_JAIL.get('python_bin') and settings.CODE_JAIL.get('pool', {}).get('size'):
+        enable_sandbox_pool()
+
 
 def enable_theme():
     """
@@ -111,3 +114,20 @@ def enable_third_party_auth():
 
     from third_party_auth import settings as auth_settings
     auth_settings.apply_settings(settings.THIRD_PARTY_AUTH, settings)
+
+
+def enable_sandbox_pool():
+    """
+    Run capa's sandboxed code in a pool of warm sandbox workers, rather than
+    starting a new sandboxed Python for every execution. For details, see
+    common/lib/capa/capa/safe_exec/pool.py.
+    """
+    from capa.safe_exec import configure_pool
+
+    pool_settings = settings.CODE_JAIL['pool']
+    configure_pool(
+        settings.CODE_JAIL['python_bin'],
+        user=settings.CODE_JAIL.get('user'),
+        size=pool_settings['size'],
+        limits=settings.CODE_JAIL.get('limits'),
+    )